@@ -0,0 +1,72 @@
+# availability.py
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from inventory import TrainLayout, seat_inventory
+from models import Station
+from schedules import Departure, departure_index
+
+
+def resolve_station_ids(db: Session, from_station: Optional[str], to_station: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+    """Look up the ids of a journey's stations by name; (None, None) when no journey is given"""
+    if not from_station or not to_station:
+        return None, None
+    rows = dict(db.query(Station.station_name, Station.station_id).filter(
+        Station.station_name.in_([from_station, to_station])
+    ).all())
+    for name in (from_station, to_station):
+        if name not in rows:
+            raise HTTPException(status_code=404, detail=f"Station '{name}' not found")
+    return rows[from_station], rows[to_station]
+
+
+def resolve_leg(layout: TrainLayout, from_station_id: Optional[int], to_station_id: Optional[int]) -> Tuple[Optional[int], Optional[int]]:
+    """Turn a journey's station ids into the train's (from, to) sequence numbers"""
+    if from_station_id is None or to_station_id is None:
+        return None, None
+    try:
+        return layout.leg_for_stations(from_station_id, to_station_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def resolve_departure(db: Session, train_id: int, journey_date: Optional[date]) -> Departure:
+    """Find the train's departure on the journey date, or its next departure when no date is given"""
+    departure = departure_index.departure(db, train_id, journey_date)
+    if departure is None:
+        if journey_date is None:
+            raise HTTPException(status_code=404, detail="Train has no upcoming departures")
+        raise HTTPException(status_code=404, detail=f"Train does not run on {journey_date.isoformat()}")
+    return departure
+
+
+def get_coach_availability_map(db: Session, departures: Dict[int, Departure],
+                               from_station_id: Optional[int] = None,
+                               to_station_id: Optional[int] = None) -> Dict[int, List[dict]]:
+    """Return seat availability for every coach of the given trains on their departures.
+
+    `departures` maps each train_id to the departure to count. Counts come
+    from the segment-aware seat inventory, so a journey between two stations
+    only counts seats whose bookings overlap that journey. Trains that do not
+    serve the journey are counted over their whole route. The result maps each
+    train_id to a list of coach dicts with total, booked and available seat
+    counts.
+    """
+    legs = {}
+    if from_station_id is not None and to_station_id is not None:
+        for train_id, layout in seat_inventory.train_layouts(db, departures).items():
+            try:
+                legs[train_id] = layout.leg_for_stations(from_station_id, to_station_id)
+            except ValueError:
+                continue
+    return seat_inventory.coach_availability(db, departures, legs)
+
+
+def get_train_coach_availability(db: Session, train_id: int, departure: Departure,
+                                 from_station_id: Optional[int] = None,
+                                 to_station_id: Optional[int] = None) -> List[dict]:
+    """Return seat availability for every coach of a single train on one departure"""
+    return get_coach_availability_map(db, {train_id: departure}, from_station_id, to_station_id)[train_id]
@@ -0,0 +1,133 @@
+# async_throughput.py
+"""
+Event-loop blocking benchmark.
+
+Serves one user lookup three ways from a single uvicorn worker and fires
+concurrent requests at each:
+
+- blocking:   async def handler using the sync Session, the shape the auth
+              endpoints had before they moved to the async session; every
+              query stalls the event loop
+- threadpool: plain def handler using the sync Session, run on the threadpool
+- async:      async def handler using the AsyncSession (database.get_async_db)
+
+Each lookup also spends --query-delay-ms inside the database (pg_sleep on
+PostgreSQL, a sleeping SQL function on SQLite), standing in for the network
+and query time a real database adds. Run from the backend folder against
+DATABASE_URL:
+
+    python -m benchmarks.async_throughput --requests 400 --concurrency 32 --query-delay-ms 5
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import uvicorn
+from fastapi import Depends, FastAPI
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+import database
+from benchmarks.login_throughput import percentile
+
+VARIANTS = ["blocking", "threadpool", "async"]
+
+
+def _sleep_ms(ms):
+    time.sleep(ms / 1000.0)
+    return ms
+
+
+def lookup_statement(engine):
+    """The user lookup, padded with a server-side delay of :ms milliseconds"""
+    if engine.dialect.name == "postgresql":
+        return text("SELECT (SELECT user_id FROM users WHERE email = :email), pg_sleep(:ms / 1000.0)")
+    for target in (database.engine, database.async_engine.sync_engine):
+        # Runs in the thread that executes the statement: the caller's for the
+        # sync engine, aiosqlite's worker thread for the async one
+        event.listen(target, "connect", lambda connection, _: connection.create_function("bench_sleep", 1, _sleep_ms))
+    return text("SELECT (SELECT user_id FROM users WHERE email = :email), bench_sleep(:ms)")
+
+
+def build_app(statement, email: str, delay_ms: float) -> FastAPI:
+    app = FastAPI()
+    params = {"email": email, "ms": delay_ms}
+
+    @app.get("/blocking")
+    async def blocking():
+        db = database.SessionLocal()
+        try:
+            return {"user_id": db.execute(statement, params).scalar()}
+        finally:
+            db.close()
+
+    @app.get("/threadpool")
+    def threadpool(db: Session = Depends(database.get_db)):
+        return {"user_id": db.execute(statement, params).scalar()}
+
+    @app.get("/async")
+    async def async_lookup(db: AsyncSession = Depends(database.get_async_db)):
+        return {"user_id": (await db.execute(statement, params)).scalar()}
+
+    return app
+
+
+def start_server(app: FastAPI, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", workers=1))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def measure(url: str, requests: int, concurrency: int) -> dict:
+    def call(_):
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url) as response:
+                response.read()
+        except urllib.error.URLError:
+            return None
+        return time.perf_counter() - started
+
+    # Warm the pools before timing
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(call, range(concurrency)))
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(call, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [result * 1000 for result in results if result is not None] or [0.0]
+    return {
+        "requests": requests,
+        "errors": sum(result is None for result in results),
+        "throughput_per_second": round(requests / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50), 1),
+        "p99_ms": round(percentile(latencies, 0.99), 1)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare blocking, threadpool and async database paths on one worker")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--email", default="bench@example.com")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--query-delay-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    statement = lookup_statement(database.engine)
+    server = start_server(build_app(statement, args.email, args.query_delay_ms), args.port)
+    try:
+        results = {}
+        for variant in VARIANTS:
+            results[variant] = measure(f"http://127.0.0.1:{args.port}/{variant}", args.requests, args.concurrency)
+            print(json.dumps({"variant": variant, **results[variant]}))
+    finally:
+        server.should_exit = True
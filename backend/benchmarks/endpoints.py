@@ -0,0 +1,286 @@
+# endpoints.py
+"""
+Endpoint latency benchmark.
+
+For each data size, fills the benchmark database with benchmarks.seed_network,
+then calls every endpoint in-process through the ASGI app and reports
+p50/p95/p99 latency and throughput per endpoint as JSON. Run from the backend
+folder:
+
+    python -m benchmarks.endpoints --sizes small,medium --output bench-abc123.json
+    python -m benchmarks.endpoints --compare bench-abc123.json bench-def456.json
+
+The database at --database-url is dropped and recreated for every size.
+--existing skips seeding and measures whatever data is already there (it must
+have been generated by benchmarks.seed_network, whose users it logs in as).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from benchmarks.login_throughput import percentile
+from benchmarks.seed_network import BENCH_PASSWORD, generate
+
+SIZES = {
+    "small": {"stations": 20, "lines": 3, "trains": 30, "coaches": 6, "seats_per_coach": 40,
+              "days": 7, "users": 1000, "bookings": 10000},
+    "medium": {"stations": 48, "lines": 6, "trains": 120, "coaches": 10, "seats_per_coach": 60,
+               "days": 14, "users": 20000, "bookings": 200000},
+    "large": {"stations": 120, "lines": 10, "trains": 400, "coaches": 12, "seats_per_coach": 60,
+              "days": 30, "users": 200000, "bookings": 2000000},
+}
+
+
+class Fixture:
+    """Ids, names and auth headers the scenarios need, read from the seeded data"""
+
+    def __init__(self, client, db):
+        from models import Booking, Coach, RouteStation, Station, Train, User
+
+        def login(email):
+            response = client.post("/login", json={"email": email, "password": BENCH_PASSWORD})
+            response.raise_for_status()
+            return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        self.user = login("bench@example.com")
+        self.admin = login("admin@example.com")
+        self.email = "bench@example.com"
+
+        # Train 1 departs on journey_date, the first seeded day (schedule 1)
+        self.train_id = 1
+        stops = db.query(Station.station_name).join(
+            RouteStation, RouteStation.station_id == Station.station_id
+        ).filter(RouteStation.train_id == self.train_id).order_by(RouteStation.sequence_number).all()
+        self.from_station, self.to_station = stops[0][0], stops[-1][0]
+        self.journey_date = date.today().isoformat()
+        self.train_name = db.query(Train.train_name).filter(Train.train_id == self.train_id).scalar()
+        self.coach_type = db.query(Coach.coach_type).filter(Coach.train_id == self.train_id).first()[0]
+
+        user_id = db.query(User.user_id).filter(User.email == self.email).scalar()
+        self.booking_ids = [booking_id for (booking_id,) in db.query(Booking.booking_id).filter(
+            Booking.user_id == user_id
+        ).order_by(Booking.booking_id.desc()).limit(100)]
+        self.ticket_token = None
+
+        # Bookings made by the create-booking scenario, paid and then cancelled by later ones
+        self.unpaid = deque()
+        self.uncancelled = deque()
+
+
+def scenarios(fixture: Fixture):
+    """(name, request) per endpoint; requests run in this order, writes last"""
+    f = fixture
+    search = {"from_station": f.from_station, "to_station": f.to_station, "journey_date": f.journey_date}
+
+    def create_booking(client):
+        response = client.post("/create-booking", headers=f.user, json={
+            "train_id": f.train_id, "coach_type": f.coach_type, "ticket_count": 1, "journey_date": f.journey_date
+        })
+        if response.status_code == 200:
+            f.unpaid.append((response.json()["booking_id"], response.json()["total_amount"]))
+            f.ticket_token = f.ticket_token or response.json()["ticket_token"]
+        return response
+
+    def pay(client):
+        booking_id, amount = f.unpaid.popleft()
+        f.uncancelled.append(booking_id)
+        return client.post("/create-payment", headers=f.user, json={"booking_id": booking_id, "amount": amount})
+
+    def cancel(client):
+        return client.post("/cancel-booking", headers=f.user, json={"booking_id": f.uncancelled.popleft()})
+
+    return [
+        ("GET /stations", lambda c: c.get("/stations")),
+        ("GET /train-info", lambda c: c.get("/train-info", params={"train_name": f.train_name})),
+        ("GET /train-routes/{train_id}", lambda c: c.get(f"/train-routes/{f.train_id}", headers=f.user)),
+        ("POST /search-trains", lambda c: c.post("/search-trains", json=search)),
+        ("POST /search-trains-by-route", lambda c: c.post("/search-trains-by-route", json=search, headers=f.user)),
+        ("POST /search-journeys", lambda c: c.post("/search-journeys", json=search, headers=f.user)),
+        ("GET /coach-availability/{train_id}", lambda c: c.get(
+            f"/coach-availability/{f.train_id}",
+            params={"from_station": f.from_station, "to_station": f.to_station, "journey_date": f.journey_date},
+            headers=f.user)),
+        ("POST /refresh-coach-availability", lambda c: c.post(
+            "/refresh-coach-availability", json={"train_id": f.train_id, "journey_date": f.journey_date}, headers=f.user)),
+        ("GET /me", lambda c: c.get("/me", headers=f.user)),
+        ("GET /my-tickets", lambda c: c.get("/my-tickets", headers=f.user)),
+        ("POST /verify-ticket", lambda c: c.post("/verify-ticket", json={"booking_id": f.booking_ids[0]}, headers=f.user)),
+        ("POST /verify-tickets", lambda c: c.post("/verify-tickets", json={"booking_ids": f.booking_ids}, headers=f.admin)),
+        ("GET /ticket-public-key", lambda c: c.get("/ticket-public-key")),
+        ("GET /ticket-revocations", lambda c: c.get("/ticket-revocations", headers=f.admin)),
+        ("POST /login", lambda c: c.post("/login", json={"email": f.email, "password": BENCH_PASSWORD})),
+        ("POST /create-booking", create_booking),
+        ("POST /verify-ticket-token", lambda c: c.post("/verify-ticket-token", json={"token": f.ticket_token}, headers=f.admin)),
+        ("POST /create-payment", pay),
+        ("POST /cancel-booking", cancel),
+        ("GET /metrics", lambda c: c.get("/metrics")),
+    ]
+
+
+def measure(client, call, requests: int, concurrency: int, warmup: int) -> dict:
+    """Time `requests` calls after `warmup` unmeasured ones"""
+    for _ in range(warmup):
+        call(client)
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def timed(_):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            failed = call(client).status_code >= 400
+        except Exception:
+            failed = True
+        elapsed = time.perf_counter() - started
+        with lock:
+            if failed:
+                errors += 1
+            else:
+                latencies.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    ms = [latency * 1000 for latency in latencies] or [0.0]
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput_per_second": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(sum(ms) / len(ms), 2),
+        "p50_ms": round(percentile(ms, 0.50), 2),
+        "p95_ms": round(percentile(ms, 0.95), 2),
+        "p99_ms": round(percentile(ms, 0.99), 2)
+    }
+
+
+def reset_caches():
+    """Forget everything the app derived from the previous data set"""
+    from inventory import seat_inventory
+    from principal_cache import principal_cache
+    from ticket_tokens import ticket_revocations
+    from timetable import notify_timetable_changed
+
+    notify_timetable_changed()
+    seat_inventory.invalidate()
+    principal_cache.clear()
+    ticket_revocations.clear()
+
+
+def run(size_names, requests: int, concurrency: int, warmup: int, only=None, existing: bool = False) -> dict:
+    from fastapi.testclient import TestClient
+
+    import database
+    from main import app
+
+    results = []
+    for size in (["existing"] if existing else size_names):
+        entry = {"size": size}
+        if not existing:
+            started = time.perf_counter()
+            entry["rows"] = generate(database.engine, start_date=date.today(), **SIZES[size])
+            entry["seed_seconds"] = round(time.perf_counter() - started, 1)
+        reset_caches()
+
+        # One client for the whole size keeps a single event loop for the async engine
+        with TestClient(app) as client:
+            db = database.SessionLocal()
+            try:
+                fixture = Fixture(client, db)
+            finally:
+                db.close()
+            entry["endpoints"] = {}
+            for name, call in scenarios(fixture):
+                if only and name not in only:
+                    continue
+                # Payments and cancellations use up the bookings create-booking made
+                if name == "POST /create-payment":
+                    stats = measure(client, call, len(fixture.unpaid), concurrency, 0)
+                elif name == "POST /cancel-booking":
+                    stats = measure(client, call, len(fixture.uncancelled), concurrency, 0)
+                else:
+                    stats = measure(client, call, requests, concurrency, warmup)
+                entry["endpoints"][name] = stats
+                print(f"{size:>8} {name:<40} p50 {stats['p50_ms']:>8} ms  p99 {stats['p99_ms']:>8} ms", file=sys.stderr)
+        results.append(entry)
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(baseline_path: str, candidate_path: str):
+    """Print the p50/p95/p99 change of every endpoint present in both result files"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+    before = {(entry["size"], name): stats for entry in baseline["sizes"] for name, stats in entry["endpoints"].items()}
+    print(f"{baseline['commit']} -> {candidate['commit']}")
+    for entry in candidate["sizes"]:
+        for name, stats in entry["endpoints"].items():
+            old = before.get((entry["size"], name))
+            if old is None:
+                continue
+            changes = []
+            for key in ("p50_ms", "p95_ms", "p99_ms"):
+                delta = (stats[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+                changes.append(f"{key[:3]} {old[key]:>8} -> {stats[key]:>8} ({delta:+6.1f}%)")
+            print(f"{entry['size']:>8} {name:<40} " + "  ".join(changes))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure endpoint latency at several data sizes")
+    parser.add_argument("--database-url", default="sqlite:///./benchmark.db",
+                        help="database to fill and benchmark; it is dropped and recreated")
+    parser.add_argument("--sizes", default="small", help=f"comma-separated, from {', '.join(SIZES)}")
+    parser.add_argument("--existing", action="store_true", help="benchmark the data already in the database")
+    parser.add_argument("--endpoints", help="comma-separated endpoint names, e.g. 'GET /stations,POST /search-trains'")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests per endpoint, to fill caches")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"), help="compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        sys.exit(0)
+
+    # The app reads its settings at import time
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    sizes = [size.strip() for size in args.sizes.split(",")]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f"unknown sizes: {', '.join(unknown)}")
+    only = {name.strip() for name in args.endpoints.split(",")} if args.endpoints else None
+
+    results = {
+        "commit": git_commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "database": args.database_url.split(":", 1)[0],
+        "python": sys.version.split()[0],
+        "settings": {"requests": args.requests, "concurrency": args.concurrency, "warmup": args.warmup},
+        "sizes": run(sizes, args.requests, args.concurrency, args.warmup, only, args.existing)
+    }
+    payload = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
@@ -0,0 +1,100 @@
+# login_throughput.py
+"""
+Login throughput benchmark.
+
+Fires concurrent POST /login requests at a running backend and reports
+throughput and latency percentiles. Run from the backend folder:
+
+    python -m benchmarks.login_throughput --email user@example.com --password secret
+
+Use --local to measure the password hashing pool on its own, without a server
+or database, e.g. to compare BCRYPT_ROUNDS / PASSWORD_HASH_WORKERS settings.
+"""
+import argparse
+import asyncio
+import json
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def percentile(samples, fraction):
+    """Return the sample at the given fraction of the sorted samples"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def report(name, latencies, errors, elapsed):
+    """Print a one-line JSON summary of a run"""
+    ms = [latency * 1000 for latency in latencies] or [0.0]
+    print(json.dumps({
+        "benchmark": name,
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_per_second": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(ms, 0.50), 1),
+        "p95_ms": round(percentile(ms, 0.95), 1),
+        "p99_ms": round(percentile(ms, 0.99), 1)
+    }))
+
+
+def run_http(url, email, password, requests, concurrency):
+    body = json.dumps({"email": email, "password": password}).encode("utf-8")
+
+    def login(_):
+        request = urllib.request.Request(f"{url}/login", data=body, headers={"Content-Type": "application/json"})
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+        except urllib.error.URLError:
+            return None
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(login, range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies = [result for result in results if result is not None]
+    report("http_login", latencies, len(results) - len(latencies), elapsed)
+
+
+def run_local(password, requests, concurrency):
+    from auth import get_password_hash, verify_password_async
+
+    hashed = get_password_hash(password)
+
+    async def main():
+        gate = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def verify():
+            async with gate:
+                started = time.perf_counter()
+                await verify_password_async(password, hashed)
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(verify() for _ in range(requests)))
+        return latencies, time.perf_counter() - started
+
+    latencies, elapsed = asyncio.run(main())
+    report("local_verify", latencies, 0, elapsed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure /login throughput")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--email", default="bench@example.com")
+    parser.add_argument("--password", default="bench-password")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--local", action="store_true", help="benchmark the hashing pool without a server")
+    args = parser.parse_args()
+
+    if args.local:
+        run_local(args.password, args.requests, args.concurrency)
+    else:
+        run_http(args.url, args.email, args.password, args.requests, args.concurrency)
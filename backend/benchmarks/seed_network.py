@@ -0,0 +1,273 @@
+# seed_network.py
+"""
+Synthetic national network generator.
+
+Fills the database at DATABASE_URL with stations, lines, trains with timed
+RouteStation sequences, coaches, seats, daily schedules, users, bookings and
+payments. Output is deterministic for a given --seed. Run from the backend
+folder:
+
+    python -m benchmarks.seed_network --stations 120 --trains 400 --days 30 --bookings 2000000
+
+The schema is dropped and recreated first, so never point it at a database
+you care about. Every generated user has the password "bench-password"; the
+first one is bench@example.com (what benchmarks.login_throughput logs in as)
+and the second is the admin admin@example.com.
+"""
+import argparse
+import json
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import Integer, func, insert, select, text
+
+BENCH_PASSWORD = "bench-password"
+
+# Coach types and their share of a train's coaches
+COACH_MIX = [("Shovon", 5), ("Snigdha", 3), ("AC_Chair", 2), ("AC_Cabin", 1)]
+COACH_FARES = {"Shovon": 400, "Snigdha": 800, "AC_Chair": 1200, "AC_Cabin": 2500}
+
+STATION_NAMES = [
+    "Dhaka", "Chittagong", "Sylhet", "Rajshahi", "Khulna", "Rangpur", "Mymensingh", "Comilla",
+    "Jessore", "Dinajpur", "Bogra", "Pabna", "Kushtia", "Tangail", "Jamalpur", "Noakhali",
+    "Feni", "Brahmanbaria", "Bhairab", "Narsingdi", "Sreemangal", "Kulaura", "Akhaura", "Laksam",
+    "Ishwardi", "Santahar", "Parbatipur", "Saidpur", "Lalmonirhat", "Kurigram", "Gaibandha", "Joypurhat",
+    "Natore", "Chapai Nawabganj", "Chuadanga", "Darshana", "Faridpur", "Rajbari", "Gopalganj", "Netrokona",
+    "Kishoreganj", "Sirajganj", "Benapole", "Thakurgaon", "Panchagarh", "Habiganj", "Moulvibazar", "Coxs Bazar"
+]
+
+INSERT_CHUNK = 10000
+
+
+def station_names(count: int):
+    """Real station names first, numbered ones once they run out"""
+    return [STATION_NAMES[i] if i < len(STATION_NAMES) else f"Station {i + 1:04d}" for i in range(count)]
+
+
+def build_lines(rng: random.Random, n_stations: int, n_lines: int):
+    """Split the stations into lines that all start at the hub (station 1), so
+    trains on different lines can be combined into connecting journeys"""
+    others = list(range(2, n_stations + 1))
+    rng.shuffle(others)
+    lines = [[1] for _ in range(n_lines)]
+    for index, station_id in enumerate(others):
+        lines[index % n_lines].append(station_id)
+    return [line for line in lines if len(line) > 1]
+
+
+def clock(minutes: int) -> str:
+    """Format minutes after midnight as a stop time; past midnight keeps counting (25:10)"""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class RowWriter:
+    """Buffers rows per table and inserts them in chunks with executemany.
+
+    Every flush writes all buffers in foreign key order, so a row is never
+    inserted before the rows it references.
+    """
+
+    def __init__(self, conn, tables):
+        self.conn = conn
+        self.buffers = {table: [] for table in tables}
+        self.counts = {}
+
+    def add(self, table, row: dict):
+        buffer = self.buffers[table]
+        buffer.append(row)
+        if len(buffer) >= INSERT_CHUNK:
+            self.flush()
+
+    def flush(self):
+        for table, rows in self.buffers.items():
+            if rows:
+                self.conn.execute(insert(table), rows)
+                self.counts[table.name] = self.counts.get(table.name, 0) + len(rows)
+                rows.clear()
+
+
+def generate(engine, stations: int = 48, lines: int = 6, trains: int = 120, coaches: int = 10,
+             seats_per_coach: int = 60, days: int = 14, users: int = 20000, bookings: int = 200000,
+             start_date: date = None, seed: int = 42) -> dict:
+    """Recreate the schema on `engine` and fill it with a synthetic network.
+
+    Returns the number of rows written per table.
+    """
+    from auth import get_password_hash
+    from database import Base
+    from models import Booking, BookingSeat, Coach, Payment, Route, RouteStation, Schedule, Seat, Station, Train, User
+
+    rng = random.Random(seed)
+    start_date = start_date or date.today() + timedelta(days=1)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    with engine.begin() as conn:
+        writer = RowWriter(conn, Base.metadata.sorted_tables)
+        for station_id, name in enumerate(station_names(stations), start=1):
+            writer.add(Station.__table__, {"station_id": station_id, "station_name": name, "location": f"{name}, Bangladesh"})
+
+        network = build_lines(rng, stations, max(1, min(lines, stations - 1)))
+        coach_types = [coach_type for coach_type, share in COACH_MIX for _ in range(share)]
+        trips = []  # (train_id, stop count, first departure, running minutes) per train
+        seats_by_coach = {}
+        coaches_by_train = {}
+        coach_id = seat_id = 0
+        for train_id in range(1, trains + 1):
+            line = network[train_id % len(network)]
+            length = rng.randint(min(3, len(line)), min(len(line), 18))
+            first = rng.randint(0, len(line) - length)
+            stops = line[first:first + length]
+            if rng.random() < 0.5:
+                stops.reverse()
+
+            departure = rng.randint(5 * 60, 23 * 60)
+            minutes = departure
+            distance = 0
+            for sequence, station_id in enumerate(stops, start=1):
+                halt = 0 if sequence in (1, len(stops)) else rng.randint(2, 10)
+                writer.add(RouteStation.__table__, {
+                    "train_id": train_id, "station_id": station_id, "sequence_number": sequence,
+                    "arrival_offset_minutes": None if sequence == 1 else clock(minutes),
+                    "departure_offset_minutes": None if sequence == len(stops) else clock(minutes + halt),
+                    "halt_minutes": halt
+                })
+                if sequence < len(stops):
+                    hop = rng.randint(20, 75)
+                    minutes += halt + hop
+                    distance += hop  # about a kilometre a minute
+            writer.add(Train.__table__, {
+                "train_id": train_id, "train_name": f"{rng.choice(STATION_NAMES)} Express {train_id}",
+                "train_type": rng.choice(["Intercity", "Mail", "Express"]), "total_coaches": coaches
+            })
+            writer.add(Route.__table__, {
+                "route_id": train_id, "train_id": train_id, "source_station_id": stops[0],
+                "destination_station_id": stops[-1], "distance_km": distance
+            })
+            trips.append((train_id, len(stops), departure, minutes - departure))
+
+            for number in range(1, coaches + 1):
+                coach_id += 1
+                coach_type = coach_types[(number - 1) % len(coach_types)]
+                writer.add(Coach.__table__, {
+                    "coach_id": coach_id, "train_id": train_id, "coach_number": f"C{number}",
+                    "coach_type": coach_type, "total_seats": seats_per_coach
+                })
+                first_seat = seat_id + 1
+                for seat in range(1, seats_per_coach + 1):
+                    seat_id += 1
+                    writer.add(Seat.__table__, {"seat_id": seat_id, "coach_id": coach_id,
+                                                "seat_number": str(seat), "seat_class": coach_type})
+                seats_by_coach[coach_id] = (first_seat, coach_type)
+                coaches_by_train.setdefault(train_id, []).append(coach_id)
+
+        # Schedule ids run day by day, so ids 1..trains are the first service day
+        schedules = []  # (train_id, stop count, departure datetime)
+        for day in range(days):
+            service_date = start_date + timedelta(days=day)
+            for train_id, stop_count, departure, running in trips:
+                leaves = datetime.combine(service_date, datetime.min.time()) + timedelta(minutes=departure)
+                schedules.append((train_id, stop_count, leaves))
+                writer.add(Schedule.__table__, {
+                    "schedule_id": len(schedules), "train_id": train_id, "route_id": train_id,
+                    "departure_time": leaves, "arrival_time": leaves + timedelta(minutes=running)
+                })
+
+        password = get_password_hash(BENCH_PASSWORD)
+        for user_id in range(1, users + 1):
+            email = {1: "bench@example.com", 2: "admin@example.com"}.get(user_id, f"user{user_id}@example.com")
+            writer.add(User.__table__, {
+                "user_id": user_id, "name": f"User {user_id}", "email": email, "phone": f"01{user_id:09d}",
+                "password": password, "role": "admin" if user_id == 2 else "customer"
+            })
+        writer.flush()
+
+        # Seats are handed out in order per schedule and coach, one booking per
+        # seat, so generated bookings never overlap each other
+        next_seat = {}
+        booking_id = booking_seat_id = payment_id = 0
+        skipped = 0
+        for _ in range(bookings):
+            schedule_id = rng.randint(1, len(schedules))
+            train_id, stop_count, leaves = schedules[schedule_id - 1]
+            tickets = rng.choice((1, 1, 1, 2, 2, 3, 4))
+            candidates = coaches_by_train[train_id]
+            coach = next((c for c in rng.sample(candidates, len(candidates))
+                          if next_seat.get((schedule_id, c), 0) + tickets <= seats_per_coach), None)
+            if coach is None:
+                skipped += 1
+                continue
+            offset = next_seat.get((schedule_id, coach), 0)
+            next_seat[(schedule_id, coach)] = offset + tickets
+
+            from_sequence = to_sequence = None
+            if stop_count > 2 and rng.random() < 0.5:
+                from_sequence = rng.randint(1, stop_count - 1)
+                to_sequence = rng.randint(from_sequence + 1, stop_count)
+            cancelled = rng.random() < 0.05
+            # Unpaid bookings are holds that ran out and gave their seats back
+            paid = rng.random() < 0.8
+            status = "cancelled" if cancelled else "confirmed" if paid else "expired"
+            booked_at = leaves - timedelta(minutes=rng.randint(30, 30 * 24 * 60))
+            booking_id += 1
+            # Skewed so the first users (bench@example.com among them) hold many bookings
+            user_id = 1 + int(users * rng.random() ** 3)
+            writer.add(Booking.__table__, {
+                "booking_id": booking_id, "user_id": user_id, "schedule_id": schedule_id,
+                "booking_date": booked_at, "status": status,
+                "journey_date": leaves.date(), "from_sequence": from_sequence, "to_sequence": to_sequence
+            })
+            first_seat, coach_type = seats_by_coach[coach]
+            fare = COACH_FARES[coach_type]
+            for seat in range(first_seat + offset, first_seat + offset + tickets):
+                booking_seat_id += 1
+                writer.add(BookingSeat.__table__, {
+                    "booking_seat_id": booking_seat_id, "booking_id": booking_id, "seat_id": seat,
+                    "fare": fare, "schedule_id": schedule_id, "journey_date": leaves.date(), "is_active": status == "confirmed"
+                })
+            if paid:
+                payment_id += 1
+                writer.add(Payment.__table__, {
+                    "payment_id": payment_id, "booking_id": booking_id, "amount": fare * tickets,
+                    "payment_date": booked_at + timedelta(minutes=rng.randint(1, 30)), "status": "paid"
+                })
+        writer.flush()
+
+        if engine.dialect.name == "postgresql":
+            # Ids were written explicitly, so move each serial sequence past them
+            for table in Base.metadata.sorted_tables:
+                key = list(table.primary_key.columns)
+                if len(key) != 1 or not isinstance(key[0].type, Integer):
+                    continue
+                highest = conn.execute(select(func.max(key[0]))).scalar()
+                if highest:
+                    conn.execute(text("SELECT setval(pg_get_serial_sequence(:table, :column), :value)"),
+                                 {"table": table.name, "column": key[0].name, "value": highest})
+
+    summary = dict(sorted(writer.counts.items()))
+    summary["skipped_bookings"] = skipped
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill the database with a synthetic railway network")
+    parser.add_argument("--stations", type=int, default=48)
+    parser.add_argument("--lines", type=int, default=6, help="lines radiating from the hub station")
+    parser.add_argument("--trains", type=int, default=120)
+    parser.add_argument("--coaches", type=int, default=10, help="coaches per train")
+    parser.add_argument("--seats-per-coach", type=int, default=60)
+    parser.add_argument("--days", type=int, default=14, help="service days with a schedule for every train")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--bookings", type=int, default=200000)
+    parser.add_argument("--start-date", type=date.fromisoformat, help="first service day (default: tomorrow)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from database import engine
+
+    started = time.perf_counter()
+    counts = generate(engine, args.stations, args.lines, args.trains, args.coaches, args.seats_per_coach,
+                      args.days, args.users, args.bookings, args.start_date, args.seed)
+    counts["seconds"] = round(time.perf_counter() - started, 1)
+    print(json.dumps(counts))
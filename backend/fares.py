@@ -0,0 +1,159 @@
+# fares.py
+import threading
+from array import array
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from timetable import compiled_timetable, on_timetable_change, timetable_version
+
+# Fare of each coach class over REFERENCE_DISTANCE_KM (Dhaka - Chittagong); fares
+# scale linearly with the distance travelled
+CLASS_FARES = {
+    "AC_Cabin": 2500,
+    "AC_Chair": 1200,
+    "Snigdha": 800,
+    "Shovon": 400,
+    "AC First Class": 1500,
+    "AC Business": 1200,
+    "First Class": 800,
+    "Second Class": 500,
+    "Sleeper Class": 600
+}
+DEFAULT_CLASS_FARE = 500
+REFERENCE_DISTANCE_KM = 264
+
+# Shorter journeys are charged as this distance
+MINIMUM_DISTANCE_KM = 25
+
+
+class FareTable:
+    """Fares of one train between every pair of its stops.
+
+    Stops are indexed in sequence order; the fare from stop i to stop j of a
+    class is matrix[i * size + j] in an unsigned int array, built the first
+    time the class is priced. Cumulative stop distances split the route's
+    distance_km by running time, or evenly when the stops are not timed.
+    """
+
+    __slots__ = ("train_id", "size", "positions", "first_call", "last_call", "distances", "_matrices")
+
+    def __init__(self, train_id: int, stops, total_km: float):
+        self.train_id = train_id
+        self.size = len(stops)
+        self.positions = {stop.sequence_number: index for index, stop in enumerate(stops)}
+        self.first_call: Dict[int, int] = {}
+        self.last_call: Dict[int, int] = {}
+        for index, stop in enumerate(stops):
+            self.first_call.setdefault(stop.station_id, index)
+            self.last_call[stop.station_id] = index
+
+        elapsed = [stop.elapsed for stop in stops]
+        if self.size > 1 and None not in elapsed and elapsed[-1] > 0:
+            shares = [minutes / elapsed[-1] for minutes in elapsed]
+        else:
+            shares = [index / (self.size - 1) if self.size > 1 else 0.0 for index in range(self.size)]
+        self.distances = [total_km * share for share in shares]
+        self._matrices: Dict[str, array] = {}
+
+    def matrix(self, coach_type: str) -> array:
+        matrix = self._matrices.get(coach_type)
+        if matrix is None:
+            rate = CLASS_FARES.get(coach_type, DEFAULT_CLASS_FARE) / REFERENCE_DISTANCE_KM
+            size, distances = self.size, self.distances
+            matrix = array("I", bytes(array("I").itemsize * size * size))
+            for i in range(size):
+                for j in range(i + 1, size):
+                    matrix[i * size + j] = round(rate * max(distances[j] - distances[i], MINIMUM_DISTANCE_KM))
+            self._matrices[coach_type] = matrix
+        return matrix
+
+    def fare(self, coach_type: str, from_index: int, to_index: int) -> int:
+        return self.matrix(coach_type)[from_index * self.size + to_index]
+
+    def leg(self, from_sequence: Optional[int], to_sequence: Optional[int]) -> Tuple[int, int]:
+        """Stop indexes of a booked leg; None means the route's first or last stop"""
+        from_index = self.positions.get(from_sequence, 0) if from_sequence is not None else 0
+        to_index = self.positions.get(to_sequence, self.size - 1) if to_sequence is not None else self.size - 1
+        return from_index, to_index
+
+    def leg_for_stations(self, from_station_id: int, to_station_id: int) -> Optional[Tuple[int, int]]:
+        """Stop indexes from the first call at from_station to the last call at to_station"""
+        from_index = self.first_call.get(from_station_id)
+        to_index = self.last_call.get(to_station_id)
+        if from_index is None or to_index is None or from_index >= to_index:
+            return None
+        return from_index, to_index
+
+
+def build_fare_tables(db: Session) -> Dict[int, FareTable]:
+    """A fare table for every train with at least two stops, from the compiled
+    timetable; trains without a route distance count REFERENCE_DISTANCE_KM"""
+    tables = {}
+    for train_id, train in compiled_timetable.trains(db).items():
+        stops = [stop for stop in train.stops if stop.sequence_number is not None]
+        if len(stops) < 2:
+            continue
+        tables[train_id] = FareTable(train_id, stops, train.distance_km or REFERENCE_DISTANCE_KM)
+    return tables
+
+
+class FareEngine:
+    """Distance-based fares for every train, built once per timetable version.
+
+    Trains without a fare table (fewer than two stops) are charged the class's
+    flat fare.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tables: Optional[Dict[int, FareTable]] = None
+
+    def tables(self, db: Session) -> Dict[int, FareTable]:
+        tables = self._tables
+        if tables is None:
+            version = timetable_version()
+            tables = build_fare_tables(db)
+            with self._lock:
+                if timetable_version() == version:
+                    self._tables = tables
+        return tables
+
+    def fare(self, db: Session, train_id: int, coach_type: str,
+             from_sequence: Optional[int] = None, to_sequence: Optional[int] = None) -> int:
+        """Fare of one seat on a booked leg (sequence numbers; None = whole route)"""
+        table = self.tables(db).get(train_id)
+        if table is None:
+            return CLASS_FARES.get(coach_type, DEFAULT_CLASS_FARE)
+        from_index, to_index = table.leg(from_sequence, to_sequence)
+        if from_index >= to_index:
+            from_index, to_index = 0, table.size - 1
+        return table.fare(coach_type, from_index, to_index)
+
+    def leg_fares(self, db: Session, train_coach_types: Dict[int, Iterable[str]],
+                  from_station_id: Optional[int] = None, to_station_id: Optional[int] = None) -> Dict[int, Dict[str, int]]:
+        """Price a whole result set at once: {train_id: {coach_type: fare}} for the
+        journey between two stations, or the whole route of trains not serving it"""
+        tables = self.tables(db)
+        fares = {}
+        for train_id, coach_types in train_coach_types.items():
+            table = tables.get(train_id)
+            leg = None
+            if table is not None:
+                if from_station_id is not None and to_station_id is not None:
+                    leg = table.leg_for_stations(from_station_id, to_station_id)
+                leg = leg or (0, table.size - 1)
+            fares[train_id] = {
+                coach_type: table.fare(coach_type, *leg) if table is not None
+                else CLASS_FARES.get(coach_type, DEFAULT_CLASS_FARE)
+                for coach_type in set(coach_types)
+            }
+        return fares
+
+    def invalidate(self):
+        with self._lock:
+            self._tables = None
+
+
+fare_engine = FareEngine()
+on_timetable_change(fare_engine.invalidate)
@@ -0,0 +1,127 @@
+# holds.py
+"""
+Seat holds: a new booking holds its seats for SEAT_HOLD_MINUTES, and paying
+for it in that time confirms it. Holds that run out are expired in bulk by
+release_expired_holds, which reads them through the partial index on
+bookings.hold_expires_at, so a sweep touches only the holds that are due.
+Each worker runs the sweep on a background thread every HOLD_SWEEP_SECONDS;
+concurrent sweeps are safe because a hold is only expired while it is still
+held.
+"""
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.sql import Select
+
+import database
+from inventory import seat_inventory
+from logging_config import get_logger
+from models import Booking, BookingSeat
+from ticket_tokens import ticket_revocations
+
+# How long a booking holds its seats before it must be paid
+SEAT_HOLD_MINUTES = int(os.getenv("SEAT_HOLD_MINUTES", "15"))
+# Seconds between sweeps of expired holds; 0 disables the background sweep
+HOLD_SWEEP_SECONDS = float(os.getenv("HOLD_SWEEP_SECONDS", "15"))
+# Holds expired per transaction
+HOLD_SWEEP_BATCH = 500
+
+logger = get_logger("holds")
+
+
+def hold_expiry(now: Optional[datetime] = None) -> datetime:
+    """When a hold placed now runs out"""
+    return (now or datetime.now()) + timedelta(minutes=SEAT_HOLD_MINUTES)
+
+
+def due_holds_query(now: datetime, limit: int) -> Select:
+    """Up to `limit` holds that ran out by `now`, read through the partial index on open holds"""
+    return select(Booking.booking_id).where(
+        Booking.status == 'held',
+        Booking.hold_expires_at <= now
+    ).limit(limit)
+
+
+def release_expired_holds(db, now: Optional[datetime] = None, batch_size: int = HOLD_SWEEP_BATCH) -> int:
+    """Expire every hold that ran out by `now` and return its seats to the inventory.
+
+    Works through the due holds a batch at a time, each batch in one short
+    transaction. Returns the number of bookings expired.
+    """
+    now = now or datetime.now()
+    expired_total = 0
+    while True:
+        due = [booking_id for (booking_id,) in db.execute(due_holds_query(now, batch_size)).all()]
+        if not due:
+            return expired_total
+
+        # A hold paid for since the lookup is no longer 'held' and stays as it is
+        expired = db.execute(update(Booking).where(
+            Booking.booking_id.in_(due),
+            Booking.status == 'held',
+            Booking.hold_expires_at <= now
+        ).values(
+            status='expired', hold_expires_at=None
+        ).returning(
+            Booking.booking_id, Booking.journey_date, Booking.from_sequence, Booking.to_sequence
+        ).execution_options(synchronize_session=False)).all()
+        legs = {row.booking_id: (row.from_sequence, row.to_sequence) for row in expired}
+        journey_dates = {row.booking_id: row.journey_date for row in expired}
+        released = []
+        if legs:
+            released = db.execute(update(BookingSeat).where(
+                BookingSeat.booking_id.in_(legs),
+                BookingSeat.journey_date.in_(set(journey_dates.values())),
+                BookingSeat.is_active.is_(True)
+            ).values(
+                is_active=False
+            ).returning(
+                BookingSeat.booking_id, BookingSeat.schedule_id, BookingSeat.seat_id
+            ).execution_options(synchronize_session=False)).all()
+        db.commit()
+
+        for booking_id, schedule_id, seat_id in released:
+            seat_inventory.release(schedule_id, [seat_id], *legs[booking_id])
+        ticket_revocations.add(journey_dates)
+        expired_total += len(legs)
+        logger.info("Expired seat holds", extra={"bookings": len(legs), "seats": len(released)})
+
+
+class HoldSweeper:
+    """Runs release_expired_holds every HOLD_SWEEP_SECONDS on a daemon thread"""
+
+    def __init__(self, interval: float = HOLD_SWEEP_SECONDS):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="hold-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            db = database.session_router.primary_factory()
+            try:
+                release_expired_holds(db)
+            except Exception as e:
+                db.rollback()
+                logger.warning("Seat hold sweep failed", extra={"error": str(e)})
+            finally:
+                db.close()
+
+
+hold_sweeper = HoldSweeper()
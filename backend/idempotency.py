@@ -0,0 +1,64 @@
+# idempotency.py
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from models import IdempotencyKey
+
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+# Keys older than this are forgotten and may be reused
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
+
+def request_fingerprint(payload) -> str:
+    """Stable hash of a request body, to spot a key reused for a different request"""
+    body = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def validate_key(key: Optional[str]) -> Optional[str]:
+    if key is not None and not 0 < len(key) <= IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1 to {IDEMPOTENCY_KEY_MAX_LENGTH} characters")
+    return key
+
+
+def idempotency_key_query(user_id: int, key: str) -> Select:
+    return select(IdempotencyKey).where(
+        IdempotencyKey.user_id == user_id,
+        IdempotencyKey.key == key
+    )
+
+
+def load_response(db: Session, user_id: int, key: str, fingerprint: str) -> Optional[dict]:
+    """Return the stored response for this key, or None if the request is new.
+
+    A key first used for a different request body is rejected with 422.
+    """
+    row = db.execute(idempotency_key_query(user_id, key)).scalars().first()
+    if row is None:
+        return None
+    if row.created_at is not None and row.created_at < datetime.now() - IDEMPOTENCY_KEY_TTL:
+        db.delete(row)
+        db.flush()
+        return None
+    if row.request_hash != fingerprint:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+    return json.loads(row.response)
+
+
+def store_response(db: Session, user_id: int, key: str, fingerprint: str, response: dict):
+    """Record the response in the caller's transaction; a concurrent duplicate fails on commit"""
+    db.add(IdempotencyKey(
+        user_id=user_id,
+        key=key,
+        request_hash=fingerprint,
+        response=json.dumps(jsonable_encoder(response)),
+        created_at=datetime.now()
+    ))
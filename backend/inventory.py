@@ -0,0 +1,450 @@
+# inventory.py
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from models import Coach, Seat, Booking, BookingSeat, RouteStation, CoachInventory
+from schedules import Departure
+from timetable import on_timetable_change
+
+# Occupancy warmed from the database is re-read after this many seconds so that
+# bookings made by other worker processes show up in availability.
+INVENTORY_RESYNC_SECONDS = 30
+
+
+class InventoryConflict(Exception):
+    """Another transaction allocated seats in the same coach first; the caller should retry"""
+
+
+class CoachLayout:
+    """Seat layout of one coach; entry i of an occupancy list refers to seat_ids[i]"""
+
+    __slots__ = ("coach_id", "train_id", "coach_number", "coach_type", "seat_ids", "seat_numbers")
+
+    def __init__(self, coach_id: int, train_id: int, coach_number: str, coach_type: str):
+        self.coach_id = coach_id
+        self.train_id = train_id
+        self.coach_number = coach_number
+        self.coach_type = coach_type
+        self.seat_ids: List[int] = []
+        self.seat_numbers: List[str] = []
+
+    def add_seat(self, seat_id: int, seat_number: str) -> int:
+        index = len(self.seat_ids)
+        self.seat_ids.append(seat_id)
+        self.seat_numbers.append(seat_number)
+        return index
+
+
+class TrainLayout:
+    """Coaches and stop order of one train.
+
+    Segment i is the stretch between the i-th and (i+1)-th stop by
+    sequence_number, so a journey between two stops is a contiguous run of
+    bits and two journeys overlap exactly when their masks share a bit.
+    """
+
+    __slots__ = ("train_id", "coaches", "stop_index", "station_sequence", "segment_count")
+
+    def __init__(self, train_id: int):
+        self.train_id = train_id
+        self.coaches: List[CoachLayout] = []
+        self.stop_index: Dict[int, int] = {}
+        self.station_sequence: Dict[int, int] = {}
+        self.segment_count = 1
+
+    def set_stops(self, stops: List[Tuple[int, int]]):
+        """Register the train's (sequence_number, station_id) stops"""
+        stops = sorted(stop for stop in stops if stop[0] is not None)
+        self.stop_index = {sequence: index for index, (sequence, _) in enumerate(stops)}
+        self.station_sequence = {station_id: sequence for sequence, station_id in stops}
+        self.segment_count = max(len(stops) - 1, 1)
+
+    @property
+    def full_mask(self) -> int:
+        return (1 << self.segment_count) - 1
+
+    def leg_for_stations(self, from_station_id: int, to_station_id: int) -> Tuple[int, int]:
+        """Return the (from, to) sequence numbers of a journey, raising ValueError if the train cannot serve it"""
+        from_sequence = self.station_sequence.get(from_station_id)
+        to_sequence = self.station_sequence.get(to_station_id)
+        if from_sequence is None or to_sequence is None:
+            raise ValueError("Train does not stop at both stations")
+        if from_sequence >= to_sequence:
+            raise ValueError("Train does not run in this direction")
+        return from_sequence, to_sequence
+
+    def leg_mask(self, from_sequence: Optional[int] = None, to_sequence: Optional[int] = None) -> int:
+        """Segment mask of a journey; a missing or unknown leg covers the whole route"""
+        start = self.stop_index.get(from_sequence)
+        end = self.stop_index.get(to_sequence)
+        if start is None or end is None or start >= end:
+            return self.full_mask
+        return ((1 << (end - start)) - 1) << start
+
+
+def layout_query(train_ids: Iterable[int]) -> Select:
+    """Coaches and seats of the trains, in coach and seat order"""
+    return select(
+        Coach.train_id, Coach.coach_id, Coach.coach_number, Coach.coach_type, Seat.seat_id, Seat.seat_number
+    ).outerjoin(
+        Seat, Seat.coach_id == Coach.coach_id
+    ).where(
+        Coach.train_id.in_(train_ids)
+    ).order_by(Coach.coach_id, Seat.seat_id)
+
+
+def layout_stops_query(train_ids: Iterable[int]) -> Select:
+    return select(
+        RouteStation.train_id, RouteStation.sequence_number, RouteStation.station_id
+    ).where(RouteStation.train_id.in_(train_ids))
+
+
+def booked_seats_query(departures: Iterable[Departure]) -> Select:
+    """Active booked seats with their legs on the departures, read by journey_date
+    so only those dates' partitions are scanned"""
+    departures = list(departures)
+    journey_dates = {departure.journey_date for departure in departures}
+    # A schedule belongs to one train, so its booked seats need no join to coaches
+    return select(
+        BookingSeat.schedule_id, BookingSeat.seat_id, Booking.from_sequence, Booking.to_sequence
+    ).join(
+        Booking, BookingSeat.booking_id == Booking.booking_id
+    ).where(
+        BookingSeat.journey_date.in_(journey_dates),
+        Booking.journey_date.in_(journey_dates),
+        BookingSeat.schedule_id.in_([departure.schedule_id for departure in departures]),
+        BookingSeat.is_active.is_(True)
+    )
+
+
+def coach_booked_seats_query(coach_id: int, departure: Departure) -> Select:
+    """Active booked seats with their legs in one coach on one departure"""
+    return select(
+        BookingSeat.seat_id, Booking.from_sequence, Booking.to_sequence
+    ).join(
+        Booking, BookingSeat.booking_id == Booking.booking_id
+    ).join(
+        Seat, BookingSeat.seat_id == Seat.seat_id
+    ).where(
+        Seat.coach_id == coach_id,
+        BookingSeat.journey_date == departure.journey_date,
+        Booking.journey_date == departure.journey_date,
+        BookingSeat.schedule_id == departure.schedule_id,
+        BookingSeat.is_active.is_(True)
+    )
+
+
+def coach_version_query(schedule_id: int, coach_id: int) -> Select:
+    return select(CoachInventory.version).where(
+        CoachInventory.schedule_id == schedule_id,
+        CoachInventory.coach_id == coach_id
+    )
+
+
+class SeatInventory:
+    """In-memory seat inventory keeping a segment bitmask per seat and schedule.
+
+    Layouts are loaded once per train and occupancy is warmed per departure
+    (train, schedule) from active BookingSeat rows, read by journey_date so
+    only that date's partition is scanned. A seat is free for a
+    journey when its mask shares no bit with the journey's leg mask, so the
+    same seat can be sold on non-overlapping legs. Callers keep the masks in
+    step with the database by calling mark_booked after a booking commits and
+    release after a booking is cancelled or deleted. allocate() re-reads a coach
+    from the database while holding its coach_inventory row, so bookings made by
+    other workers are never handed out twice.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._trains: Dict[int, TrainLayout] = {}
+        self._seat_slots: Dict[int, Tuple[CoachLayout, int]] = {}
+        self._warmed: Dict[Tuple[int, int], float] = {}
+        self._occupancy: Dict[int, Dict[int, List[int]]] = {}
+
+    def _load_layouts(self, db: Session, train_ids: Iterable[int]) -> Dict[int, TrainLayout]:
+        train_ids = list(train_ids)
+        missing = [train_id for train_id in set(train_ids) if train_id not in self._trains]
+        if missing:
+            coach_rows = db.execute(layout_query(missing)).all()
+            stop_rows = db.execute(layout_stops_query(missing)).all()
+
+            layouts = {train_id: TrainLayout(train_id) for train_id in missing}
+            by_coach: Dict[int, CoachLayout] = {}
+            for train_id, coach_id, coach_number, coach_type, seat_id, seat_number in coach_rows:
+                coach = by_coach.get(coach_id)
+                if coach is None:
+                    coach = CoachLayout(coach_id, train_id, coach_number, coach_type)
+                    by_coach[coach_id] = coach
+                    layouts[train_id].coaches.append(coach)
+                if seat_id is not None:
+                    self._seat_slots[seat_id] = (coach, coach.add_seat(seat_id, seat_number))
+
+            stops: Dict[int, List[Tuple[int, int]]] = {}
+            for train_id, sequence_number, station_id in stop_rows:
+                stops.setdefault(train_id, []).append((sequence_number, station_id))
+            for train_id, layout in layouts.items():
+                layout.set_stops(stops.get(train_id, []))
+
+            self._trains.update(layouts)
+        return {train_id: self._trains[train_id] for train_id in train_ids}
+
+    def _warm(self, db: Session, departures: Dict[int, Departure]) -> Dict[int, TrainLayout]:
+        """Load the layouts of the trains in `departures` (train_id -> departure) and
+        their occupancy on that departure"""
+        layouts = self._load_layouts(db, departures)
+        now = time.monotonic()
+        stale = {train_id: departure for train_id, departure in departures.items()
+                 if now - self._warmed.get((train_id, departure.schedule_id), float("-inf")) > INVENTORY_RESYNC_SECONDS}
+        if not stale:
+            return layouts
+
+        booked_rows = db.execute(booked_seats_query(stale.values())).all()
+
+        for train_id, departure in stale.items():
+            for coach in layouts[train_id].coaches:
+                self._occupancy.setdefault(coach.coach_id, {})[departure.schedule_id] = [0] * len(coach.seat_ids)
+            self._warmed[(train_id, departure.schedule_id)] = now
+        for schedule_id, seat_id, from_sequence, to_sequence in booked_rows:
+            self._apply(seat_id, schedule_id, from_sequence, to_sequence, True)
+
+        return layouts
+
+    def _apply(self, seat_id: int, schedule_id: int, from_sequence: Optional[int],
+               to_sequence: Optional[int], taken: bool):
+        slot = self._seat_slots.get(seat_id)
+        if slot is None:
+            return
+        coach, index = slot
+        occupancy = self._occupancy.get(coach.coach_id, {}).get(schedule_id)
+        if occupancy is None:
+            # Schedule not warmed yet; it will be read from the database later
+            return
+        mask = self._trains[coach.train_id].leg_mask(from_sequence, to_sequence)
+        if taken:
+            occupancy[index] |= mask
+        else:
+            occupancy[index] &= ~mask
+
+    def _take_free(self, coach: CoachLayout, schedule_id: int, leg_mask: int, count: int) -> List[dict]:
+        return self._free_seats(coach, self._occupancy[coach.coach_id][schedule_id], leg_mask, count)
+
+    @staticmethod
+    def _free_seats(coach: CoachLayout, occupancy: List[int], leg_mask: int, count: int) -> List[dict]:
+        seats = []
+        for index, occupied in enumerate(occupancy):
+            if len(seats) >= count:
+                break
+            if not occupied & leg_mask:
+                seats.append({
+                    "coach_id": coach.coach_id,
+                    "seat_id": coach.seat_ids[index],
+                    "seat_number": coach.seat_numbers[index]
+                })
+        return seats
+
+    def _sync_coach(self, db: Session, layout: TrainLayout, coach: CoachLayout, departure: Departure) -> List[int]:
+        """Read the coach's occupancy on the departure from the database.
+
+        Built from the layouts the caller captured rather than the shared
+        caches, which invalidate() may clear at any moment; the result is what
+        the caller allocates from. It also refreshes the cached occupancy when
+        the layout is still the cached one.
+        """
+        slots = {seat_id: index for index, seat_id in enumerate(coach.seat_ids)}
+        occupancy = [0] * len(coach.seat_ids)
+        booked_rows = db.execute(coach_booked_seats_query(coach.coach_id, departure)).all()
+        for seat_id, from_sequence, to_sequence in booked_rows:
+            index = slots.get(seat_id)
+            if index is not None:
+                occupancy[index] |= layout.leg_mask(from_sequence, to_sequence)
+        with self._lock:
+            if self._trains.get(coach.train_id) is layout:
+                self._occupancy.setdefault(coach.coach_id, {})[departure.schedule_id] = list(occupancy)
+        return occupancy
+
+    def _lock_coach(self, db: Session, coach: CoachLayout, schedule_id: int, skip_locked: bool) -> Optional[int]:
+        """Lock the coach's inventory row and return its version, or None if another transaction holds it"""
+        row = db.execute(
+            coach_version_query(schedule_id, coach.coach_id).with_for_update(skip_locked=skip_locked)
+        ).first()
+        if row is not None:
+            return row.version
+
+        exists = db.execute(coach_version_query(schedule_id, coach.coach_id)).first()
+        if exists is not None:
+            return None
+
+        # First allocation in this coach for the schedule: create its row, which
+        # stays locked by this transaction until it commits
+        try:
+            with db.begin_nested():
+                db.add(CoachInventory(schedule_id=schedule_id, coach_id=coach.coach_id, version=0))
+        except IntegrityError:
+            return None
+        return 0
+
+    def _bump_version(self, db: Session, coach: CoachLayout, schedule_id: int, version: int):
+        updated = db.query(CoachInventory).filter(
+            CoachInventory.schedule_id == schedule_id,
+            CoachInventory.coach_id == coach.coach_id,
+            CoachInventory.version == version
+        ).update({CoachInventory.version: version + 1}, synchronize_session=False)
+        if updated != 1:
+            raise InventoryConflict(f"Coach {coach.coach_id} changed during allocation")
+
+    def train_layout(self, db: Session, train_id: int) -> TrainLayout:
+        """Return the cached coach and stop layout of a train"""
+        with self._lock:
+            return self._load_layouts(db, [train_id])[train_id]
+
+    def train_layouts(self, db: Session, train_ids: Iterable[int]) -> Dict[int, TrainLayout]:
+        """Return the cached layouts of many trains, loading missing ones in one batch"""
+        with self._lock:
+            return self._load_layouts(db, train_ids)
+
+    def has_coach_type(self, db: Session, train_id: int, coach_type: str) -> bool:
+        """Check whether a train has at least one coach of the given type"""
+        return any(coach.coach_type == coach_type for coach in self.train_layout(db, train_id).coaches)
+
+    def find_free_seats(self, db: Session, train_id: int, coach_type: str, departure: Departure, count: int,
+                        from_sequence: Optional[int] = None, to_sequence: Optional[int] = None) -> List[dict]:
+        """Return up to `count` seats of `coach_type` free for the whole leg, filling coaches in order"""
+        schedule_id = departure.schedule_id
+        with self._lock:
+            layout = self._warm(db, {train_id: departure})[train_id]
+            leg_mask = layout.leg_mask(from_sequence, to_sequence)
+            seats = []
+            for coach in layout.coaches:
+                if coach.coach_type != coach_type:
+                    continue
+                seats.extend(self._take_free(coach, schedule_id, leg_mask, count - len(seats)))
+                if len(seats) >= count:
+                    break
+            return seats
+
+    def allocate(self, db: Session, train_id: int, coach_type: str, departure: Departure, count: int,
+                 from_sequence: Optional[int] = None, to_sequence: Optional[int] = None) -> List[dict]:
+        """Lock coaches of `coach_type` and pick up to `count` seats free for the whole leg.
+
+        Must run inside the booking transaction: the coach_inventory row of every
+        coach seats are taken from stays locked until the caller commits or
+        rolls back. Coaches held by other transactions are skipped first
+        (SELECT ... FOR UPDATE SKIP LOCKED) so concurrent bookings spread over
+        the coaches of a type, and are only waited for when the unlocked
+        coaches cannot fill the request. The row's version is bumped with a
+        compare-and-set, so databases without row locks (SQLite) raise
+        InventoryConflict instead of double-selling a seat.
+        """
+        schedule_id = departure.schedule_id
+        with self._lock:
+            layout = self._warm(db, {train_id: departure})[train_id]
+            leg_mask = layout.leg_mask(from_sequence, to_sequence)
+            coaches = [coach for coach in layout.coaches if coach.coach_type == coach_type]
+
+        seats = []
+        skipped = []
+        for skip_locked in (True, False):
+            candidates = coaches if skip_locked else skipped
+            for coach in candidates:
+                if len(seats) >= count:
+                    return seats
+                with self._lock:
+                    # The cached occupancy is gone if the caches were invalidated meanwhile
+                    cached = self._occupancy.get(coach.coach_id, {}).get(schedule_id)
+                    if skip_locked and cached is not None and not self._free_seats(coach, cached, leg_mask, 1):
+                        # Coach looks full; only worth waiting for if nothing else fits
+                        skipped.append(coach)
+                        continue
+
+                version = self._lock_coach(db, coach, schedule_id, skip_locked)
+                if version is None:
+                    skipped.append(coach)
+                    continue
+
+                occupancy = self._sync_coach(db, layout, coach, departure)
+                taken = self._free_seats(coach, occupancy, leg_mask, count - len(seats))
+                if taken:
+                    self._bump_version(db, coach, schedule_id, version)
+                    seats.extend(taken)
+        return seats
+
+    def coach_availability(self, db: Session, departures: Dict[int, Departure],
+                           legs: Dict[int, Tuple[int, int]] = None) -> Dict[int, List[dict]]:
+        """Count total, booked and available seats per coach for many trains.
+
+        `departures` maps each train_id to the departure to count; `legs` maps a
+        train_id to the (from, to) sequence numbers of the journey, and trains
+        without an entry are counted over their whole route. A seat counts as
+        booked when any booking overlaps the journey.
+        """
+        legs = legs or {}
+        with self._lock:
+            layouts = self._warm(db, departures)
+            availability = {}
+            for train_id, layout in layouts.items():
+                schedule_id = departures[train_id].schedule_id
+                leg_mask = layout.leg_mask(*legs.get(train_id, (None, None)))
+                coaches = []
+                for coach in layout.coaches:
+                    occupancy = self._occupancy[coach.coach_id][schedule_id]
+                    booked = sum(1 for occupied in occupancy if occupied & leg_mask)
+                    coaches.append({
+                        "coach_id": coach.coach_id,
+                        "coach_number": coach.coach_number,
+                        "coach_type": coach.coach_type,
+                        "total_seats": len(occupancy),
+                        "booked_seats": booked,
+                        "available_seats": len(occupancy) - booked
+                    })
+                availability[train_id] = coaches
+            return availability
+
+    def mark_booked(self, schedule_id: int, seat_ids: Iterable[int],
+                    from_sequence: Optional[int] = None, to_sequence: Optional[int] = None):
+        """Mark seats as taken for a leg once their booking is committed"""
+        with self._lock:
+            for seat_id in seat_ids:
+                self._apply(seat_id, schedule_id, from_sequence, to_sequence, True)
+
+    def release(self, schedule_id: int, seat_ids: Iterable[int],
+                from_sequence: Optional[int] = None, to_sequence: Optional[int] = None):
+        """Return seats on a leg to the free pool after a booking is cancelled or deleted"""
+        with self._lock:
+            for seat_id in seat_ids:
+                self._apply(seat_id, schedule_id, from_sequence, to_sequence, False)
+
+    def forget_schedules(self, schedule_ids: Iterable[int]):
+        """Drop the occupancy of departures that were purged"""
+        schedule_ids = set(schedule_ids)
+        with self._lock:
+            for occupancy in self._occupancy.values():
+                for schedule_id in schedule_ids & occupancy.keys():
+                    del occupancy[schedule_id]
+            for key in [key for key in self._warmed if key[1] in schedule_ids]:
+                del self._warmed[key]
+
+    def invalidate(self, train_id: int = None):
+        """Drop cached layouts and occupancy so they are reloaded from the database"""
+        with self._lock:
+            train_ids = [train_id] if train_id is not None else list(self._trains)
+            for tid in train_ids:
+                layout = self._trains.pop(tid, None)
+                if layout is None:
+                    continue
+                for coach in layout.coaches:
+                    for seat_id in coach.seat_ids:
+                        self._seat_slots.pop(seat_id, None)
+                    self._occupancy.pop(coach.coach_id, None)
+                for key in [key for key in self._warmed if key[0] == tid]:
+                    del self._warmed[key]
+
+
+seat_inventory = SeatInventory()
+on_timetable_change(seat_inventory.invalidate)
@@ -0,0 +1,211 @@
+# journey_planner.py
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from models import Schedule, Station, Train
+from timetable import compiled_timetable, on_timetable_change
+
+MIN_TRANSFER_MINUTES = 20
+MAX_TRANSFERS = 2
+CACHED_SERVICE_DAYS = 14
+
+
+class ConnectionTable:
+    """All train hops of one service day, sorted by departure time.
+
+    A connection is one train running between two consecutive stops. Times are
+    minutes after midnight of the service day, kept in parallel lists so the
+    scan touches plain ints only.
+    """
+
+    __slots__ = ("service_date", "departures", "arrivals", "from_stations", "to_stations",
+                 "trips", "trip_trains", "train_names", "station_names")
+
+    def __init__(self, service_date: date):
+        self.service_date = service_date
+        self.departures: List[int] = []
+        self.arrivals: List[int] = []
+        self.from_stations: List[int] = []
+        self.to_stations: List[int] = []
+        self.trips: List[int] = []
+        self.trip_trains: List[int] = []
+        self.train_names: Dict[int, str] = {}
+        self.station_names: Dict[int, str] = {}
+
+
+def departures_query(day_start: datetime) -> Select:
+    """Train and time of every departure in the service day starting at day_start"""
+    return select(Schedule.train_id, Schedule.departure_time).where(
+        Schedule.departure_time >= day_start,
+        Schedule.departure_time < day_start + timedelta(days=1)
+    )
+
+
+def compile_connections(db: Session, service_date: date) -> ConnectionTable:
+    """Build the connection table of a service day.
+
+    Only departures materialized for that day run, at their Schedule times, so
+    every itinerary can be booked; a train without a departure that day does
+    not run.
+    """
+    day_start = datetime.combine(service_date, datetime.min.time())
+    stop_times = compiled_timetable.stop_times(db)
+    schedule_rows = db.execute(departures_query(day_start)).all()
+    scheduled: Dict[int, List[int]] = {}
+    for train_id, departure_time in schedule_rows:
+        minutes = int((departure_time - day_start).total_seconds() // 60)
+        scheduled.setdefault(train_id, []).append(minutes)
+
+    table = ConnectionTable(service_date)
+    table.train_names = dict(db.query(Train.train_id, Train.train_name).all())
+    table.station_names = dict(db.query(Station.station_id, Station.station_name).all())
+
+    hops: List[Tuple[int, int, int, int, int]] = []
+    for train_id, stops in stop_times.items():
+        if len(stops) < 2:
+            continue
+        for start in scheduled.get(train_id, ()):
+            shift = start - stops[0].departure
+            trip = len(table.trip_trains)
+            table.trip_trains.append(train_id)
+            for origin, destination in zip(stops, stops[1:]):
+                hops.append((origin.departure + shift, destination.arrival + shift,
+                             origin.station_id, destination.station_id, trip))
+
+    hops.sort()
+    for departure, arrival, from_station, to_station, trip in hops:
+        table.departures.append(departure)
+        table.arrivals.append(arrival)
+        table.from_stations.append(from_station)
+        table.to_stations.append(to_station)
+        table.trips.append(trip)
+    return table
+
+
+class JourneyPlanner:
+    """Connection-scan planner for direct and connecting journeys.
+
+    One pass over the day's connections tracks, for every number of trains
+    used (1 = direct, up to MAX_TRANSFERS + 1), the earliest arrival at each
+    station. Connection tables are compiled once per service day and cached;
+    days without departures are not, so a window materialized by another
+    worker shows up on the next search.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tables: "OrderedDict[date, ConnectionTable]" = OrderedDict()
+
+    def table(self, db: Session, service_date: date) -> ConnectionTable:
+        with self._lock:
+            table = self._tables.get(service_date)
+            if table is not None:
+                self._tables.move_to_end(service_date)
+                return table
+        table = compile_connections(db, service_date)
+        if not table.trip_trains:
+            return table
+        with self._lock:
+            self._tables[service_date] = table
+            while len(self._tables) > CACHED_SERVICE_DAYS:
+                self._tables.popitem(last=False)
+        return table
+
+    def invalidate(self):
+        with self._lock:
+            self._tables.clear()
+
+    def plan(self, db: Session, from_station_id: int, to_station_id: int, service_date: date,
+             earliest_departure: int = 0) -> List[dict]:
+        """Return Pareto-optimal itineraries: the best journey for each number of trains
+        that arrives earlier than every journey using fewer trains"""
+        table = self.table(db, service_date)
+        max_legs = MAX_TRANSFERS + 1
+        arrival: List[Dict[int, int]] = [{} for _ in range(max_legs + 1)]
+        boarded: List[Dict[int, int]] = [{} for _ in range(max_legs + 1)]
+        reached: List[Dict[int, Tuple[int, int]]] = [{} for _ in range(max_legs + 1)]
+        arrival[0][from_station_id] = earliest_departure
+
+        departures, arrivals = table.departures, table.arrivals
+        from_stations, to_stations, trips = table.from_stations, table.to_stations, table.trips
+        best_direct = None
+
+        for i in range(bisect_left(departures, earliest_departure), len(departures)):
+            departure = departures[i]
+            if best_direct is not None and departure >= best_direct:
+                # Nothing leaving after the best direct arrival can beat it
+                break
+            trip, from_station, to_station = trips[i], from_stations[i], to_stations[i]
+            for legs in range(1, max_legs + 1):
+                board = boarded[legs].get(trip)
+                if board is None:
+                    ready = arrival[legs - 1].get(from_station)
+                    if ready is None:
+                        continue
+                    if legs > 1:
+                        ready += MIN_TRANSFER_MINUTES
+                    if ready > departure:
+                        continue
+                    board = boarded[legs][trip] = i
+                if arrivals[i] < arrival[legs].get(to_station, float("inf")):
+                    arrival[legs][to_station] = arrivals[i]
+                    reached[legs][to_station] = (board, i)
+                    if legs == 1 and to_station == to_station_id:
+                        best_direct = arrivals[i]
+
+        itineraries = []
+        best = float("inf")
+        for legs in range(1, max_legs + 1):
+            arrives = arrival[legs].get(to_station_id)
+            if arrives is None or arrives >= best:
+                continue
+            best = arrives
+            itineraries.append(self._itinerary(table, reached, legs, to_station_id))
+        return itineraries
+
+    def _itinerary(self, table: ConnectionTable, reached, legs: int, to_station_id: int) -> dict:
+        journey = []
+        station = to_station_id
+        for level in range(legs, 0, -1):
+            board, alight = reached[level][station]
+            journey.append((board, alight))
+            station = table.from_stations[board]
+        journey.reverse()
+
+        departure = table.departures[journey[0][0]]
+        arrival = table.arrivals[journey[-1][1]]
+        duration = arrival - departure
+        return {
+            "transfers": legs - 1,
+            "departure_time": self._format(table.service_date, departure),
+            "arrival_time": self._format(table.service_date, arrival),
+            "duration": f"{duration // 60}h {duration % 60}m",
+            "legs": [self._leg(table, board, alight) for board, alight in journey]
+        }
+
+    def _leg(self, table: ConnectionTable, board: int, alight: int) -> dict:
+        train_id = table.trip_trains[table.trips[board]]
+        return {
+            "train_id": train_id,
+            "train_name": table.train_names.get(train_id, "Unknown Train"),
+            "from_station": table.station_names.get(table.from_stations[board], "Unknown"),
+            "to_station": table.station_names.get(table.to_stations[alight], "Unknown"),
+            "departure_time": self._format(table.service_date, table.departures[board]),
+            "arrival_time": self._format(table.service_date, table.arrivals[alight])
+        }
+
+    @staticmethod
+    def _format(service_date: date, minutes: int) -> str:
+        moment = datetime.combine(service_date, datetime.min.time()) + timedelta(minutes=minutes)
+        return moment.strftime("%Y-%m-%d %H:%M")
+
+
+journey_planner = JourneyPlanner()
+on_timetable_change(journey_planner.invalidate)
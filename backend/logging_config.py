@@ -0,0 +1,53 @@
+# logging_config.py
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+
+# LOG_LEVEL=DEBUG|INFO|WARNING|ERROR, or OFF to silence the application loggers
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# LOG_FORMAT=json for one JSON object per line, text for human-readable lines
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record and its `extra` fields as a single JSON line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging():
+    """Set up the application's root logger from LOG_LEVEL and LOG_FORMAT"""
+    root = logging.getLogger("railtikit")
+    root.handlers.clear()
+    root.propagate = False
+    if LOG_LEVEL == "OFF":
+        root.addHandler(logging.NullHandler())
+        root.setLevel(logging.CRITICAL + 1)
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the application's root logger"""
+    return logging.getLogger(f"railtikit.{name}")
@@ -1,51 +1,53 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
+from sqlalchemy import insert, select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
+from sqlalchemy.exc import IntegrityError, OperationalError
 from jose import JWTError, jwt
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
 from typing import List
-import bcrypt
 import random
 import string
+import time
 
-from database import engine, get_db, Base
-from models import User, Train, Station, Coach, Route, Schedule, Seat, RouteStation, Booking, BookingSeat, Payment
+from auth import get_password_hash_async, password_needs_rehash, verify_password_async
+from database import engine, get_db, get_read_db, get_async_db, Base, SessionLocal, pool_usage, session_router
+from availability import (
+    get_coach_availability_map, get_train_coach_availability, resolve_departure, resolve_leg, resolve_station_ids
+)
+from fares import fare_engine
+from holds import hold_expiry, hold_sweeper
+from idempotency import load_response, request_fingerprint, store_response, validate_key
+from inventory import InventoryConflict, seat_inventory
+from journey_planner import journey_planner
+from logging_config import configure_logging, get_logger
+from metrics import MetricsMiddleware, metrics_payload
+from principal_cache import principal_cache
+from purge import purge_bookings_before, purge_departures_before, purge_jobs, purge_users
+from reference_cache import cached_json_response, reference_cache
+from route_index import route_index
+from schedules import SCHEDULE_WINDOW_DAYS, departure_index, materialize_schedules
+from ticket_tokens import (
+    check_ticket_token, issue_ticket_token, public_key_b64, ticket_revocations, warn_if_random_signing_key
+)
+from tickets import load_ticket_details, my_tickets_query, train_stops_query
+from timetable import compiled_timetable, notify_timetable_changed, timetable_watcher
+from models import User, Train, Station, Coach, Route, Schedule, Seat, Booking, BookingSeat, Payment
 from schemas import (
     UserCreate, UserUpdate, UserLogin, UserResponse, Token, TokenData,
     StationResponse, TrainSearchRequest, TrainSearchResponse, CoachInfo
 )
 
-# Helper functions for time parsing
-def parse_time_to_minutes(time_str):
-    """Convert time string (HH:MM format) to minutes"""
-    if not time_str or time_str == "N/A":
-        return None
-    try:
-        hours, minutes = map(int, time_str.split(':'))
-        return hours * 60 + minutes
-    except (ValueError, AttributeError):
-        return None
-
-def minutes_to_time_string(minutes, base_hour=8):
-    """Convert minutes to time string format"""
-    if minutes is None:
-        return "N/A"
-    try:
-        # If it's already a string (time format), just return it
-        if isinstance(minutes, str):
-            return minutes
-        total_minutes = base_hour * 60 + int(minutes)
-        hours = total_minutes // 60
-        mins = total_minutes % 60
-        return f"{hours:02d}:{mins:02d}"
-    except (ValueError, TypeError):
-        return "N/A"
-
 # Don't create tables automatically since they already exist
 # Base.metadata.create_all(bind=engine)
 
+configure_logging()
+logger = get_logger("main")
+
 app = FastAPI()
 
 # CORS middleware to allow frontend connections
@@ -57,23 +59,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Latency, status code and SQL statement metrics for every request, served at /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Security
 SECRET_KEY = "your-secret-key-here"  # Change this in production
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+# Largest page /my-tickets returns
+MY_TICKETS_MAX_PAGE_SIZE = 200
+
+# Most booking IDs /verify-tickets accepts in one request
+VERIFY_TICKETS_MAX_BATCH = 500
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# Seat allocation retries when a concurrent booking wins the race for a seat
+BOOKING_MAX_ATTEMPTS = 3
+BOOKING_RETRY_BACKOFF_SECONDS = 0.05
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 def get_user_by_email(db: Session, email: str):
     return db.query(User).filter(User.email == email).first()
 
+async def get_user_by_email_async(db: AsyncSession, email: str):
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalars().first()
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     if expires_delta:
@@ -84,7 +96,7 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -98,19 +110,94 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         token_data = TokenData(email=email)
     except JWTError:
         raise credentials_exception
-    user = get_user_by_email(db, email=token_data.email)
+    principal = principal_cache.get(token_data.email)
+    if principal is not None:
+        return principal
+    user = await get_user_by_email_async(db, email=token_data.email)
+    # End the read so the connection is not held idle for the rest of the request
+    await db.commit()
     if user is None:
         raise credentials_exception
-    return user
+    return principal_cache.put(token_data.email, user)
+
+def parse_journey_date(value) -> date | None:
+    """Parse an optional YYYY-MM-DD journey_date from a request body"""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="journey_date must be a date in YYYY-MM-DD format")
+
+def get_user_read_db(current_user: UserResponse = Depends(get_current_user)):
+    """Read-only session for the caller; stays on the primary right after they wrote"""
+    db = session_router.read_session(current_user.user_id)
+    try:
+        yield db
+    finally:
+        db.close()
+
+@app.on_event("startup")
+def check_ticket_signing_key():
+    """Warn when ticket tokens are signed with a random per-process key"""
+    warn_if_random_signing_key()
+
+@app.on_event("startup")
+def start_timetable_watcher():
+    """Rebuild timetable data when another worker publishes a timetable change"""
+    timetable_watcher.start()
+
+@app.on_event("startup")
+def build_route_index():
+    """Build the station -> train index so the first search does not pay for it"""
+    db = SessionLocal()
+    try:
+        route_index.build(db)
+    except Exception as e:
+        logger.warning("Route index will be built on first search", extra={"error": str(e)})
+    finally:
+        db.close()
+
+@app.on_event("startup")
+def materialize_departures():
+    """Make sure every train has its departures for the booking window"""
+    db = SessionLocal()
+    try:
+        materialize_schedules(db)
+    except Exception as e:
+        logger.warning("Schedules were not materialized at startup", extra={"error": str(e)})
+    finally:
+        db.close()
+
+@app.on_event("startup")
+def start_hold_sweeper():
+    """Release the seats of unpaid bookings once their hold runs out"""
+    hold_sweeper.start()
+
+@app.on_event("shutdown")
+def stop_hold_sweeper():
+    hold_sweeper.stop()
+
+@app.on_event("shutdown")
+def stop_timetable_watcher():
+    timetable_watcher.stop()
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus metrics in the text exposition format"""
+    payload, content_type = metrics_payload()
+    return Response(content=payload, media_type=content_type)
 
 @app.get("/")
 def root():
     return {"message": "Rail Tikit Backend is running 🚀"}
 
 @app.post("/signup", response_model=UserResponse)
-def signup(user: UserCreate, db: Session = Depends(get_db)):
+async def signup(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     # Check if user already exists
-    db_user = get_user_by_email(db, email=user.email)
+    db_user = await get_user_by_email_async(db, email=user.email)
+    # Don't hold the connection while hashing
+    await db.commit()
     if db_user:
         raise HTTPException(
             status_code=400,
@@ -118,7 +205,7 @@ def signup(user: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Create new user
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     db_user = User(
         name=user.name,
         email=user.email,
@@ -126,19 +213,25 @@ def signup(user: UserCreate, db: Session = Depends(get_db)):
         password=hashed_password  # Changed from hashed_password to password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 @app.post("/login", response_model=Token)
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = get_user_by_email(db, email=user.email)
-    if not db_user or not verify_password(user.password, db_user.password):  # Changed from hashed_password to password
+async def login(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    db_user = await get_user_by_email_async(db, email=user.email)
+    # Don't hold the connection while verifying
+    await db.commit()
+    if not db_user or not await verify_password_async(user.password, db_user.password):  # Changed from hashed_password to password
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if password_needs_rehash(db_user.password):
+        # Upgrade hashes made with an older cost factor while we have the password
+        db_user.password = await get_password_hash_async(user.password)
+        await db.commit()
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": db_user.email}, expires_delta=access_token_expires
@@ -146,194 +239,244 @@ def login(user: UserLogin, db: Session = Depends(get_db)):
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.get("/me", response_model=UserResponse)
-async def read_users_me(current_user: User = Depends(get_current_user)):
+async def read_users_me(current_user: UserResponse = Depends(get_current_user)):
     return current_user
 
 @app.put("/update-profile", response_model=UserResponse)
 async def update_profile(
     user_update: UserUpdate, 
-    current_user: User = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    current_user: UserResponse = Depends(get_current_user), 
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update user profile information"""
     # Check if email is being changed to one that already exists (for another user)
     if user_update.email != current_user.email:
-        existing_user = get_user_by_email(db, email=user_update.email)
+        existing_user = await get_user_by_email_async(db, email=user_update.email)
         if existing_user and existing_user.user_id != current_user.user_id:
             raise HTTPException(
                 status_code=400,
                 detail="Email already registered to another account"
             )
     
+    user = await db.get(User, current_user.user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    
     # Update user fields
-    current_user.name = user_update.name
-    current_user.email = user_update.email
-    current_user.phone = user_update.phone
+    user.name = user_update.name
+    user.email = user_update.email
+    user.phone = user_update.phone
     
     # If password is provided, update it (though for profile update, we might not want to allow password change)
     # For now, we'll skip password updates in profile update
     
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(user)
+    principal_cache.invalidate(current_user.email, user.email)
     
-    return current_user
+    return user
 
-@app.delete("/delete-account")
-async def delete_account(
-    current_user: User = Depends(get_current_user), 
-    db: Session = Depends(get_db)
-):
-    """Delete user account and all associated data"""
-    try:
-        # Delete all associated bookings and booking seats first (due to foreign key constraints)
-        bookings = db.query(Booking).filter(Booking.user_id == current_user.user_id).all()
-        for booking in bookings:
-            # Delete booking seats for this booking
-            db.query(BookingSeat).filter(BookingSeat.booking_id == booking.booking_id).delete()
-            # Delete payments for this booking
-            db.query(Payment).filter(Payment.booking_id == booking.booking_id).delete()
-        
-        # Delete all bookings
-        db.query(Booking).filter(Booking.user_id == current_user.user_id).delete()
-        
-        # Finally, delete the user
-        db.delete(current_user)
-        db.commit()
-        
-        return {"message": "Account deleted successfully"}
-        
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to delete account: {str(e)}"
-        )
+@app.delete("/delete-account", status_code=202)
+async def delete_account(current_user: UserResponse = Depends(get_current_user)):
+    """Delete user account and all associated data.
+
+    The purge runs in the background in short chunked transactions; poll
+    /purge-jobs/{job_id} for progress.
+    """
+    job = purge_jobs.submit("user", current_user.user_id, purge_users, [current_user.user_id])
+    return {"message": "Account deletion started", "job_id": job.job_id}
+
+@app.post("/admin/purge", status_code=202)
+def start_purge(request: dict, current_user: UserResponse = Depends(get_current_user)):
+    """Purge many users, all bookings made before a date, or all departures before a date, in the background"""
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    user_ids = request.get('user_ids')
+    before = request.get('before')
+    departed_before = request.get('departed_before')
+    if user_ids:
+        try:
+            user_ids = [int(user_id) for user_id in user_ids]
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="user_ids must be a list of integers")
+        job = purge_jobs.submit("users", current_user.user_id, purge_users, user_ids)
+    elif before:
+        try:
+            cutoff = datetime.strptime(before, "%Y-%m-%d")
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="before must be a date in YYYY-MM-DD format")
+        job = purge_jobs.submit("retention", current_user.user_id, purge_bookings_before, cutoff)
+    elif departed_before:
+        cutoff = parse_journey_date(departed_before)
+        job = purge_jobs.submit("departures", current_user.user_id, purge_departures_before, cutoff)
+    else:
+        raise HTTPException(status_code=400, detail="One of user_ids, before or departed_before is required")
+    
+    return job.to_dict()
+
+@app.get("/purge-jobs/{job_id}")
+def get_purge_job(job_id: int, current_user: UserResponse = Depends(get_current_user)):
+    """Report the progress of a purge job"""
+    job = purge_jobs.get(job_id)
+    if not job or (current_user.role != 'admin' and job.requested_by != current_user.user_id):
+        raise HTTPException(status_code=404, detail="Purge job not found")
+    
+    return job.to_dict()
+
+@app.post("/admin/refresh-timetable")
+def refresh_timetable(current_user: UserResponse = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Rebuild in-memory timetable data after trains, routes or schedules change"""
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    notify_timetable_changed(db)
+    route_index.build(db)
+    
+    return {"message": "Timetable data refreshed"}
+
+@app.post("/admin/materialize-schedules")
+def materialize_schedule_window(request: dict, current_user: UserResponse = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Create the missing departures of every train for a window of service dates"""
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    start = parse_journey_date(request.get('start')) or date.today()
+    days = request.get('days', SCHEDULE_WINDOW_DAYS)
+    if not isinstance(days, int) or not 0 < days <= 366:
+        raise HTTPException(status_code=400, detail="days must be an integer between 1 and 366")
+    
+    inserted = materialize_schedules(db, start, days)
+    return {"start": start.isoformat(), "days": days, "schedules_created": inserted}
+
+@app.get("/admin/pool-status")
+def get_pool_status(current_user: UserResponse = Depends(get_current_user)):
+    """Report database connection pool usage"""
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return pool_usage()
 
 @app.get("/protected")
-async def protected_route(current_user: User = Depends(get_current_user)):
+async def protected_route(current_user: UserResponse = Depends(get_current_user)):
     return {"message": f"Hello {current_user.name}, this is a protected route!"}
 
 # Station endpoints
 @app.get("/stations", response_model=List[StationResponse])
-def get_stations(db: Session = Depends(get_db)):
+def get_stations(request: Request, db: Session = Depends(get_read_db)):
     """Get all available stations"""
-    stations = db.query(Station).all()
-    return stations
+    entry = reference_cache.get("stations", lambda: [
+        StationResponse.model_validate(station) for station in db.query(Station).all()
+    ])
+    return cached_json_response(request, entry)
 
-@app.post("/search-trains")
-def search_trains(search_request: TrainSearchRequest, db: Session = Depends(get_db)):
+@app.post("/search-trains", response_model=List[TrainSearchResponse])
+def search_trains(search_request: TrainSearchRequest, db: Session = Depends(get_read_db)):
     """Search for available trains between stations"""
+    route_index.ensure(db)
+    
     # Get station IDs
-    from_station = db.query(Station).filter(Station.station_name == search_request.from_station).first()
-    to_station = db.query(Station).filter(Station.station_name == search_request.to_station).first()
+    from_station_id = route_index.station_id(search_request.from_station)
+    to_station_id = route_index.station_id(search_request.to_station)
     
-    if not from_station or not to_station:
+    if from_station_id is None or to_station_id is None:
         raise HTTPException(status_code=404, detail="Station not found")
     
-    # Get all trains (in real implementation, you would filter by route)
-    trains = db.query(Train).all()
+    # Only trains calling at from_station and later at to_station, and
+    # departing on the journey date
+    departures = departure_index.on_date(db, search_request.journey_date)
+    train_ids = [train_id for train_id in route_index.trains_between(from_station_id, to_station_id)
+                 if train_id in departures]
+    if not train_ids:
+        return []
+    
+    # Everything below is fetched for all candidate trains at once
+    trains = db.query(Train).filter(Train.train_id.in_(train_ids)).order_by(Train.train_id).all()
+    availability = get_coach_availability_map(
+        db, {train_id: departures[train_id] for train_id in train_ids}, from_station_id, to_station_id
+    )
+    timetable = compiled_timetable.trains(db)
+    # Fares of every coach class on the searched leg, priced in one pass
+    fares = fare_engine.leg_fares(db, {
+        train_id: [coach["coach_type"] for coach in coaches] for train_id, coaches in availability.items()
+    }, from_station_id, to_station_id)
     
     result = []
     for train in trains:
-        # Get coaches for this train
-        coaches = db.query(Coach).filter(Coach.train_id == train.train_id).all()
-        
         # Convert coaches to the required format
         available_coaches = []
-        for coach in coaches:
+        for coach in availability[train.train_id]:
             # Filter by travel class if specified
-            if search_request.travel_class and coach.coach_type != search_request.travel_class:
+            if search_request.travel_class and coach["coach_type"] != search_request.travel_class:
                 continue
             
-            # Calculate fare based on coach type (mock pricing)
-            fare_map = {
-                "AC First Class": 1500,
-                "AC Business": 1200,
-                "First Class": 800,
-                "Second Class": 500,
-                "Sleeper Class": 600
-            }
-            
-            coach_info = {
-                "coach_id": coach.coach_id,
-                "coach_type": coach.coach_type,
-                "available_seats": coach.total_seats - 10,  # Mock: assume 10 seats booked
-                "fare": fare_map.get(coach.coach_type, 500)
-            }
-            available_coaches.append(coach_info)
+            available_coaches.append({
+                "coach_id": coach["coach_id"],
+                "coach_type": coach["coach_type"],
+                "available_seats": coach["available_seats"],
+                "fare": fares[train.train_id][coach["coach_type"]]
+            })
         
         # Skip train if no matching coaches
         if search_request.travel_class and not available_coaches:
             continue
         
-        # Mock route stations (in real implementation, query from routes table)
-        route_stations = [
-            {"station": search_request.from_station, "arrival": "08:00", "departure": "08:00", "halt": "0m", "duration": "0h 0m"},
-            {"station": "Comilla", "arrival": "10:15", "departure": "10:20", "halt": "5m", "duration": "2h 15m"},
-            {"station": search_request.to_station, "arrival": "14:30", "departure": "14:30", "halt": "0m", "duration": "6h 30m"}
-        ]
+        # Stops of the journey itself, from boarding to alighting station,
+        # formatted once per train and segment by the compiled timetable
+        compiled = timetable.get(train.train_id)
+        segment = compiled.segment(from_station_id, to_station_id) if compiled else None
+        if segment is None:
+            continue
         
-        train_data = {
+        result.append({
             "train_id": train.train_id,
             "train_name": train.train_name,
             "train_type": train.train_type,
-            "departure_time": "08:00",  # Mock times
-            "arrival_time": "14:30",
-            "duration": "6h 30m",
-            "total_coaches": train.total_coaches,
+            "departure_time": segment["departure_time"],
+            "arrival_time": segment["arrival_time"],
+            "duration": segment["duration"],
+            "total_coaches": train.total_coaches if train.total_coaches is not None else len(availability[train.train_id]),
             "available_coaches": available_coaches,
-            "route_stations": route_stations
-        }
-        result.append(train_data)
+            "route_stations": segment["route_stations"]
+        })
     
     return result
 
 @app.get("/train-info")
-def get_train_info(train_name: str, db: Session = Depends(get_db)):
+def get_train_info(train_name: str, request: Request, db: Session = Depends(get_read_db)):
     """Get detailed information about a specific train"""
-    print(f"=== TRAIN INFO REQUEST FOR: {train_name} ===")
-    
+    entry = reference_cache.get(("train-info", train_name), lambda: build_train_info(db, train_name))
+    return cached_json_response(request, entry)
+
+def build_train_info(db: Session, train_name: str):
+    """Assemble the /train-info payload from the database"""
     # Get train by name
     train = db.query(Train).filter(Train.train_name == train_name).first()
     
     if not train:
-        print(f"Train '{train_name}' not found in database")
+        logger.info("Train not found", extra={"train_name": train_name})
         raise HTTPException(status_code=404, detail="Train not found")
     
-    print(f"Found train: {train.train_name} (ID: {train.train_id})")
-    
     # Get distance from routes table using train_id
     route = db.query(Route).filter(Route.train_id == train.train_id).first()
     
     if route and route.distance_km:
         # Convert decimal to float and format as string
         total_distance = f"{float(route.distance_km)} km"
-        print(f"Found route distance: {total_distance}")
     else:
         # Fallback distance if no route found
         total_distance = "264 km"
-        print(f"No route distance found, using fallback: {total_distance}")
+        logger.debug("No route distance found, using fallback", extra={"train_id": train.train_id})
     
-    # Get route stations for this train ordered by sequence_number
-    print("Querying route stations...")
-    route_stations_query = db.query(RouteStation, Station).join(
-        Station, RouteStation.station_id == Station.station_id
-    ).filter(RouteStation.train_id == train.train_id).order_by(RouteStation.sequence_number.asc().nulls_last()).all()
-    
-    print(f"Raw query result for train {train.train_id}:")
-    for rs, st in route_stations_query:
-        print(f"  Station: {st.station_name}, Sequence: {rs.sequence_number}, Arrival: {rs.arrival_offset_minutes}, Departure: {rs.departure_offset_minutes}")
-    
-    # If no results or sequence_number is NULL, try different approach
-    if not route_stations_query or all(rs.sequence_number is None for rs, st in route_stations_query):
-        print("Trying fallback ordering by station_id...")
-        route_stations_query = db.query(RouteStation, Station).join(
-            Station, RouteStation.station_id == Station.station_id
-        ).filter(RouteStation.train_id == train.train_id).order_by(RouteStation.station_id.asc()).all()
+    # Stops of this train in sequence order, with times parsed and formatted
+    # once by the compiled timetable
+    compiled = compiled_timetable.train(db, train.train_id)
+    stops = [stop for stop in compiled.stops if stop.station_name is not None] if compiled else []
+    journey_time = compiled.journey_text if compiled and compiled.journey_text else "N/A"
     
     # If no route stations found in database, return mock data based on train name
-    if not route_stations_query:
-        print(f"No route stations found for train {train.train_id}")
+    if not stops:
+        logger.debug("No route stations found, using mock route", extra={"train_id": train.train_id})
         # Create different mock routes for different train names
         mock_routes_by_name = {
             "Padma Express": [
@@ -370,26 +513,14 @@ def get_train_info(train_name: str, db: Session = Depends(get_db)):
         }
         
         route_stations = mock_routes_by_name.get(train_name, mock_routes_by_name["Padma Express"])
+        journey_time = "6h 30m"  # Mock calculation
     else:
-        print(f"Found {len(route_stations_query)} route stations for train {train.train_id}")
-        
-        # Sort the results manually by sequence_number to ensure proper ordering
-        route_stations_query = sorted(route_stations_query, key=lambda x: x[0].sequence_number if x[0].sequence_number is not None else 999)
-        
-        print("Final ordered stations:")
-        route_stations = []
-        for i, (route_station, station) in enumerate(route_stations_query):
-            print(f"  {i+1}. {station.station_name} (seq: {route_station.sequence_number})")
-            # Calculate times based on offsets
-            arrival_time = minutes_to_time_string(route_station.arrival_offset_minutes) if route_station.arrival_offset_minutes else "N/A"
-            departure_time = minutes_to_time_string(route_station.departure_offset_minutes) if route_station.departure_offset_minutes else "N/A"
-            
-            route_stations.append({
-                "station": station.station_name,
-                "arrival": arrival_time,
-                "departure": departure_time,
-                "halt": f"{route_station.halt_minutes}m" if route_station.halt_minutes else "0m"
-            })
+        route_stations = [{
+            "station": stop.station_name,
+            "arrival": stop.arrival_text or "N/A",
+            "departure": stop.departure_text or "N/A",
+            "halt": stop.halt_text
+        } for stop in stops]
     
     # Prepare response
     train_info = {
@@ -402,52 +533,36 @@ def get_train_info(train_name: str, db: Session = Depends(get_db)):
         "departure_time": route_stations[0]["departure"] if route_stations else "08:00",
         "arrival_time": route_stations[-1]["arrival"] if route_stations else "14:30",
         "total_distance": total_distance,
-        "journey_time": "6h 30m"  # Mock calculation
+        "journey_time": journey_time
     }
     
-    print(f"Returning response with distance: {train_info['total_distance']}")
-    print(f"Route stations count: {len(route_stations)}")
-    print("=== END TRAIN INFO REQUEST ===")
+    logger.debug("Built train info", extra={"train_id": train.train_id, "route_stations": len(route_stations)})
     
     return train_info
 
 @app.post("/search-trains-by-route")
-def search_trains_by_route(request: TrainSearchRequest, current_user: UserResponse = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Search trains that have routes containing both from_station and to_station"""
+def search_trains_by_route(request: TrainSearchRequest, current_user: UserResponse = Depends(get_current_user), db: Session = Depends(get_user_read_db)):
+    """Search trains that stop at from_station and later at to_station"""
+    route_index.ensure(db)
     
     # Get station IDs for from_station and to_station
-    from_station_obj = db.query(Station).filter(Station.station_name == request.from_station).first()
-    to_station_obj = db.query(Station).filter(Station.station_name == request.to_station).first()
+    from_station_id = route_index.station_id(request.from_station)
+    to_station_id = route_index.station_id(request.to_station)
     
-    if not from_station_obj:
+    if from_station_id is None:
         raise HTTPException(status_code=404, detail=f"Station '{request.from_station}' not found")
-    if not to_station_obj:
+    if to_station_id is None:
         raise HTTPException(status_code=404, detail=f"Station '{request.to_station}' not found")
     
-    # Get train_ids that have routes containing both stations
-    # First, get all train_ids that have from_station
-    from_trains = db.query(RouteStation.train_id).filter(
-        RouteStation.station_id == from_station_obj.station_id
-    ).subquery()
-    
-    # Then, get train_ids that also have to_station
-    to_trains = db.query(RouteStation.train_id).filter(
-        RouteStation.station_id == to_station_obj.station_id
-    ).subquery()
-    
-    # Find common train_ids
-    common_train_ids = db.query(from_trains.c.train_id).intersect(
-        db.query(to_trains.c.train_id)
-    ).all()
+    # Intersect the stations' train lists in memory, keeping only trains that
+    # reach from_station before to_station
+    train_ids = route_index.trains_between(from_station_id, to_station_id)
     
-    if not common_train_ids:
+    if not train_ids:
         return []  # No trains available
     
-    # Extract train_ids from the result
-    train_ids = [train_id[0] for train_id in common_train_ids]
-    
     # Get train details for these train_ids
-    trains = db.query(Train).filter(Train.train_id.in_(train_ids)).all()
+    trains = db.query(Train).filter(Train.train_id.in_(train_ids)).order_by(Train.train_id).all()
     
     # Format response
     result = []
@@ -461,6 +576,23 @@ def search_trains_by_route(request: TrainSearchRequest, current_user: UserRespon
     
     return result
 
+@app.post("/search-journeys")
+def search_journeys(request: TrainSearchRequest, current_user: UserResponse = Depends(get_current_user), db: Session = Depends(get_user_read_db)):
+    """Find the best direct and connecting journeys between two stations on the journey date"""
+    route_index.ensure(db)
+    
+    from_station_id = route_index.station_id(request.from_station)
+    to_station_id = route_index.station_id(request.to_station)
+    
+    if from_station_id is None:
+        raise HTTPException(status_code=404, detail=f"Station '{request.from_station}' not found")
+    if to_station_id is None:
+        raise HTTPException(status_code=404, detail=f"Station '{request.to_station}' not found")
+    if from_station_id == to_station_id:
+        raise HTTPException(status_code=400, detail="From and to stations must differ")
+    
+    return journey_planner.plan(db, from_station_id, to_station_id, request.journey_date)
+
 @app.post("/refresh-coach-availability")
 def refresh_coach_availability(request: dict, current_user: UserResponse = Depends(get_current_user), db: Session = Depends(get_db)):
     """Refresh coach availability after booking to get updated seat counts"""
@@ -469,185 +601,179 @@ def refresh_coach_availability(request: dict, current_user: UserResponse = Depen
     if not train_id:
         raise HTTPException(status_code=400, detail="train_id is required")
     
-    # Get train
-    train = db.query(Train).filter(Train.train_id == train_id).first()
-    if not train:
-        raise HTTPException(status_code=404, detail="Train not found")
-    
-    # Get coaches for this train
-    coaches = db.query(Coach).filter(Coach.train_id == train_id).all()
-    
-    result = []
-    for coach in coaches:
-        # Count total seats for this coach
-        total_seats = db.query(Seat).filter(Seat.coach_id == coach.coach_id).count()
-        
-        # Count booked seats (seats that are in booking_seats table with confirmed bookings)
-        booked_seats_count = db.query(BookingSeat).join(
-            Booking, BookingSeat.booking_id == Booking.booking_id
-        ).join(
-            Seat, BookingSeat.seat_id == Seat.seat_id
-        ).filter(
-            Seat.coach_id == coach.coach_id,
-            Booking.status == 'confirmed'
-        ).count()
-        
-        available_seats = total_seats - booked_seats_count
-        
-        # Price mapping based on coach type
-        fare_map = {
-            "AC_Cabin": 2500,
-            "AC_Chair": 1200,
-            "Snigdha": 800,
-            "Shovon": 400,
-            "AC First Class": 1500,
-            "AC Business": 1200,
-            "First Class": 800,
-            "Second Class": 500,
-            "Sleeper Class": 600
-        }
-        
-        coach_data = {
-            "coach_type": coach.coach_type,
-            "total_seats": total_seats,
-            "booked_seats": booked_seats_count,
-            "available_seats": available_seats,
-            "price": fare_map.get(coach.coach_type, 500)
-        }
-        result.append(coach_data)
+    try:
+        train_id = int(train_id)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid train ID format")
     
-    return result
+    return coach_availability_response(
+        db, train_id, request.get('from_station'), request.get('to_station'),
+        parse_journey_date(request.get('journey_date'))
+    )
 
 @app.get("/coach-availability/{train_id}")
-def get_coach_availability(train_id: int, current_user: UserResponse = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Get coach availability information for a specific train"""
+def get_coach_availability(
+    train_id: int,
+    from_station: str | None = None,
+    to_station: str | None = None,
+    journey_date: date | None = None,
+    current_user: UserResponse = Depends(get_current_user),
+    db: Session = Depends(get_user_read_db)
+):
+    """Get coach availability of a train on the journey date (default: its next departure),
+    optionally for one leg of its route"""
+    return coach_availability_response(db, train_id, from_station, to_station, journey_date)
+
+def coach_availability_response(db: Session, train_id: int, from_station: str | None = None, to_station: str | None = None,
+                                journey_date: date | None = None):
+    """Build the per-coach availability payload shared by the availability endpoints"""
     # Get train
     train = db.query(Train).filter(Train.train_id == train_id).first()
     if not train:
         raise HTTPException(status_code=404, detail="Train not found")
     
-    # Get coaches for this train
-    coaches = db.query(Coach).filter(Coach.train_id == train_id).all()
+    departure = resolve_departure(db, train_id, journey_date)
+    
+    # Only bookings overlapping the requested leg count as booked
+    from_station_id, to_station_id = resolve_station_ids(db, from_station, to_station)
+    from_sequence, to_sequence = resolve_leg(seat_inventory.train_layout(db, train_id), from_station_id, to_station_id)
     
     result = []
-    for coach in coaches:
-        # Count total seats for this coach
-        total_seats = db.query(Seat).filter(Seat.coach_id == coach.coach_id).count()
-        
-        # Count booked seats (seats that are in booking_seats table with confirmed bookings)
-        booked_seats_count = db.query(BookingSeat).join(
-            Booking, BookingSeat.booking_id == Booking.booking_id
-        ).join(
-            Seat, BookingSeat.seat_id == Seat.seat_id
-        ).filter(
-            Seat.coach_id == coach.coach_id,
-            Booking.status == 'confirmed'
-        ).count()
-        
-        available_seats = total_seats - booked_seats_count
-        
-        # Price mapping based on coach type
-        fare_map = {
-            "AC_Cabin": 2500,
-            "AC_Chair": 1200,
-            "Snigdha": 800,
-            "Shovon": 400,
-            "AC First Class": 1500,
-            "AC Business": 1200,
-            "First Class": 800,
-            "Second Class": 500,
-            "Sleeper Class": 600
-        }
-        
-        coach_data = {
-            "coach_type": coach.coach_type,
-            "total_seats": total_seats,
-            "booked_seats": booked_seats_count,
-            "available_seats": available_seats,
-            "price": fare_map.get(coach.coach_type, 500)
-        }
-        result.append(coach_data)
+    for coach in get_train_coach_availability(db, train_id, departure, from_station_id, to_station_id):
+        result.append({
+            "coach_type": coach["coach_type"],
+            "total_seats": coach["total_seats"],
+            "booked_seats": coach["booked_seats"],
+            "available_seats": coach["available_seats"],
+            "price": fare_engine.fare(db, train_id, coach["coach_type"], from_sequence, to_sequence)
+        })
     
     return result
 
 @app.post("/create-booking")
-def create_booking(booking_data: dict, current_user: UserResponse = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Create a new booking entry and allocate seats"""
+def create_booking(
+    booking_data: dict,
+    idempotency_key: str | None = Header(None),
+    current_user: UserResponse = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Create a new booking entry and hold its seats until it is paid.
+
+    The seats go back on sale if /create-payment does not confirm the booking
+    before hold_expires_at. With an Idempotency-Key header, a retried request returns the original
+    booking instead of allocating seats again.
+    """
     try:
-        # Find coaches of the requested type for this train
-        coaches = db.query(Coach).filter(
-            Coach.train_id == booking_data['train_id'],
-            Coach.coach_type == booking_data['coach_type']
-        ).all()
+        idempotency_key = validate_key(idempotency_key)
+        fingerprint = request_fingerprint(booking_data) if idempotency_key else None
+        if idempotency_key:
+            stored = load_response(db, current_user.user_id, idempotency_key, fingerprint)
+            if stored is not None:
+                return stored
+        
+        try:
+            train_id = int(booking_data['train_id'])
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid train ID format")
+        coach_type = booking_data['coach_type']
+        ticket_count = booking_data['ticket_count']
+        if not isinstance(ticket_count, int) or isinstance(ticket_count, bool) or ticket_count < 1:
+            raise HTTPException(status_code=400, detail="ticket_count must be a positive integer")
         
-        if not coaches:
+        # Find coaches of the requested type for this train
+        if not seat_inventory.has_coach_type(db, train_id, coach_type):
             raise HTTPException(status_code=404, detail="No coaches of this type found for the train")
         
-        # Find available seats
-        available_seats = []
-        for coach in coaches:
-            # Get all seats for this coach
-            coach_seats = db.query(Seat).filter(Seat.coach_id == coach.coach_id).all()
-            
-            # Get already booked seats for this coach
-            booked_seat_ids = db.query(BookingSeat.seat_id).join(
-                Booking, BookingSeat.booking_id == Booking.booking_id
-            ).join(
-                Seat, BookingSeat.seat_id == Seat.seat_id
-            ).filter(
-                Seat.coach_id == coach.coach_id,
-                Booking.status == 'confirmed'
-            ).all()
-            booked_seat_ids = [seat_id[0] for seat_id in booked_seat_ids]
-            
-            # Find available seats in this coach
-            for seat in coach_seats:
-                if seat.seat_id not in booked_seat_ids:
-                    available_seats.append(seat)
-                    if len(available_seats) >= booking_data['ticket_count']:
-                        break
-            
-            if len(available_seats) >= booking_data['ticket_count']:
-                break
+        # Seats are sold per departure: the train's run on the journey date
+        departure = resolve_departure(db, train_id, parse_journey_date(booking_data.get('journey_date')))
+        schedule_id = departure.schedule_id
         
-        if len(available_seats) < booking_data['ticket_count']:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Only {len(available_seats)} seats available, but {booking_data['ticket_count']} requested"
-            )
+        # The seat is only reserved between the boarding and alighting stops
+        from_station_id, to_station_id = resolve_station_ids(db, booking_data.get('from_station'), booking_data.get('to_station'))
+        layout = seat_inventory.train_layout(db, train_id)
+        from_sequence, to_sequence = resolve_leg(layout, from_station_id, to_station_id)
+        coach_numbers = {coach.coach_id: coach.coach_number for coach in layout.coaches}
         
-        # Create a new booking
-        new_booking = Booking(
-            user_id=current_user.user_id,
-            schedule_id=1,  # Mock schedule ID - in real implementation, find actual schedule
-            booking_date=datetime.now(),
-            status='confirmed'
-        )
+        # Priced on the server; a client-supplied total_amount is ignored
+        fare_per_ticket = fare_engine.fare(db, train_id, coach_type, from_sequence, to_sequence)
         
-        db.add(new_booking)
-        db.commit()
-        db.refresh(new_booking)
-        
-        # Create booking seats entries for the allocated seats
-        fare_per_ticket = booking_data['total_amount'] / booking_data['ticket_count']
-        allocated_seats = available_seats[:booking_data['ticket_count']]
-        
-        for seat in allocated_seats:
-            booking_seat = BookingSeat(
-                booking_id=new_booking.booking_id,
-                seat_id=seat.seat_id,
-                fare=fare_per_ticket
-            )
-            db.add(booking_seat)
+        # Seats are picked under per-coach inventory locks; the booking, its seat
+        # rows and the idempotency record are written in one transaction. Lost
+        # version checks and lock conflicts the database reports instead of
+        # waiting (deadlocks, SQLite busy errors) are retried a bounded number
+        # of times.
+        for attempt in range(BOOKING_MAX_ATTEMPTS):
+            try:
+                allocated_seats = seat_inventory.allocate(
+                    db, train_id, coach_type, departure, ticket_count, from_sequence, to_sequence
+                )
+                
+                if len(allocated_seats) < ticket_count:
+                    raise HTTPException(
+                        status_code=400, 
+                        detail=f"Only {len(allocated_seats)} seats available, but {ticket_count} requested"
+                    )
+                
+                # Create a new booking holding the seats until it is paid
+                booking_date = datetime.now()
+                hold_expires_at = hold_expiry(booking_date)
+                booking_id = db.execute(insert(Booking).values(
+                    user_id=current_user.user_id,
+                    schedule_id=schedule_id,
+                    journey_date=departure.journey_date,
+                    booking_date=booking_date,
+                    status='held',
+                    hold_expires_at=hold_expires_at,
+                    from_sequence=from_sequence,
+                    to_sequence=to_sequence
+                ).returning(Booking.booking_id)).scalar_one()
+                
+                # Create booking seats entries for the allocated seats in one statement
+                db.scalars(insert(BookingSeat).returning(BookingSeat.booking_seat_id), [{
+                    "booking_id": booking_id,
+                    "seat_id": seat["seat_id"],
+                    "schedule_id": schedule_id,
+                    "journey_date": departure.journey_date,
+                    "fare": fare_per_ticket
+                } for seat in allocated_seats]).all()
+                
+                response = {
+                    "booking_id": booking_id,
+                    "status": "held",
+                    "hold_expires_at": hold_expires_at.strftime("%Y-%m-%d %H:%M:%S"),
+                    "journey_date": departure.journey_date.isoformat(),
+                    "fare_per_ticket": fare_per_ticket,
+                    "total_amount": fare_per_ticket * ticket_count,
+                    "allocated_seats": [{"seat_id": seat["seat_id"], "seat_number": seat["seat_number"]} for seat in allocated_seats],
+                    "ticket_token": issue_ticket_token(
+                        booking_id,
+                        train_id,
+                        [f"{coach_numbers.get(seat['coach_id'], '?')}/{seat['seat_number']}" for seat in allocated_seats],
+                        departure.journey_date,
+                        paid=False
+                    ),
+                    "message": "Seats held, pay before the hold expires to confirm the booking"
+                }
+                if idempotency_key:
+                    store_response(db, current_user.user_id, idempotency_key, fingerprint, response)
+                
+                db.commit()
+                break
+            except (InventoryConflict, IntegrityError, OperationalError):
+                db.rollback()
+                if idempotency_key:
+                    # A concurrent request with the same key may have won
+                    stored = load_response(db, current_user.user_id, idempotency_key, fingerprint)
+                    if stored is not None:
+                        return stored
+                if attempt == BOOKING_MAX_ATTEMPTS - 1:
+                    raise HTTPException(status_code=409, detail="Seats are in high demand, please try again")
+                time.sleep(random.uniform(0, BOOKING_RETRY_BACKOFF_SECONDS * (attempt + 1)))
         
-        db.commit()
+        seat_inventory.mark_booked(schedule_id, [seat["seat_id"] for seat in allocated_seats], from_sequence, to_sequence)
+        session_router.mark_write(current_user.user_id)
         
-        return {
-            "booking_id": new_booking.booking_id,
-            "status": "confirmed",
-            "allocated_seats": [{"seat_id": seat.seat_id, "seat_number": seat.seat_number} for seat in allocated_seats],
-            "message": "Booking created successfully"
-        }
+        return response
     
     except HTTPException:
         db.rollback()
@@ -656,24 +782,124 @@ def create_booking(booking_data: dict, current_user: UserResponse = Depends(get_
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to create booking: {str(e)}")
 
+@app.post("/cancel-booking")
+def cancel_booking(request: dict, current_user: UserResponse = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Cancel a held or confirmed booking and return its seats to the inventory"""
+    booking_id = request.get('booking_id')
+    
+    if not booking_id:
+        raise HTTPException(status_code=400, detail="booking_id is required")
+    
+    booking = db.query(Booking).filter(Booking.booking_id == booking_id).first()
+    if not booking or booking.user_id != current_user.user_id:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    if booking.status not in ('held', 'confirmed'):
+        raise HTTPException(status_code=400, detail=f"Booking is already {booking.status}")
+    
+    try:
+        seat_ids = [seat_id for (seat_id,) in db.query(BookingSeat.seat_id).filter(
+            BookingSeat.booking_id == booking.booking_id,
+            BookingSeat.journey_date == booking.journey_date
+        ).all()]
+        booking.status = 'cancelled'
+        booking.hold_expires_at = None
+        db.query(BookingSeat).filter(
+            BookingSeat.booking_id == booking.booking_id,
+            BookingSeat.journey_date == booking.journey_date
+        ).update({BookingSeat.is_active: False}, synchronize_session=False)
+        db.commit()
+        seat_inventory.release(booking.schedule_id, seat_ids, booking.from_sequence, booking.to_sequence)
+        ticket_revocations.add({booking.booking_id: booking.journey_date})
+        session_router.mark_write(current_user.user_id)
+        
+        return {
+            "booking_id": booking.booking_id,
+            "status": "cancelled",
+            "message": "Booking cancelled successfully"
+        }
+    
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to cancel booking: {str(e)}")
+
 @app.post("/create-payment")
 def create_payment(payment_data: dict, current_user: UserResponse = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Create a new payment entry"""
+    """Pay for a held booking, confirming it while its hold is still open"""
+    booking_id = payment_data.get('booking_id')
+    
+    if not booking_id:
+        raise HTTPException(status_code=400, detail="booking_id is required")
+    
+    try:
+        booking_id = int(booking_id)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid booking ID format")
+    
+    # The booking is paid at the fares create-booking charged; a client amount must match them.
+    # Only the owner's bookings are summed, so another user's total is never revealed
+    total_amount = db.query(func.sum(BookingSeat.fare)).join(
+        Booking, BookingSeat.booking_id == Booking.booking_id
+    ).filter(
+        BookingSeat.booking_id == booking_id,
+        Booking.user_id == current_user.user_id
+    ).scalar()
+    if total_amount is None:
+        owner = db.query(Booking.user_id).filter(Booking.booking_id == booking_id).scalar()
+        if owner != current_user.user_id:
+            raise HTTPException(status_code=404, detail="Booking not found")
+        raise HTTPException(status_code=400, detail="Booking has no seats to pay for")
+    if payment_data.get('amount') is not None:
+        try:
+            matches = Decimal(str(payment_data['amount'])) == total_amount
+        except InvalidOperation:
+            matches = False
+        if not matches:
+            raise HTTPException(status_code=400, detail=f"amount must be {total_amount}")
+    
+    # Confirm only an open hold; the hold sweep may be expiring it right now
+    confirmed = db.execute(update(Booking).where(
+        Booking.booking_id == booking_id,
+        Booking.user_id == current_user.user_id,
+        Booking.status == 'held',
+        Booking.hold_expires_at > datetime.now()
+    ).values(
+        status='confirmed', hold_expires_at=None
+    ).execution_options(synchronize_session=False)).rowcount
+    if not confirmed:
+        db.rollback()
+        booking = db.query(Booking.user_id, Booking.status).filter(Booking.booking_id == booking_id).first()
+        if not booking or booking.user_id != current_user.user_id:
+            raise HTTPException(status_code=404, detail="Booking not found")
+        if booking.status == 'held':
+            raise HTTPException(status_code=409, detail="Seat hold has expired, please book again")
+        raise HTTPException(status_code=400, detail=f"Booking is already {booking.status}")
+    
     try:
-        new_payment = Payment(
-            booking_id=payment_data['booking_id'],
-            amount=payment_data['amount'],
+        payment_id = db.execute(insert(Payment).values(
+            booking_id=booking_id,
+            amount=total_amount,
             payment_date=datetime.now(),
             status='paid'
-        )
-        
-        db.add(new_payment)
+        ).returning(Payment.payment_id)).scalar_one()
         db.commit()
-        db.refresh(new_payment)
+        session_router.mark_write(current_user.user_id)
+        
+        # Re-issue the ticket token with the paid status
+        ticket_token = None
+        ticket = load_ticket_details(db, [booking_id]).get(booking_id)
+        if ticket and ticket["seat_details"]:
+            ticket_token = issue_ticket_token(
+                ticket["booking_id"],
+                ticket["train_id"],
+                [f"{seat['coach_number']}/{seat['seat_number']}" for seat in ticket["seat_details"]],
+                date.fromisoformat(ticket["journey_date"]),
+                paid=True
+            )
         
         return {
-            "payment_id": new_payment.payment_id,
+            "payment_id": payment_id,
             "status": "paid",
+            "ticket_token": ticket_token,
             "message": "Payment processed successfully"
         }
     
@@ -682,87 +908,79 @@ def create_payment(payment_data: dict, current_user: UserResponse = Depends(get_
         raise HTTPException(status_code=500, detail=f"Failed to process payment: {str(e)}")
 
 @app.get("/my-tickets")
-def get_my_tickets(current_user: UserResponse = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Get user's booking history with proper train and route data"""
+def get_my_tickets(
+    limit: int = Query(50, ge=1, le=MY_TICKETS_MAX_PAGE_SIZE),
+    after_booking_id: int | None = None,
+    trips: str = Query("all", pattern="^(all|upcoming|past)$"),
+    current_user: UserResponse = Depends(get_current_user),
+    db: Session = Depends(get_user_read_db)
+):
+    """Get user's booking history, newest bookings first, a page at a time.
+
+    Pass the returned next_after_booking_id as after_booking_id to fetch the
+    next (older) page; `trips` limits the page to upcoming or past journeys.
+    """
     try:
-        # Get user's bookings with related data
-        bookings = db.query(Booking).filter(Booking.user_id == current_user.user_id).all()
+        # A trip is upcoming until its journey date has passed
+        current_date = datetime.now().date()
+        
+        # One row per booking with its seat count, fare total, train and coach type
+        rows = db.execute(my_tickets_query(
+            current_user.user_id, current_date, after_booking_id, trips, limit + 1
+        )).all()
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        # Route stations of every train on the page, resolved once per train
+        train_stops = {}
+        if rows:
+            stops = db.execute(train_stops_query({row.train_id for row in rows})).all()
+            for train_id, sequence_number, station_name in stops:
+                train_stops.setdefault(train_id, []).append((sequence_number, station_name))
         
         upcoming_trips = []
         past_trips = []
-        current_date = datetime.now().date()
         
-        for booking in bookings:
-            try:
-                # Get booking seats and seat details
-                booking_seats = db.query(BookingSeat).join(
-                    Seat, BookingSeat.seat_id == Seat.seat_id
-                ).join(
-                    Coach, Seat.coach_id == Coach.coach_id
-                ).join(
-                    Train, Coach.train_id == Train.train_id
-                ).filter(BookingSeat.booking_id == booking.booking_id).all()
-                
-                if not booking_seats:
-                    continue
-                
-                # Get train, coach, and route information from booking seats
-                first_seat = booking_seats[0]
-                coach = db.query(Coach).filter(Coach.coach_id == first_seat.seat.coach_id).first()
-                train = db.query(Train).filter(Train.train_id == coach.train_id).first() if coach else None
-                
-                # Get route stations for this train to determine from/to stations
-                route_stations = db.query(RouteStation, Station).join(
-                    Station, RouteStation.station_id == Station.station_id
-                ).filter(RouteStation.train_id == train.train_id).order_by(RouteStation.sequence_number).all()
-                
-                from_station = "Unknown"
-                to_station = "Unknown"
-                
-                if route_stations:
-                    # Get first and last stations from route
-                    from_station = route_stations[0][1].station_name if route_stations else "Unknown"
-                    to_station = route_stations[-1][1].station_name if route_stations else "Unknown"
-                
-                # Calculate journey date (booking_date + 7 days for demo)
-                journey_date = (booking.booking_date + timedelta(days=7)).date()
-                
-                # Calculate total amount
-                total_amount = sum(float(seat.fare) for seat in booking_seats)
-                
-                ticket_info = {
-                    "booking_id": booking.booking_id,
-                    "booking_date": booking.booking_date.strftime("%Y-%m-%d %H:%M:%S"),
-                    "journey_date": journey_date.strftime("%Y-%m-%d"),
-                    "status": booking.status,
-                    "ticket_count": len(booking_seats),
-                    "total_amount": total_amount,
-                    "train_name": train.train_name if train else "Unknown Train",
-                    "from_station": from_station,
-                    "to_station": to_station,
-                    "coach_type": coach.coach_type if coach else "Unknown Coach"
-                }
-                
-                if journey_date >= current_date:
-                    upcoming_trips.append(ticket_info)
-                else:
-                    past_trips.append(ticket_info)
-                    
-            except Exception as e:
-                print(f"Error processing booking {booking.booking_id}: {str(e)}")
-                continue
+        for row in rows:
+            stops = train_stops.get(row.train_id, [])
+            names = dict(stops)
+            # Booked leg when the booking has one, otherwise the whole route
+            from_station = names.get(row.from_sequence) or (stops[0][1] if stops else "Unknown")
+            to_station = names.get(row.to_sequence) or (stops[-1][1] if stops else "Unknown")
+            
+            journey_date = row.journey_date
+            
+            ticket_info = {
+                "booking_id": row.booking_id,
+                "booking_date": row.booking_date.strftime("%Y-%m-%d %H:%M:%S"),
+                "journey_date": journey_date.strftime("%Y-%m-%d"),
+                "status": row.status,
+                "ticket_count": row.ticket_count,
+                "total_amount": float(row.total_amount or 0),
+                "train_name": row.train_name,
+                "from_station": from_station,
+                "to_station": to_station,
+                "coach_type": row.coach_type
+            }
+            
+            if journey_date >= current_date:
+                upcoming_trips.append(ticket_info)
+            else:
+                past_trips.append(ticket_info)
         
         return {
             "upcoming_trips": upcoming_trips,
-            "past_trips": past_trips
+            "past_trips": past_trips,
+            "next_after_booking_id": rows[-1].booking_id if has_more else None
         }
     
     except Exception as e:
-        print(f"Error in get_my_tickets: {str(e)}")
+        logger.exception("Failed to get tickets", extra={"user_id": current_user.user_id})
         raise HTTPException(status_code=500, detail=f"Failed to get tickets: {str(e)}")
 
 @app.post("/verify-ticket")
-def verify_ticket(request: dict, current_user: UserResponse = Depends(get_current_user), db: Session = Depends(get_db)):
+def verify_ticket(request: dict, current_user: UserResponse = Depends(get_current_user), db: Session = Depends(get_user_read_db)):
     """Verify ticket by booking ID with real route data"""
     try:
         booking_id = request.get('booking_id', '')
@@ -775,131 +993,106 @@ def verify_ticket(request: dict, current_user: UserResponse = Depends(get_curren
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid booking ID format")
         
-        # Find booking by ID
-        booking = db.query(Booking).filter(Booking.booking_id == booking_id).first()
-        
-        if not booking:
-            raise HTTPException(status_code=404, detail="Invalid ticket - No ticket found with this booking ID")
+        ticket = load_ticket_details(db, [booking_id]).get(booking_id)
         
-        # Check if the ticket belongs to the current user
-        if booking.user_id != current_user.user_id:
+        # Unknown tickets and tickets of other users look the same to the caller
+        if not ticket or ticket["user_id"] != current_user.user_id:
             raise HTTPException(status_code=404, detail="Invalid ticket - No ticket found with this booking ID")
         
-        # Get user details
-        user = db.query(User).filter(User.user_id == booking.user_id).first()
-        
-        # Get booking seats and seat details
-        booking_seats = db.query(BookingSeat).join(
-            Seat, BookingSeat.seat_id == Seat.seat_id
-        ).join(
-            Coach, Seat.coach_id == Coach.coach_id
-        ).filter(BookingSeat.booking_id == booking.booking_id).all()
-        
-        if not booking_seats:
+        if not ticket["seat_details"]:
             raise HTTPException(status_code=404, detail="No seat information found for this booking")
         
-        # Get coach and train information from the first seat
-        first_seat = booking_seats[0]
-        coach = db.query(Coach).filter(Coach.coach_id == first_seat.seat.coach_id).first()
-        train = db.query(Train).filter(Train.train_id == coach.train_id).first() if coach else None
-        
-        # Get actual route stations for this train to determine from/to stations
-        from_station = "Unknown"
-        to_station = "Unknown"
-        
-        if train:
-            # Get route stations ordered by sequence number
-            route_stations = db.query(RouteStation, Station).join(
-                Station, RouteStation.station_id == Station.station_id
-            ).filter(RouteStation.train_id == train.train_id).order_by(
-                RouteStation.sequence_number.asc().nulls_last()
-            ).all()
-            
-            if route_stations:
-                # Get first and last stations from the route
-                from_station = route_stations[0][1].station_name
-                to_station = route_stations[-1][1].station_name
-            else:
-                # Fallback: try to get from Routes table
-                route = db.query(Route).filter(Route.train_id == train.train_id).first()
-                if route:
-                    source_station = db.query(Station).filter(Station.station_id == route.source_station_id).first()
-                    dest_station = db.query(Station).filter(Station.station_id == route.destination_station_id).first()
-                    from_station = source_station.station_name if source_station else "Unknown"
-                    to_station = dest_station.station_name if dest_station else "Unknown"
-        
-        # Alternative method: Try to get from schedule if available
-        if from_station == "Unknown" or to_station == "Unknown":
-            if booking.schedule_id:
-                schedule = db.query(Schedule).filter(Schedule.schedule_id == booking.schedule_id).first()
-                if schedule and schedule.route_id:
-                    route = db.query(Route).filter(Route.route_id == schedule.route_id).first()
-                    if route:
-                        source_station = db.query(Station).filter(Station.station_id == route.source_station_id).first()
-                        dest_station = db.query(Station).filter(Station.station_id == route.destination_station_id).first()
-                        from_station = source_station.station_name if source_station else from_station
-                        to_station = dest_station.station_name if dest_station else to_station
-        
-        # Get payment information
-        payments = db.query(Payment).filter(Payment.booking_id == booking.booking_id).all()
-        total_paid = sum(float(payment.amount) for payment in payments) if payments else 0
-        
-        # Calculate journey date (mock - 7 days from booking date)
-        journey_date = (booking.booking_date + timedelta(days=7)).date()
-        
-        # Prepare seat details
-        seat_details = []
-        for booking_seat in booking_seats:
-            seat = booking_seat.seat
-            seat_coach = db.query(Coach).filter(Coach.coach_id == seat.coach_id).first()
-            seat_details.append({
-                "seat_number": seat.seat_number,
-                "coach_number": seat_coach.coach_number if seat_coach else "Unknown",
-                "coach_type": seat_coach.coach_type if seat_coach else "Unknown",
-                "fare": float(booking_seat.fare)
-            })
-        
-        # If still unknown, provide fallback based on train name
-        if from_station == "Unknown" or to_station == "Unknown":
-            train_name = train.train_name if train else ""
-            if "Padma" in train_name or "Chittagong" in train_name.lower():
-                from_station = "Dhaka" if from_station == "Unknown" else from_station
-                to_station = "Chittagong" if to_station == "Unknown" else to_station
-            elif "Parabat" in train_name or "Sylhet" in train_name.lower():
-                from_station = "Dhaka" if from_station == "Unknown" else from_station
-                to_station = "Sylhet" if to_station == "Unknown" else to_station
-            elif "Sundarban" in train_name or "Khulna" in train_name.lower():
-                from_station = "Dhaka" if from_station == "Unknown" else from_station
-                to_station = "Khulna" if to_station == "Unknown" else to_station
-        
-        ticket_details = {
-            "booking_id": booking.booking_id,
-            "booking_date": booking.booking_date.strftime("%Y-%m-%d %H:%M:%S"),
-            "journey_date": journey_date.strftime("%Y-%m-%d"),
-            "status": booking.status,
-            "passenger_name": user.name if user else "Unknown",
-            "passenger_email": user.email if user else "Unknown",
-            "train_name": train.train_name if train else "Unknown Train",
-            "train_id": train.train_id if train else 0,
-            "from_station": from_station,  # Now shows real data
-            "to_station": to_station,      # Now shows real data
-            "seat_details": seat_details,
-            "total_amount": total_paid if total_paid > 0 else sum(float(seat.fare) for seat in booking_seats),
-            "payment_status": "paid" if payments else "unpaid"
-        }
-        
-        return ticket_details
+        ticket.pop("user_id")
+        return ticket
     
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error in verify_ticket: {str(e)}")
+        logger.exception("Failed to verify ticket", extra={"booking_id": request.get('booking_id')})
         raise HTTPException(status_code=500, detail=f"Failed to verify ticket: {str(e)}")
 
+@app.post("/verify-tickets")
+def verify_tickets(request: dict, current_user: UserResponse = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    """Verify a batch of tickets at a station gate; returns a status per booking ID"""
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    raw_ids = request.get('booking_ids')
+    if not isinstance(raw_ids, list) or not raw_ids:
+        raise HTTPException(status_code=400, detail="booking_ids must be a non-empty list")
+    if len(raw_ids) > VERIFY_TICKETS_MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {VERIFY_TICKETS_MAX_BATCH} booking IDs per request")
+    
+    booking_ids = []
+    for raw_id in raw_ids:
+        try:
+            booking_ids.append(int(raw_id))
+        except (TypeError, ValueError):
+            booking_ids.append(None)
+    
+    try:
+        tickets = load_ticket_details(db, [booking_id for booking_id in booking_ids if booking_id is not None])
+    except Exception as e:
+        logger.exception("Failed to verify tickets", extra={"count": len(booking_ids)})
+        raise HTTPException(status_code=500, detail=f"Failed to verify tickets: {str(e)}")
+    
+    results = []
+    for raw_id, booking_id in zip(raw_ids, booking_ids):
+        ticket = tickets.get(booking_id) if booking_id is not None else None
+        if booking_id is None:
+            status_name = "invalid_id"
+        elif ticket is None:
+            status_name = "not_found"
+        elif not ticket["seat_details"]:
+            status_name = "no_seats"
+        elif ticket["status"] in ("cancelled", "expired"):
+            status_name = ticket["status"]
+        elif ticket["status"] == "held":
+            # Seats are only held until paid; an unpaid hold does not pass the gate
+            status_name = "unpaid"
+        else:
+            status_name = "valid"
+        results.append({
+            "booking_id": booking_id if booking_id is not None else raw_id,
+            "result": status_name,
+            "ticket": ticket if status_name in ("valid", "unpaid", "cancelled", "expired") else None
+        })
+    
+    return {"results": results}
+
+@app.get("/ticket-public-key")
+def get_ticket_public_key():
+    """Public key gate devices use to check ticket tokens offline"""
+    return {"algorithm": "Ed25519", "public_key": public_key_b64()}
+
+@app.get("/ticket-revocations")
+def get_ticket_revocations(current_user: UserResponse = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    """Signed list of revoked booking IDs for gate devices to cache"""
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return {"revocations": ticket_revocations.signed_list(db)}
+
+@app.post("/verify-ticket-token")
+def verify_ticket_token(request: dict, current_user: UserResponse = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    """Verify a signed ticket token without looking the booking up"""
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    token = request.get('token')
+    if not token:
+        raise HTTPException(status_code=400, detail="token is required")
+    
+    return check_ticket_token(token, ticket_revocations.snapshot(db))
+
 @app.get("/train-routes/{train_id}")
-def get_train_routes(train_id: int, current_user: UserResponse = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_train_routes(train_id: int, request: Request, current_user: UserResponse = Depends(get_current_user), db: Session = Depends(get_read_db)):
     """Get detailed route information for a specific train"""
-    
+    entry = reference_cache.get(("train-routes", train_id), lambda: build_train_routes(db, train_id))
+    return cached_json_response(request, entry)
+
+def build_train_routes(db: Session, train_id: int):
+    """Assemble the /train-routes payload from the database"""
     # Check if train exists
     train = db.query(Train).filter(Train.train_id == train_id).first()
     if not train:
@@ -908,27 +1101,18 @@ def get_train_routes(train_id: int, current_user: UserResponse = Depends(get_cur
     # Get routes for this train (from Routes table)
     routes = db.query(Route).filter(Route.train_id == train_id).all()
     
+    # Every route of a train shares the train's stops, taken from the compiled timetable
+    compiled = compiled_timetable.train(db, train_id) if routes else None
+    stations = [{
+        "station_name": stop.station_name,
+        "station_order": i + 1,  # Use index as order
+        "arrival_time": stop.arrival_text,
+        "departure_time": stop.departure_text,
+        "halt_time": stop.halt
+    } for i, stop in enumerate(stop for stop in compiled.stops if stop.station_name is not None)] if compiled else []
+    
     result = []
     for route in routes:
-        # Get stations for this route from RouteStation table
-        route_stations_query = db.query(RouteStation, Station).join(
-            Station, RouteStation.station_id == Station.station_id
-        ).filter(RouteStation.train_id == train_id).order_by(RouteStation.sequence_number).all()
-        
-        stations = []
-        for i, (route_station, station) in enumerate(route_stations_query):
-            # Calculate arrival and departure times based on offsets
-            arrival_time = minutes_to_time_string(route_station.arrival_offset_minutes) if route_station.arrival_offset_minutes else None
-            departure_time = minutes_to_time_string(route_station.departure_offset_minutes) if route_station.departure_offset_minutes else None
-            
-            stations.append({
-                "station_name": station.station_name,
-                "station_order": i + 1,  # Use index as order
-                "arrival_time": arrival_time,
-                "departure_time": departure_time, 
-                "halt_time": route_station.halt_minutes or 0
-            })
-        
         result.append({
             "route_id": route.route_id,
             "distance": route.distance_km,
@@ -0,0 +1,143 @@
+# metrics.py
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+REQUESTS = Counter("http_requests_total", "Requests by route and status code", ["method", "route", "status"])
+IN_FLIGHT = Gauge("http_requests_in_progress", "Requests being handled")
+REQUEST_DB_STATEMENTS = Histogram(
+    "http_request_db_statements", "SQL statements executed per request",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Time spent in SQL statements per request",
+    ["method", "route"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+DB_STATEMENTS = Counter("db_statements_total", "SQL statements executed")
+DB_SECONDS = Counter("db_statement_seconds_total", "Time spent in SQL statements")
+
+
+class RequestDbStats:
+    """SQL statements and time of the request being handled"""
+
+    __slots__ = ("statements", "seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+
+
+# Shared by the request's handler thread and tasks: the object is mutated, not replaced
+_request_db_stats: ContextVar[Optional[RequestDbStats]] = ContextVar("request_db_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("metrics_query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    DB_STATEMENTS.inc()
+    DB_SECONDS.inc(elapsed)
+    stats = _request_db_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.seconds += elapsed
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status codes, in-flight requests and SQL per request.
+
+    Routes are labelled with their path template (/train-routes/{train_id}),
+    and requests that match no route share one label, so label cardinality
+    stays bounded.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._route_templates = None
+
+    def _route_label(self, scope: Scope) -> str:
+        if self._route_templates is None:
+            self._route_templates = {
+                route.endpoint: route.path
+                for route in scope["app"].routes if hasattr(route, "endpoint")
+            }
+        return self._route_templates.get(scope.get("endpoint"), "unmatched")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats = RequestDbStats()
+        token = _request_db_stats.set(stats)
+        IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_FLIGHT.dec()
+            _request_db_stats.reset(token)
+            method, route = scope["method"], self._route_label(scope)
+            REQUEST_LATENCY.labels(method, route).observe(elapsed)
+            REQUESTS.labels(method, route, str(status_code)).inc()
+            REQUEST_DB_STATEMENTS.labels(method, route).observe(stats.statements)
+            REQUEST_DB_SECONDS.labels(method, route).observe(stats.seconds)
+
+
+class AppStateCollector:
+    """Exports in-process cache counters and connection pool usage at scrape time"""
+
+    def collect(self):
+        from database import pool_usage
+        from principal_cache import principal_cache
+
+        cache = principal_cache.stats()
+        lookups = CounterMetricFamily("principal_cache_lookups", "Principal cache lookups", labels=["result"])
+        lookups.add_metric(["hit"], cache["hits"])
+        lookups.add_metric(["miss"], cache["misses"])
+        yield lookups
+        yield GaugeMetricFamily("principal_cache_entries", "Cached principals", value=cache["size"])
+
+        pool = GaugeMetricFamily("db_pool_connections", "Connection pool usage", labels=["engine", "state"])
+        for name, usage in pool_usage().items():
+            for state in ("checked_out", "checked_in", "overflow"):
+                if state in usage:
+                    pool.add_metric([name, state], usage[state])
+        yield pool
+
+
+REGISTRY.register(AppStateCollector())
+
+
+def metrics_payload():
+    """Prometheus text exposition of every registered metric, with its content type"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,164 @@
+"""Initial schema, as created by Base.metadata.create_all before migrations existed
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 09:00:00
+
+Databases created with create_all from the original models already have these
+tables: mark them with `alembic stamp 0001`, then `alembic upgrade head`.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'users',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('email', sa.String(length=100), nullable=False),
+        sa.Column('phone', sa.String(length=20), nullable=False),
+        sa.Column('password', sa.String(length=255), nullable=False),
+        sa.Column('role', sa.String(length=20), nullable=True),
+        sa.PrimaryKeyConstraint('user_id'),
+        sa.UniqueConstraint('phone'),
+    )
+    op.create_index('ix_users_email', 'users', ['email'], unique=True)
+    op.create_index('ix_users_user_id', 'users', ['user_id'])
+
+    op.create_table(
+        'trains',
+        sa.Column('train_id', sa.Integer(), nullable=False),
+        sa.Column('train_name', sa.String(length=100), nullable=True),
+        sa.Column('train_type', sa.String(length=20), nullable=True),
+        sa.Column('total_coaches', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('train_id'),
+    )
+    op.create_index('ix_trains_train_id', 'trains', ['train_id'])
+
+    op.create_table(
+        'stations',
+        sa.Column('station_id', sa.Integer(), nullable=False),
+        sa.Column('station_name', sa.String(length=100), nullable=True),
+        sa.Column('location', sa.String(length=255), nullable=True),
+        sa.PrimaryKeyConstraint('station_id'),
+        sa.UniqueConstraint('station_name'),
+    )
+    op.create_index('ix_stations_station_id', 'stations', ['station_id'])
+
+    op.create_table(
+        'coaches',
+        sa.Column('coach_id', sa.Integer(), nullable=False),
+        sa.Column('train_id', sa.Integer(), nullable=True),
+        sa.Column('coach_number', sa.String(length=10), nullable=True),
+        sa.Column('coach_type', sa.String(length=20), nullable=True),
+        sa.Column('total_seats', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['train_id'], ['trains.train_id']),
+        sa.PrimaryKeyConstraint('coach_id'),
+    )
+    op.create_index('ix_coaches_coach_id', 'coaches', ['coach_id'])
+
+    op.create_table(
+        'seats',
+        sa.Column('seat_id', sa.Integer(), nullable=False),
+        sa.Column('coach_id', sa.Integer(), nullable=True),
+        sa.Column('seat_number', sa.String(length=10), nullable=True),
+        sa.Column('seat_class', sa.String(length=20), nullable=True),
+        sa.ForeignKeyConstraint(['coach_id'], ['coaches.coach_id']),
+        sa.PrimaryKeyConstraint('seat_id'),
+    )
+    op.create_index('ix_seats_seat_id', 'seats', ['seat_id'])
+
+    op.create_table(
+        'route_stations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('train_id', sa.Integer(), nullable=True),
+        sa.Column('station_id', sa.Integer(), nullable=True),
+        sa.Column('sequence_number', sa.Integer(), nullable=True),
+        sa.Column('arrival_offset_minutes', sa.String(length=10), nullable=True),
+        sa.Column('departure_offset_minutes', sa.String(length=10), nullable=True),
+        sa.Column('halt_minutes', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['station_id'], ['stations.station_id']),
+        sa.ForeignKeyConstraint(['train_id'], ['trains.train_id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_route_stations_id', 'route_stations', ['id'])
+
+    op.create_table(
+        'routes',
+        sa.Column('route_id', sa.Integer(), nullable=False),
+        sa.Column('train_id', sa.Integer(), nullable=True),
+        sa.Column('source_station_id', sa.Integer(), nullable=True),
+        sa.Column('destination_station_id', sa.Integer(), nullable=True),
+        sa.Column('distance_km', sa.DECIMAL(precision=6, scale=2), nullable=True),
+        sa.ForeignKeyConstraint(['destination_station_id'], ['stations.station_id']),
+        sa.ForeignKeyConstraint(['source_station_id'], ['stations.station_id']),
+        sa.ForeignKeyConstraint(['train_id'], ['trains.train_id']),
+        sa.PrimaryKeyConstraint('route_id'),
+    )
+    op.create_index('ix_routes_route_id', 'routes', ['route_id'])
+
+    op.create_table(
+        'schedules',
+        sa.Column('schedule_id', sa.Integer(), nullable=False),
+        sa.Column('train_id', sa.Integer(), nullable=True),
+        sa.Column('route_id', sa.Integer(), nullable=True),
+        sa.Column('departure_time', sa.DateTime(), nullable=True),
+        sa.Column('arrival_time', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['route_id'], ['routes.route_id']),
+        sa.ForeignKeyConstraint(['train_id'], ['trains.train_id']),
+        sa.PrimaryKeyConstraint('schedule_id'),
+    )
+    op.create_index('ix_schedules_schedule_id', 'schedules', ['schedule_id'])
+
+    op.create_table(
+        'bookings',
+        sa.Column('booking_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('schedule_id', sa.Integer(), nullable=True),
+        sa.Column('booking_date', sa.DateTime(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.ForeignKeyConstraint(['schedule_id'], ['schedules.schedule_id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.user_id']),
+        sa.PrimaryKeyConstraint('booking_id'),
+    )
+    op.create_index('ix_bookings_booking_id', 'bookings', ['booking_id'])
+
+    op.create_table(
+        'booking_seats',
+        sa.Column('booking_seat_id', sa.Integer(), nullable=False),
+        sa.Column('booking_id', sa.Integer(), nullable=True),
+        sa.Column('seat_id', sa.Integer(), nullable=True),
+        sa.Column('fare', sa.DECIMAL(precision=8, scale=2), nullable=True),
+        sa.ForeignKeyConstraint(['booking_id'], ['bookings.booking_id']),
+        sa.ForeignKeyConstraint(['seat_id'], ['seats.seat_id']),
+        sa.PrimaryKeyConstraint('booking_seat_id'),
+    )
+    op.create_index('ix_booking_seats_booking_seat_id', 'booking_seats', ['booking_seat_id'])
+
+    op.create_table(
+        'payments',
+        sa.Column('payment_id', sa.Integer(), nullable=False),
+        sa.Column('booking_id', sa.Integer(), nullable=True),
+        sa.Column('amount', sa.DECIMAL(precision=8, scale=2), nullable=True),
+        sa.Column('payment_date', sa.DateTime(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.ForeignKeyConstraint(['booking_id'], ['bookings.booking_id']),
+        sa.PrimaryKeyConstraint('payment_id'),
+    )
+    op.create_index('ix_payments_payment_id', 'payments', ['payment_id'])
+
+
+def downgrade() -> None:
+    for table in ('payments', 'booking_seats', 'bookings', 'schedules', 'routes', 'route_stations',
+                  'seats', 'coaches', 'stations', 'trains', 'users'):
+        op.drop_table(table)
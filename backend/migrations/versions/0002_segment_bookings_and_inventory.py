@@ -0,0 +1,79 @@
+"""Segment bookings, active booking seats, coach inventory and idempotency keys
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 09:05:00
+
+Catches up with the columns and tables added to the models since the initial
+schema. Existing booking seats get their booking's schedule, and seats of
+cancelled bookings are marked inactive.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('bookings') as batch:
+        batch.add_column(sa.Column('from_sequence', sa.Integer(), nullable=True))
+        batch.add_column(sa.Column('to_sequence', sa.Integer(), nullable=True))
+
+    with op.batch_alter_table('booking_seats') as batch:
+        batch.add_column(sa.Column('schedule_id', sa.Integer(), nullable=True))
+        batch.add_column(sa.Column('is_active', sa.Boolean(), server_default=sa.text('true'), nullable=False))
+        batch.create_foreign_key('fk_booking_seats_schedule_id', 'schedules', ['schedule_id'], ['schedule_id'])
+
+    op.execute(
+        "UPDATE booking_seats SET schedule_id = "
+        "(SELECT bookings.schedule_id FROM bookings WHERE bookings.booking_id = booking_seats.booking_id)"
+    )
+    op.execute(
+        "UPDATE booking_seats SET is_active = false "
+        "WHERE booking_id IN (SELECT booking_id FROM bookings WHERE status = 'cancelled')"
+    )
+    op.create_index(
+        'ix_booking_seats_schedule_seat', 'booking_seats', ['schedule_id', 'seat_id'],
+        postgresql_where=sa.text('is_active'), sqlite_where=sa.text('is_active')
+    )
+
+    op.create_table(
+        'coach_inventory',
+        sa.Column('schedule_id', sa.Integer(), nullable=False),
+        sa.Column('coach_id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['coach_id'], ['coaches.coach_id']),
+        sa.ForeignKeyConstraint(['schedule_id'], ['schedules.schedule_id']),
+        sa.PrimaryKeyConstraint('schedule_id', 'coach_id'),
+    )
+
+    op.create_table(
+        'idempotency_keys',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('key', sa.String(length=255), nullable=False),
+        sa.Column('request_hash', sa.String(length=64), nullable=False),
+        sa.Column('response', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.user_id']),
+        sa.PrimaryKeyConstraint('user_id', 'key'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('idempotency_keys')
+    op.drop_table('coach_inventory')
+    op.drop_index('ix_booking_seats_schedule_seat', table_name='booking_seats')
+    with op.batch_alter_table('booking_seats') as batch:
+        batch.drop_constraint('fk_booking_seats_schedule_id', type_='foreignkey')
+        batch.drop_column('is_active')
+        batch.drop_column('schedule_id')
+    with op.batch_alter_table('bookings') as batch:
+        batch.drop_column('to_sequence')
+        batch.drop_column('from_sequence')
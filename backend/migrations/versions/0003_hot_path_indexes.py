@@ -0,0 +1,50 @@
+"""Indexes for the foreign keys and filters on the request hot paths
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 09:10:00
+
+On PostgreSQL the indexes are built CONCURRENTLY, outside a transaction, so
+bookings keep being written while they build. query_plans.py checks that the
+hot queries use them.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (index, table, columns), matching the Index() declarations in models.py
+INDEXES = [
+    ('ix_coaches_train_id', 'coaches', ['train_id', 'coach_id']),
+    ('ix_seats_coach_id', 'seats', ['coach_id', 'seat_id']),
+    ('ix_route_stations_train_sequence', 'route_stations', ['train_id', 'sequence_number']),
+    ('ix_route_stations_station_id', 'route_stations', ['station_id']),
+    ('ix_routes_train_id', 'routes', ['train_id']),
+    ('ix_schedules_departure_time', 'schedules', ['departure_time']),
+    ('ix_schedules_train_departure', 'schedules', ['train_id', 'departure_time']),
+    ('ix_bookings_user_id', 'bookings', ['user_id', 'booking_id']),
+    ('ix_bookings_status_date', 'bookings', ['status', 'booking_date']),
+    ('ix_bookings_booking_date', 'bookings', ['booking_date']),
+    ('ix_bookings_schedule_id', 'bookings', ['schedule_id']),
+    ('ix_booking_seats_booking_id', 'booking_seats', ['booking_id']),
+    ('ix_booking_seats_seat_id', 'booking_seats', ['seat_id']),
+    ('ix_payments_booking_id', 'payments', ['booking_id']),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,164 @@
+"""Journey dates on bookings, one departure per train and time, journey_date partitions
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 09:20:00
+
+Bookings and booking seats get the service date of their schedule as
+journey_date; bookings whose schedule is gone get booking_date + 7 days, the
+date their tickets used to show. Schedules become unique per train and
+departure time, so materializing departures can't repeat a row (the upgrade
+fails if a train already has two schedules at the same time; merge those
+first).
+
+On PostgreSQL bookings and booking_seats are rebuilt as tables range
+partitioned by journey_date: one partition per month from the earliest
+journey date to three months ahead, plus a default partition. A partitioned
+table's keys must contain the partition key, so their primary keys become
+(id, journey_date), booking_seats references bookings by (booking_id,
+journey_date) and payments no longer has a foreign key to bookings. The
+rebuild copies both tables; run it in a maintenance window.
+"""
+from datetime import date
+from typing import List, Optional, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Months of partitions created ahead of today
+MONTHS_AHEAD = 3
+
+# (index, columns, partial index condition) of the rebuilt tables
+BOOKING_INDEXES = [
+    ('ix_bookings_booking_id', ['booking_id'], None),
+    ('ix_bookings_user_id', ['user_id', 'booking_id'], None),
+    ('ix_bookings_status_date', ['status', 'booking_date'], None),
+    ('ix_bookings_booking_date', ['booking_date'], None),
+    ('ix_bookings_schedule_id', ['schedule_id'], None),
+    ('ix_bookings_journey_date', ['journey_date'], None),
+]
+BOOKING_SEAT_INDEXES = [
+    ('ix_booking_seats_booking_seat_id', ['booking_seat_id'], None),
+    ('ix_booking_seats_schedule_seat', ['schedule_id', 'seat_id'], 'is_active'),
+    ('ix_booking_seats_booking_id', ['booking_id'], None),
+    ('ix_booking_seats_seat_id', ['seat_id'], None),
+]
+
+
+def _next_month(month: date) -> date:
+    return date(month.year + 1, 1, 1) if month.month == 12 else date(month.year, month.month + 1, 1)
+
+
+def _months(first: date, last: date) -> List[date]:
+    months = [first.replace(day=1)]
+    while _next_month(months[-1]) <= last:
+        months.append(_next_month(months[-1]))
+    return months
+
+
+def _rebuild(table: str, key: str, indexes, foreign_keys, months: Optional[List[date]]):
+    """Copy `table` into a new table with the same columns, partitioned by
+    journey_date month when `months` is given, and restore its keys and indexes"""
+    sequence = op.get_bind().execute(
+        sa.text("SELECT pg_get_serial_sequence(:table, :column)"), {"table": table, "column": key}
+    ).scalar()
+    op.execute(f"ALTER SEQUENCE {sequence} OWNED BY NONE")
+    op.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+    if months is None:
+        op.execute(f"CREATE TABLE {table} (LIKE {table}_old INCLUDING DEFAULTS)")
+    else:
+        op.execute(f"CREATE TABLE {table} (LIKE {table}_old INCLUDING DEFAULTS) PARTITION BY RANGE (journey_date)")
+        for month in months:
+            op.execute(
+                f"CREATE TABLE {table}_p{month.year:04d}_{month.month:02d} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')"
+            )
+        op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+    op.execute(f"INSERT INTO {table} SELECT * FROM {table}_old")
+    op.execute(f"DROP TABLE {table}_old")
+    op.execute(f"ALTER SEQUENCE {sequence} OWNED BY {table}.{key}")
+
+    op.create_primary_key(f'{table}_pkey', table, [key] if months is None else [key, 'journey_date'])
+    for name, columns, where in indexes:
+        op.create_index(name, table, columns, postgresql_where=sa.text(where) if where else None)
+    for name, columns, referred, referred_columns in foreign_keys:
+        op.create_foreign_key(name, table, referred, columns, referred_columns)
+
+
+def _partition(partitioned: bool):
+    months = None
+    booking_key = ['booking_id']
+    if partitioned:
+        first = op.get_bind().execute(sa.text("SELECT min(journey_date) FROM bookings")).scalar() or date.today()
+        last = date.today()
+        for _ in range(MONTHS_AHEAD):
+            last = _next_month(last)
+        months = _months(min(first, date.today()), last)
+        booking_key = ['booking_id', 'journey_date']
+
+    op.drop_constraint('booking_seats_booking_id_fkey', 'booking_seats', type_='foreignkey')
+    _rebuild('bookings', 'booking_id', BOOKING_INDEXES, [
+        ('bookings_user_id_fkey', ['user_id'], 'users', ['user_id']),
+        ('bookings_schedule_id_fkey', ['schedule_id'], 'schedules', ['schedule_id']),
+    ], months)
+    _rebuild('booking_seats', 'booking_seat_id', BOOKING_SEAT_INDEXES, [
+        ('booking_seats_booking_id_fkey', booking_key, 'bookings', booking_key),
+        ('booking_seats_seat_id_fkey', ['seat_id'], 'seats', ['seat_id']),
+        ('fk_booking_seats_schedule_id', ['schedule_id'], 'schedules', ['schedule_id']),
+    ], months)
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    op.add_column('bookings', sa.Column('journey_date', sa.Date(), nullable=True))
+    op.add_column('booking_seats', sa.Column('journey_date', sa.Date(), nullable=True))
+    if dialect == 'postgresql':
+        departure_date = "CAST(schedules.departure_time AS DATE)"
+        fallback = "CAST(bookings.booking_date + INTERVAL '7 days' AS DATE)"
+    else:
+        departure_date = "date(schedules.departure_time)"
+        fallback = "date(bookings.booking_date, '+7 days')"
+    op.execute(
+        f"UPDATE bookings SET journey_date = COALESCE("
+        f"(SELECT {departure_date} FROM schedules WHERE schedules.schedule_id = bookings.schedule_id), "
+        f"{fallback}, CURRENT_DATE)"
+    )
+    op.execute(
+        "UPDATE booking_seats SET journey_date = COALESCE("
+        "(SELECT bookings.journey_date FROM bookings WHERE bookings.booking_id = booking_seats.booking_id), "
+        "CURRENT_DATE)"
+    )
+    with op.batch_alter_table('bookings') as batch:
+        batch.alter_column('journey_date', existing_type=sa.Date(), nullable=False)
+    with op.batch_alter_table('booking_seats') as batch:
+        batch.alter_column('journey_date', existing_type=sa.Date(), nullable=False)
+    op.create_index('ix_bookings_journey_date', 'bookings', ['journey_date'])
+
+    op.drop_index('ix_schedules_train_departure', table_name='schedules')
+    op.create_index('ix_schedules_train_departure', 'schedules', ['train_id', 'departure_time'], unique=True)
+
+    if dialect == 'postgresql':
+        op.drop_constraint('payments_booking_id_fkey', 'payments', type_='foreignkey')
+        _partition(True)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        _partition(False)
+        op.create_foreign_key('payments_booking_id_fkey', 'payments', 'bookings', ['booking_id'], ['booking_id'])
+
+    op.drop_index('ix_schedules_train_departure', table_name='schedules')
+    op.create_index('ix_schedules_train_departure', 'schedules', ['train_id', 'departure_time'])
+
+    op.drop_index('ix_bookings_journey_date', table_name='bookings')
+    with op.batch_alter_table('booking_seats') as batch:
+        batch.drop_column('journey_date')
+    with op.batch_alter_table('bookings') as batch:
+        batch.drop_column('journey_date')
@@ -0,0 +1,36 @@
+"""Shared timetable version
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 10:00:00
+
+One row counting timetable changes. The worker that changes the timetable
+bumps it and every other worker polls it, so cached stations, routes, fares
+and departures are rebuilt on all of them, not only the worker that handled
+the change.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    table = op.create_table(
+        'timetable_version',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.bulk_insert(table, [{'id': 1, 'version': 0}])
+
+
+def downgrade() -> None:
+    op.drop_table('timetable_version')
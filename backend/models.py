@@ -1,5 +1,5 @@
 # models.py
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, DECIMAL, Time
+from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, ForeignKey, DECIMAL, Time, Index, Text, text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database import Base
@@ -32,6 +32,10 @@ class Train(Base):
 
 class Coach(Base):
     __tablename__ = "coaches"
+    __table_args__ = (
+        # Train layouts load a train's coaches in coach order
+        Index("ix_coaches_train_id", "train_id", "coach_id"),
+    )
 
     coach_id = Column(Integer, primary_key=True, index=True)
     train_id = Column(Integer, ForeignKey("trains.train_id"))
@@ -45,6 +49,9 @@ class Coach(Base):
 
 class Seat(Base):
     __tablename__ = "seats"
+    __table_args__ = (
+        Index("ix_seats_coach_id", "coach_id", "seat_id"),
+    )
 
     seat_id = Column(Integer, primary_key=True, index=True)
     coach_id = Column(Integer, ForeignKey("coaches.coach_id"))
@@ -64,6 +71,11 @@ class Station(Base):
 
 class RouteStation(Base):
     __tablename__ = "route_stations"
+    __table_args__ = (
+        # Stops of a train in sequence order
+        Index("ix_route_stations_train_sequence", "train_id", "sequence_number"),
+        Index("ix_route_stations_station_id", "station_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     train_id = Column(Integer, ForeignKey("trains.train_id"))
@@ -79,6 +91,9 @@ class RouteStation(Base):
 
 class Route(Base):
     __tablename__ = "routes"
+    __table_args__ = (
+        Index("ix_routes_train_id", "train_id"),
+    )
 
     route_id = Column(Integer, primary_key=True, index=True)
     train_id = Column(Integer, ForeignKey("trains.train_id"))
@@ -94,6 +109,12 @@ class Route(Base):
 
 class Schedule(Base):
     __tablename__ = "schedules"
+    __table_args__ = (
+        # Departures of a service day, and the departures of one train; a train
+        # departs at most once at a given time, so materialization can't repeat rows
+        Index("ix_schedules_departure_time", "departure_time"),
+        Index("ix_schedules_train_departure", "train_id", "departure_time", unique=True),
+    )
 
     schedule_id = Column(Integer, primary_key=True, index=True)
     train_id = Column(Integer, ForeignKey("trains.train_id"))
@@ -108,12 +129,36 @@ class Schedule(Base):
 
 class Booking(Base):
     __tablename__ = "bookings"
+    __table_args__ = (
+        # /my-tickets pages through a user's bookings newest first
+        Index("ix_bookings_user_id", "user_id", "booking_id"),
+        # Bookings of one status, oldest first
+        Index("ix_bookings_status_date", "status", "booking_date"),
+        # Retention purge deletes the oldest bookings
+        Index("ix_bookings_booking_date", "booking_date"),
+        Index("ix_bookings_schedule_id", "schedule_id"),
+        # Purging departed bookings; ticket revocations of journeys still ahead
+        Index("ix_bookings_journey_date", "journey_date"),
+        # The hold sweep reads only holds that are still open
+        Index(
+            "ix_bookings_hold_expires_at", "hold_expires_at",
+            postgresql_where=text("status = 'held'"),
+            sqlite_where=text("status = 'held'"),
+        ),
+    )
+    # On PostgreSQL the table is range partitioned by journey_date (see
+    # migration 0004 and partitions.py); its primary key there is
+    # (booking_id, journey_date)
 
     booking_id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.user_id"))
     schedule_id = Column(Integer, ForeignKey("schedules.schedule_id"))
     booking_date = Column(DateTime, default=func.current_timestamp())
-    status = Column(String(20), default='confirmed')  # confirmed, cancelled
+    status = Column(String(20), default='confirmed')  # held, confirmed, cancelled, expired
+    hold_expires_at = Column(DateTime)  # When an unpaid hold releases its seats, NULL once paid or released
+    journey_date = Column(Date, nullable=False)  # Service date of the schedule
+    from_sequence = Column(Integer)  # RouteStation.sequence_number of the boarding stop, NULL = whole route
+    to_sequence = Column(Integer)  # RouteStation.sequence_number of the alighting stop, NULL = whole route
 
     # Relationships
     user = relationship("User", back_populates="bookings")
@@ -123,11 +168,26 @@ class Booking(Base):
 
 class BookingSeat(Base):
     __tablename__ = "booking_seats"
+    __table_args__ = (
+        # A seat may carry several active bookings per schedule on non-overlapping
+        # legs; SeatInventory.allocate checks overlaps under the coach_inventory lock
+        Index(
+            "ix_booking_seats_schedule_seat", "schedule_id", "seat_id",
+            postgresql_where=text("is_active"),
+            sqlite_where=text("is_active"),
+        ),
+        Index("ix_booking_seats_booking_id", "booking_id"),
+        Index("ix_booking_seats_seat_id", "seat_id"),
+    )
+    # Partitioned by journey_date on PostgreSQL, like bookings
 
     booking_seat_id = Column(Integer, primary_key=True, index=True)
     booking_id = Column(Integer, ForeignKey("bookings.booking_id"))
     seat_id = Column(Integer, ForeignKey("seats.seat_id"))
     fare = Column(DECIMAL(8,2))
+    schedule_id = Column(Integer, ForeignKey("schedules.schedule_id"))  # Copied from the booking
+    journey_date = Column(Date, nullable=False)  # Copied from the booking
+    is_active = Column(Boolean, nullable=False, default=True, server_default=text("true"))  # False once cancelled
 
     # Relationships
     booking = relationship("Booking", back_populates="booking_seats")
@@ -135,6 +195,9 @@ class BookingSeat(Base):
 
 class Payment(Base):
     __tablename__ = "payments"
+    __table_args__ = (
+        Index("ix_payments_booking_id", "booking_id"),
+    )
 
     payment_id = Column(Integer, primary_key=True, index=True)
     booking_id = Column(Integer, ForeignKey("bookings.booking_id"))
@@ -144,3 +207,31 @@ class Payment(Base):
 
     # Relationships
     booking = relationship("Booking", back_populates="payments")
+
+class CoachInventory(Base):
+    __tablename__ = "coach_inventory"
+
+    # One version row per coach and schedule; seat allocation locks it and bumps
+    # the version, so concurrent bookings of the same coach cannot both commit
+    schedule_id = Column(Integer, ForeignKey("schedules.schedule_id"), primary_key=True)
+    coach_id = Column(Integer, ForeignKey("coaches.coach_id"), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class TimetableVersion(Base):
+    __tablename__ = "timetable_version"
+
+    # One row counting timetable changes; every worker polls it and rebuilds its
+    # in-memory timetable data when the count moves
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    # Result of a request sent with an Idempotency-Key header, so a retry gets
+    # the original response instead of repeating the work
+    user_id = Column(Integer, ForeignKey("users.user_id"), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)
+    response = Column(Text, nullable=False)  # JSON
+    created_at = Column(DateTime, default=func.current_timestamp())
@@ -0,0 +1,107 @@
+# partitions.py
+"""
+Monthly journey_date partitions of bookings and booking_seats.
+
+On PostgreSQL, migration 0004 turns both tables into tables range
+partitioned by journey_date, with one partition per month named
+<table>_pYYYY_MM and a <table>_default partition for anything else. An
+availability query filtering on journey_date then only reads the
+partitions of that date, and a month of departures is dropped with
+DROP TABLE instead of row by row deletes.
+
+Schema created with Base.metadata.create_all (SQLite, tests, benchmarks)
+is not partitioned; every function here is a no-op there.
+"""
+from datetime import date
+from typing import List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Referenced tables last: booking_seats partitions must go before the
+# bookings partitions they point at
+PARTITIONED_TABLES = ("booking_seats", "bookings")
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def next_month(day: date) -> date:
+    return date(day.year + 1, 1, 1) if day.month == 12 else date(day.year, day.month + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month.year:04d}_{month.month:02d}"
+
+
+def is_partitioned(db: Session, table: str = "bookings") -> bool:
+    """Whether `table` is a partitioned PostgreSQL table"""
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return db.execute(
+        text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"), {"table": table}
+    ).scalar() is not None
+
+
+def ensure_partitions(db: Session, start: date, end: date) -> List[str]:
+    """Create the monthly partitions covering journey dates start..end (inclusive).
+
+    Returns the names of the partitions created. Runs before schedules of a new
+    month are materialized, so bookings for them never land in the default
+    partition.
+    """
+    if not is_partitioned(db):
+        return []
+    created = []
+    month = month_start(start)
+    while month <= end:
+        for table in PARTITIONED_TABLES:
+            name = partition_name(table, month)
+            if db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is None:
+                db.execute(text(
+                    f"CREATE TABLE {name} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+                ))
+                created.append(name)
+        month = next_month(month)
+    return created
+
+
+def months_before(db: Session, cutoff: date) -> List[date]:
+    """Months with a bookings partition that ends on or before cutoff, oldest first"""
+    if not is_partitioned(db):
+        return []
+    names = set(db.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass('bookings')"
+    )).scalars())
+    months = []
+    for name in names:
+        suffix = name[len("bookings_p"):]
+        if not name.startswith("bookings_p") or len(suffix) != 7:
+            continue
+        month = date(int(suffix[:4]), int(suffix[5:]), 1)
+        if next_month(month) <= cutoff:
+            months.append(month)
+    return sorted(months)
+
+
+def drop_month(db: Session, month: date) -> Tuple[int, int, int]:
+    """Drop one month of bookings and their seats; returns (bookings, seats, payments) removed.
+
+    Payments have no journey_date and are not partitioned, so the month's
+    payments are deleted first.
+    """
+    seats_partition = partition_name("booking_seats", month)
+    bookings_partition = partition_name("bookings", month)
+    bookings = db.execute(text(f"SELECT count(*) FROM {bookings_partition}")).scalar()
+    seats = db.execute(text(f"SELECT count(*) FROM {seats_partition}")).scalar()
+    payments = db.execute(text(
+        f"DELETE FROM payments WHERE booking_id IN (SELECT booking_id FROM {bookings_partition})"
+    )).rowcount
+    for table, name in (("booking_seats", seats_partition), ("bookings", bookings_partition)):
+        db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        db.execute(text(f"DROP TABLE {name}"))
+    return bookings, seats, payments
@@ -0,0 +1,67 @@
+# principal_cache.py
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from typing import Optional
+
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+
+# Detached copy of the fields endpoints read from the authenticated user
+Principal = namedtuple("Principal", ["user_id", "name", "email", "phone", "role"])
+
+
+class PrincipalCache:
+    """TTL/LRU cache of authenticated users, keyed by token subject (email).
+
+    Entries are dropped explicitly when a profile changes or an account is
+    deleted. Other worker processes only notice such changes once their entry
+    expires, so the TTL bounds how long a stale principal can be served.
+    """
+
+    def __init__(self, ttl_seconds: float = PRINCIPAL_CACHE_TTL_SECONDS, max_size: int = PRINCIPAL_CACHE_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, subject: str) -> Optional[Principal]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(subject)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[subject]
+            self.misses += 1
+            return None
+
+    def put(self, subject: str, user) -> Principal:
+        principal = Principal(user.user_id, user.name, user.email, user.phone, user.role)
+        with self._lock:
+            self._entries[subject] = (time.monotonic() + self.ttl_seconds, principal)
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return principal
+
+    def invalidate(self, *subjects: str):
+        with self._lock:
+            for subject in subjects:
+                self._entries.pop(subject, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+principal_cache = PrincipalCache()
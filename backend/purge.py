@@ -0,0 +1,225 @@
+# purge.py
+import itertools
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql import Select
+
+import database
+from inventory import seat_inventory
+from logging_config import get_logger
+from models import Booking, BookingSeat, CoachInventory, IdempotencyKey, Payment, Schedule, User
+from partitions import drop_month, months_before
+from principal_cache import principal_cache
+from schedules import departure_index
+from ticket_tokens import ticket_revocations
+
+# Bookings deleted per transaction; keeps row locks short
+PURGE_CHUNK_SIZE = int(os.getenv("PURGE_CHUNK_SIZE", "500"))
+# Finished jobs kept for progress queries
+PURGE_JOBS_KEPT = 100
+# A user whose bookings keep appearing during the purge is retried this often
+PURGE_USER_ATTEMPTS = 3
+
+logger = get_logger("purge")
+
+
+class PurgeJob:
+    """Progress of one background purge"""
+
+    def __init__(self, job_id: int, kind: str, requested_by: Optional[int]):
+        self.job_id = job_id
+        self.kind = kind
+        self.requested_by = requested_by
+        self.status = "pending"
+        self.total_bookings = 0
+        self.bookings_deleted = 0
+        self.seats_deleted = 0
+        self.payments_deleted = 0
+        self.users_deleted = 0
+        self.error = None
+        self.created_at = datetime.now()
+        self.finished_at = None
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "total_bookings": self.total_bookings,
+            "bookings_deleted": self.bookings_deleted,
+            "seats_deleted": self.seats_deleted,
+            "payments_deleted": self.payments_deleted,
+            "users_deleted": self.users_deleted,
+            "error": self.error,
+            "created_at": self.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "finished_at": self.finished_at.strftime("%Y-%m-%d %H:%M:%S") if self.finished_at else None
+        }
+
+
+def bookings_where_query(condition, limit: int) -> Select:
+    """Up to `limit` bookings matching `condition`, with their journey dates"""
+    # No ORDER BY, so the lookup can use the index on the condition's column
+    return select(Booking.booking_id, Booking.journey_date).where(condition).limit(limit)
+
+
+def departed_schedules_query(cutoff: datetime, limit: int) -> Select:
+    return select(Schedule.schedule_id).where(Schedule.departure_time < cutoff).limit(limit)
+
+
+def _purge_booking_chunk(db, journey_dates: Dict[int, date], job: PurgeJob):
+    """Delete the seats, payments and bookings of one chunk in a single short transaction.
+
+    `journey_dates` maps each booking_id of the chunk to its journey date.
+    """
+    booking_ids = list(journey_dates)
+    released = db.query(
+        BookingSeat.schedule_id, BookingSeat.seat_id, Booking.from_sequence, Booking.to_sequence
+    ).join(
+        Booking, BookingSeat.booking_id == Booking.booking_id
+    ).filter(
+        BookingSeat.booking_id.in_(booking_ids),
+        BookingSeat.is_active.is_(True)
+    ).all()
+    seats = db.query(BookingSeat).filter(BookingSeat.booking_id.in_(booking_ids)).delete(synchronize_session=False)
+    payments = db.query(Payment).filter(Payment.booking_id.in_(booking_ids)).delete(synchronize_session=False)
+    bookings = db.query(Booking).filter(Booking.booking_id.in_(booking_ids)).delete(synchronize_session=False)
+    db.commit()
+
+    for schedule_id, seat_id, from_sequence, to_sequence in released:
+        seat_inventory.release(schedule_id, [seat_id], from_sequence, to_sequence)
+    ticket_revocations.add(journey_dates)
+    job.seats_deleted += seats
+    job.payments_deleted += payments
+    job.bookings_deleted += bookings
+
+
+def _purge_bookings_where(db, condition, job: PurgeJob, chunk_size: int):
+    """Delete every booking matching `condition`, chunk by chunk"""
+    while True:
+        journey_dates = dict(db.execute(bookings_where_query(condition, chunk_size)).all())
+        if not journey_dates:
+            return
+        _purge_booking_chunk(db, journey_dates, job)
+
+
+def purge_users(session_factory: Callable, user_ids: Iterable[int], job: PurgeJob,
+                chunk_size: int = PURGE_CHUNK_SIZE):
+    """Delete users together with their bookings, seats and payments"""
+    user_ids = sorted(set(user_ids))
+    db = session_factory()
+    try:
+        job.total_bookings = db.query(func.count(Booking.booking_id)).filter(
+            Booking.user_id.in_(user_ids)
+        ).scalar() or 0
+        for start in range(0, len(user_ids), chunk_size):
+            batch = user_ids[start:start + chunk_size]
+            for attempt in range(PURGE_USER_ATTEMPTS):
+                _purge_bookings_where(db, Booking.user_id.in_(batch), job, chunk_size)
+                emails = [email for (email,) in db.query(User.email).filter(User.user_id.in_(batch)).all()]
+                try:
+                    db.query(IdempotencyKey).filter(IdempotencyKey.user_id.in_(batch)).delete(synchronize_session=False)
+                    job.users_deleted += db.query(User).filter(User.user_id.in_(batch)).delete(synchronize_session=False)
+                    db.commit()
+                except IntegrityError:
+                    # A booking was made while we purged; sweep again
+                    db.rollback()
+                    if attempt == PURGE_USER_ATTEMPTS - 1:
+                        raise
+                    continue
+                principal_cache.invalidate(*emails)
+                break
+    finally:
+        db.close()
+
+
+def purge_bookings_before(session_factory: Callable, cutoff: datetime, job: PurgeJob,
+                          chunk_size: int = PURGE_CHUNK_SIZE):
+    """Retention sweep: delete bookings made before `cutoff` with their seats and payments"""
+    db = session_factory()
+    try:
+        condition = Booking.booking_date < cutoff
+        job.total_bookings = db.query(func.count(Booking.booking_id)).filter(condition).scalar() or 0
+        _purge_bookings_where(db, condition, job, chunk_size)
+    finally:
+        db.close()
+
+
+def purge_departures_before(session_factory: Callable, cutoff: date, job: PurgeJob,
+                            chunk_size: int = PURGE_CHUNK_SIZE):
+    """Delete every departure before `cutoff` with its bookings, seats, payments and inventory rows.
+
+    On PostgreSQL whole months of bookings are dropped with their journey_date
+    partitions; what is left (the cutoff's own month, the default partition,
+    unpartitioned schemas) is deleted chunk by chunk.
+    """
+    db = session_factory()
+    try:
+        condition = Booking.journey_date < cutoff
+        job.total_bookings = db.query(func.count(Booking.booking_id)).filter(condition).scalar() or 0
+        for month in months_before(db, cutoff):
+            bookings, seats, payments = drop_month(db, month)
+            db.commit()
+            job.bookings_deleted += bookings
+            job.seats_deleted += seats
+            job.payments_deleted += payments
+        _purge_bookings_where(db, condition, job, chunk_size)
+
+        departed_before = datetime.combine(cutoff, datetime.min.time())
+        while True:
+            schedule_ids = [schedule_id for (schedule_id,) in db.execute(
+                departed_schedules_query(departed_before, chunk_size)
+            ).all()]
+            if not schedule_ids:
+                break
+            db.query(CoachInventory).filter(CoachInventory.schedule_id.in_(schedule_ids)).delete(synchronize_session=False)
+            db.query(Schedule).filter(Schedule.schedule_id.in_(schedule_ids)).delete(synchronize_session=False)
+            db.commit()
+            seat_inventory.forget_schedules(schedule_ids)
+        departure_index.invalidate()
+    finally:
+        db.close()
+
+
+class PurgeJobs:
+    """Runs purges one at a time on a background thread and keeps their progress"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._jobs: "OrderedDict[int, PurgeJob]" = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="purge")
+
+    def submit(self, kind: str, requested_by: Optional[int], purge: Callable, *args) -> PurgeJob:
+        with self._lock:
+            job = PurgeJob(next(self._ids), kind, requested_by)
+            self._jobs[job.job_id] = job
+            while len(self._jobs) > PURGE_JOBS_KEPT:
+                self._jobs.popitem(last=False)
+        self._executor.submit(self._run, job, purge, args)
+        return job
+
+    def _run(self, job: PurgeJob, purge: Callable, args):
+        job.status = "running"
+        try:
+            purge(database.session_router.primary_factory, *args, job)
+            job.status = "done"
+        except Exception as e:
+            logger.exception("Purge job failed", extra={"job_id": job.job_id, "kind": job.kind})
+            job.status = "failed"
+            job.error = str(e)
+        job.finished_at = datetime.now()
+        logger.info("Purge job finished", extra=job.to_dict())
+
+    def get(self, job_id: int) -> Optional[PurgeJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+
+purge_jobs = PurgeJobs()
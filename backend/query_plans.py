@@ -0,0 +1,153 @@
+# query_plans.py
+"""
+EXPLAIN check for the hot queries.
+
+Runs EXPLAIN on the queries the request paths issue and reports every one
+that reads a large table with a sequential scan, i.e. without an index. Run
+from the backend folder against a migrated database; exits with status 1
+when any query falls back to a sequential scan:
+
+    python query_plans.py
+
+On PostgreSQL sequential scans are disabled for the check (enable_seqscan =
+off), so one still shows up only when no index can serve the query, however
+few rows the tables hold. On SQLite the plan comes from EXPLAIN QUERY PLAN.
+"""
+import sys
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy import select
+from sqlalchemy.sql import Select
+
+from holds import due_holds_query
+from idempotency import idempotency_key_query
+from inventory import (
+    booked_seats_query, coach_booked_seats_query, coach_version_query, layout_query, layout_stops_query
+)
+from journey_planner import departures_query
+from models import Booking, BookingSeat, Payment, Route, Train, User
+from purge import bookings_where_query, departed_schedules_query
+from schedules import Departure, departures_on_query, next_departure_query
+from ticket_tokens import revoked_bookings_query
+from tickets import (
+    my_tickets_query, route_endpoints_query, ticket_bookings_query, ticket_payments_query, ticket_seats_query,
+    train_stops_query
+)
+from timetable import timetable_query
+
+# Tables that grow with traffic or with the network; a full scan of stations,
+# trains or routes stays cheap and those are cached in memory anyway
+LARGE_TABLES = {
+    "users", "coaches", "seats", "route_stations", "schedules", "bookings", "booking_seats", "payments",
+    "coach_inventory", "idempotency_keys"
+}
+
+# Tables a hot query reads in full on purpose: the timetable is compiled from
+# every route station once per timetable version and then served from memory
+EXPECTED_SCANS = {
+    "timetable: stops of every train": {"route_stations"},
+}
+
+
+def hot_queries() -> Dict[str, Select]:
+    """The queries behind each request path, with representative parameters.
+
+    Built with the same statement helpers the request paths call, so the check
+    follows the application's SQL; only the one-line lookups written inline in
+    main.py are repeated here.
+    """
+    now = datetime(2030, 1, 1, 8, 0)
+    journey_date = now.date()
+    departure = Departure(1, journey_date)
+    train_ids = [1, 2, 3]
+    booking_ids = [1, 2, 3]
+    return {
+        "login: user by email": select(User).where(User.email == "user@example.com"),
+        "train-info: train by name": select(Train).where(Train.train_name == "Train 1").limit(1),
+        "train-info: route of a train": select(Route).where(Route.train_id == 1).limit(1),
+        "timetable: stops of every train": timetable_query(),
+        "journey planner: departures of a day": departures_query(now),
+        "departures: departures of a day": departures_on_query(now),
+        "departures: next departure of a train": next_departure_query(1, now),
+        "inventory: train layouts": layout_query(train_ids),
+        "inventory: stops of trains": layout_stops_query(train_ids),
+        "inventory: booked seats of departures": booked_seats_query([departure, Departure(2, journey_date)]),
+        "inventory: booked seats of a coach": coach_booked_seats_query(1, departure),
+        "inventory: coach version": coach_version_query(1, 1),
+        "create-booking: idempotency key": idempotency_key_query(1, "key"),
+        "cancel-booking: seats of a booking": select(BookingSeat.seat_id).where(
+            BookingSeat.booking_id == 1, BookingSeat.journey_date == journey_date
+        ),
+        "my-tickets: page of bookings": my_tickets_query(1, journey_date, after_booking_id=1000, limit=51),
+        "tickets: bookings by id": ticket_bookings_query(booking_ids),
+        "tickets: seats of bookings": ticket_seats_query(booking_ids),
+        "tickets: payments of bookings": ticket_payments_query(booking_ids),
+        "tickets, my-tickets: stops of trains": train_stops_query(train_ids),
+        "tickets: routes of trains": route_endpoints_query(train_ids, [1]),
+        "ticket revocations: revoked tickets of journeys ahead": revoked_bookings_query(journey_date),
+        "holds: expired holds": due_holds_query(now, 500),
+        "purge: bookings of users": bookings_where_query(Booking.user_id.in_([1, 2]), 500),
+        "purge: bookings before cutoff": bookings_where_query(Booking.booking_date < now, 500),
+        "purge: departed bookings": bookings_where_query(Booking.journey_date < journey_date, 500),
+        "purge: departed schedules": departed_schedules_query(now, 500),
+        "purge: payments of bookings": select(Payment.payment_id).where(Payment.booking_id.in_(booking_ids)),
+    }
+
+
+def _compile(conn, statement: Select):
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    if compiled.positional:
+        return str(compiled), tuple(compiled.params[name] for name in compiled.positiontup)
+    return str(compiled), compiled.params
+
+
+def _postgres_seq_scans(conn, sql: str, params) -> List[str]:
+    conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + sql, params).scalar()
+    scans = []
+    nodes = [plan[0]["Plan"]]
+    while nodes:
+        node = nodes.pop()
+        if node["Node Type"] == "Seq Scan":
+            scans.append(node["Relation Name"])
+        nodes.extend(node.get("Plans", []))
+    return scans
+
+
+def _sqlite_seq_scans(conn, sql: str, params) -> List[str]:
+    scans = []
+    for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql, params):
+        # "SCAN bookings" reads the whole table; "SEARCH bookings USING INDEX ..." does not
+        words = row[-1].split()
+        if len(words) >= 2 and words[0] == "SCAN":
+            scans.append(words[1])
+    return scans
+
+
+def check_query_plans(engine) -> List[str]:
+    """Return one message per hot query that sequentially scans a large table"""
+    problems = []
+    with engine.connect() as conn:
+        seq_scans = _postgres_seq_scans if conn.dialect.name == "postgresql" else _sqlite_seq_scans
+        for name, statement in hot_queries().items():
+            sql, params = _compile(conn, statement)
+            # Rolled back so SET LOCAL ends with each query
+            transaction = conn.begin()
+            try:
+                tables = sorted(set(seq_scans(conn, sql, params)) & LARGE_TABLES - EXPECTED_SCANS.get(name, set()))
+            finally:
+                transaction.rollback()
+            if tables:
+                problems.append(f"{name}: sequential scan on {', '.join(tables)}")
+    return problems
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    problems = check_query_plans(engine)
+    for problem in problems:
+        print(problem)
+    print(f"{len(hot_queries())} queries checked, {len(problems)} with sequential scans")
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,79 @@
+# reference_cache.py
+import gzip
+import hashlib
+import json
+import threading
+from typing import Callable, Dict, Hashable
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from timetable import on_timetable_change, timetable_version
+
+
+class CachedBody:
+    """A serialized JSON payload with its gzip form and a strong ETag for each.
+
+    The two bodies are different representations, so the gzip one is tagged
+    with a "-gz" suffix; a cache holding one is never handed the other on a 304.
+    """
+
+    __slots__ = ("version", "etag", "gzip_etag", "body", "gzipped")
+
+    def __init__(self, version: int, payload):
+        self.version = version
+        self.body = json.dumps(jsonable_encoder(payload), separators=(",", ":")).encode("utf-8")
+        self.gzipped = gzip.compress(self.body)
+        digest = hashlib.sha256(self.body).hexdigest()[:32]
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gz"'
+
+
+class ReferenceCache:
+    """Process-level cache of rarely changing reference data (stations, routes).
+
+    Entries are tied to the timetable version they were built under and are
+    rebuilt on first use after the timetable changes. Builders that raise
+    (e.g. a 404) are not cached.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, CachedBody] = {}
+
+    def get(self, key: Hashable, build: Callable[[], object]) -> CachedBody:
+        version = timetable_version()
+        entry = self._entries.get(key)
+        if entry is not None and entry.version == version:
+            return entry
+        entry = CachedBody(version, build())
+        with self._lock:
+            self._entries[key] = entry
+        return entry
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def cached_json_response(request: Request, entry: CachedBody) -> Response:
+    """Answer with 304 when the client already has this body, gzip when accepted.
+
+    If-None-Match matches either representation's tag (weakly, as RFC 9110
+    asks), since both name the same content; the 304 carries the tag of the
+    representation this request would have been sent.
+    """
+    gzipped = "gzip" in request.headers.get("accept-encoding", "")
+    headers = {"ETag": entry.gzip_etag if gzipped else entry.etag, "Vary": "Accept-Encoding"}
+    if_none_match = request.headers.get("if-none-match", "")
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if entry.etag in tags or entry.gzip_etag in tags or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    if gzipped:
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=entry.gzipped, media_type="application/json", headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+reference_cache = ReferenceCache()
+on_timetable_change(reference_cache.invalidate)
@@ -0,0 +1,88 @@
+# route_index.py
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import RouteStation, Station
+from timetable import on_timetable_change
+
+
+class RouteIndex:
+    """Inverted index from station to the trains that stop there.
+
+    Each station maps to its trains sorted by train_id, with the first and
+    last sequence_number at which the train calls there. The trains serving a
+    journey are found by walking the shorter of the two stations' lists,
+    probing the other station by train_id, and keeping the trains that reach
+    the origin before the destination.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._station_ids: Dict[str, int] = {}
+        self._station_names: Dict[int, str] = {}
+        self._postings: Dict[int, List[Tuple[int, int, int]]] = {}
+        self._stops: Dict[int, Dict[int, Tuple[int, int]]] = {}
+        self._built = False
+
+    def build(self, db: Session):
+        """(Re)build the index from the stations and route_stations tables"""
+        station_ids = dict(db.query(Station.station_name, Station.station_id).all())
+        rows = db.query(
+            RouteStation.station_id, RouteStation.train_id, RouteStation.sequence_number
+        ).filter(RouteStation.sequence_number.isnot(None)).all()
+
+        # A train may call at a station twice; keep its first and last call
+        stops: Dict[int, Dict[int, Tuple[int, int]]] = {}
+        for station_id, train_id, sequence_number in rows:
+            trains = stops.setdefault(station_id, {})
+            first, last = trains.get(train_id, (sequence_number, sequence_number))
+            trains[train_id] = (min(first, sequence_number), max(last, sequence_number))
+        postings = {
+            station_id: sorted((train_id, first, last) for train_id, (first, last) in trains.items())
+            for station_id, trains in stops.items()
+        }
+
+        with self._lock:
+            self._station_ids = station_ids
+            self._station_names = {station_id: name for name, station_id in station_ids.items()}
+            self._postings = postings
+            self._stops = stops
+            self._built = True
+
+    def ensure(self, db: Session):
+        """Build the index on first use"""
+        if not self._built:
+            self.build(db)
+
+    def invalidate(self):
+        """Mark the index stale so the next lookup rebuilds it"""
+        with self._lock:
+            self._built = False
+
+    def station_id(self, station_name: str) -> Optional[int]:
+        return self._station_ids.get(station_name)
+
+    def station_name(self, station_id: int) -> Optional[str]:
+        return self._station_names.get(station_id)
+
+    def trains_between(self, from_station_id: int, to_station_id: int) -> List[int]:
+        """Return ids of trains that stop at from_station and later at to_station, sorted"""
+        origin = self._postings.get(from_station_id, [])
+        destination = self._postings.get(to_station_id, [])
+        if len(origin) <= len(destination):
+            destination_stops = self._stops.get(to_station_id, {})
+            return [
+                train_id for train_id, first, _ in origin
+                if train_id in destination_stops and first < destination_stops[train_id][1]
+            ]
+        origin_stops = self._stops.get(from_station_id, {})
+        return [
+            train_id for train_id, _, last in destination
+            if train_id in origin_stops and origin_stops[train_id][0] < last
+        ]
+
+
+route_index = RouteIndex()
+on_timetable_change(route_index.invalidate)
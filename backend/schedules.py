@@ -0,0 +1,179 @@
+# schedules.py
+"""
+Departures: one Schedule row per train and service date.
+
+materialize_schedules fills a rolling window of service dates in bulk, from
+the clock times on each train's route stations. Bookings and seat inventory
+are kept per departure, so every date a train can be booked on needs its
+row. The job runs at startup, from /admin/materialize-schedules, and from
+cron:
+
+    python schedules.py --days 30
+"""
+import argparse
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from logging_config import get_logger
+from models import Route, Schedule
+from partitions import ensure_partitions
+from timetable import compiled_timetable, notify_timetable_changed, on_timetable_change, timetable_version
+
+# Service dates, today included, that always have their departures materialized
+SCHEDULE_WINDOW_DAYS = int(os.getenv("SCHEDULE_WINDOW_DAYS", "30"))
+# Schedule rows per INSERT statement
+INSERT_CHUNK = 5000
+CACHED_SERVICE_DAYS = 14
+
+logger = get_logger("schedules")
+
+# A bookable run of a train: its Schedule row and service date
+Departure = namedtuple("Departure", ["schedule_id", "journey_date"])
+
+
+def _day_start(service_date: date) -> datetime:
+    return datetime.combine(service_date, datetime.min.time())
+
+
+def materialize_schedules(db: Session, start: Optional[date] = None, days: int = SCHEDULE_WINDOW_DAYS) -> int:
+    """Insert the missing departures of every timed train for `days` service dates from `start`.
+
+    A train departs its first stop at that stop's clock time each day; dates on
+    which a train already has a Schedule row are left alone, so the job can run
+    any number of times. The journey_date partitions the new dates need are
+    created first. Returns the number of rows inserted.
+    """
+    start = start or date.today()
+    if days <= 0:
+        return 0
+    window_start = _day_start(start)
+    window_end = window_start + timedelta(days=days)
+
+    stop_times = compiled_timetable.stop_times(db)
+    route_ids = dict(db.query(Route.train_id, func.min(Route.route_id)).group_by(Route.train_id).all())
+    existing = {(train_id, departure_time.date()) for train_id, departure_time in db.query(
+        Schedule.train_id, Schedule.departure_time
+    ).filter(
+        Schedule.departure_time >= window_start,
+        Schedule.departure_time < window_end
+    ).all()}
+
+    rows = []
+    for train_id, stops in stop_times.items():
+        if len(stops) < 2:
+            continue
+        for offset in range(days):
+            day_start = window_start + timedelta(days=offset)
+            if (train_id, day_start.date()) in existing:
+                continue
+            rows.append({
+                "train_id": train_id,
+                "route_id": route_ids.get(train_id),
+                "departure_time": day_start + timedelta(minutes=stops[0].departure),
+                "arrival_time": day_start + timedelta(minutes=stops[-1].arrival)
+            })
+
+    try:
+        ensure_partitions(db, start, start + timedelta(days=days - 1))
+        for index in range(0, len(rows), INSERT_CHUNK):
+            db.execute(insert(Schedule), rows[index:index + INSERT_CHUNK])
+        db.commit()
+    except IntegrityError:
+        # Another worker materialized the same window first
+        db.rollback()
+        logger.info("Schedules already materialized", extra={"start": start.isoformat(), "days": days})
+        return 0
+
+    if rows:
+        notify_timetable_changed(db)
+    logger.info("Materialized schedules", extra={"start": start.isoformat(), "days": days, "inserted": len(rows)})
+    return len(rows)
+
+
+def departures_on_query(day_start: datetime) -> Select:
+    """Departures of the service day starting at day_start, earliest first"""
+    return select(Schedule.schedule_id, Schedule.train_id).where(
+        Schedule.departure_time >= day_start,
+        Schedule.departure_time < day_start + timedelta(days=1)
+    ).order_by(Schedule.departure_time)
+
+
+def next_departure_query(train_id: int, now: datetime) -> Select:
+    """The train's first departure at or after `now`"""
+    return select(Schedule.schedule_id, Schedule.departure_time).where(
+        Schedule.train_id == train_id,
+        Schedule.departure_time >= now
+    ).order_by(Schedule.departure_time).limit(1)
+
+
+class DepartureIndex:
+    """Departures per service date, for the most recently used dates.
+
+    A train running several times a day is booked on its first departure.
+    Dates without any departure are not cached, so a window materialized by
+    another worker shows up on the next lookup.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dates: "OrderedDict[date, Dict[int, Departure]]" = OrderedDict()
+
+    def on_date(self, db: Session, service_date: date) -> Dict[int, Departure]:
+        """train_id -> departure for every train departing on service_date"""
+        with self._lock:
+            departures = self._dates.get(service_date)
+            if departures is not None:
+                self._dates.move_to_end(service_date)
+                return departures
+
+        version = timetable_version()
+        day_start = _day_start(service_date)
+        departures = {}
+        for schedule_id, train_id in db.execute(departures_on_query(day_start)).all():
+            departures.setdefault(train_id, Departure(schedule_id, service_date))
+
+        if departures:
+            with self._lock:
+                if timetable_version() == version:
+                    self._dates[service_date] = departures
+                    while len(self._dates) > CACHED_SERVICE_DAYS:
+                        self._dates.popitem(last=False)
+        return departures
+
+    def departure(self, db: Session, train_id: int, journey_date: Optional[date] = None) -> Optional[Departure]:
+        """The train's departure on journey_date, or its next departure from now when no date is given"""
+        if journey_date is not None:
+            return self.on_date(db, journey_date).get(train_id)
+        row = db.execute(next_departure_query(train_id, datetime.now())).first()
+        return Departure(row.schedule_id, row.departure_time.date()) if row else None
+
+    def invalidate(self):
+        with self._lock:
+            self._dates.clear()
+
+
+departure_index = DepartureIndex()
+on_timetable_change(departure_index.invalidate)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Materialize the departures of a window of service dates")
+    parser.add_argument("--start", type=date.fromisoformat, help="first service date (default: today)")
+    parser.add_argument("--days", type=int, default=SCHEDULE_WINDOW_DAYS)
+    args = parser.parse_args()
+
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(f"{materialize_schedules(db, args.start, args.days)} schedules inserted")
+    finally:
+        db.close()
@@ -0,0 +1,171 @@
+# conftest.py
+import os
+import tempfile
+
+# Point the app at a throwaway SQLite database before anything imports database.py
+_db_dir = tempfile.mkdtemp(prefix="railtikit-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("LOG_LEVEL", "OFF")
+# No background hold sweeps or timetable checks; their statements would land in the query counts
+os.environ.setdefault("HOLD_SWEEP_SECONDS", "0")
+os.environ.setdefault("TIMETABLE_POLL_SECONDS", "0")
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import database
+from auth import get_password_hash
+from inventory import seat_inventory
+from models import (
+    Base, Booking, BookingSeat, Coach, Payment, Route, RouteStation, Schedule, Seat, Station, Train, User
+)
+from principal_cache import principal_cache
+from ticket_tokens import ticket_revocations
+from timetable import notify_timetable_changed
+
+STATION_NAMES = ["Dhaka", "Comilla", "Chittagong", "Sylhet", "Khulna", "Rajshahi", "Rangpur", "Mymensingh"]
+PASSWORD = "secret-password"
+
+
+class QueryCounter:
+    """Counts SQL statements sent through the app's sync and async engines"""
+
+    def __init__(self):
+        self.count = 0
+        for engine in (database.engine, database.async_engine.sync_engine):
+            event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+    def reset(self):
+        self.count = 0
+
+
+def seed(n_trains: int, n_coaches: int, seats_per_coach: int, n_bookings: int) -> dict:
+    """Recreate the schema and fill it with a network of the given size.
+
+    Every train serves Dhaka -> Comilla -> Chittagong plus one extra stop, so
+    searches between those stations match every train. Bookings belong to a
+    single customer and are spread over the trains; all are paid except the
+    second, which holds its seat for another hour.
+    """
+    Base.metadata.drop_all(bind=database.engine)
+    Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    try:
+        stations = [Station(station_name=name, location=name) for name in STATION_NAMES]
+        db.add_all(stations)
+        db.flush()
+        station_ids = [station.station_id for station in stations]
+
+        customer = User(name="Customer", email="customer@example.com", phone="0100",
+                        password=get_password_hash(PASSWORD), role="customer")
+        admin = User(name="Admin", email="admin@example.com", phone="0200",
+                     password=get_password_hash(PASSWORD), role="admin")
+        db.add_all([customer, admin])
+        db.flush()
+
+        departure = datetime(2030, 1, 1, 8, 0)
+        seats_by_train = {}
+        schedules = {}
+        for number in range(1, n_trains + 1):
+            train = Train(train_name=f"Train {number}", train_type="Intercity", total_coaches=n_coaches)
+            db.add(train)
+            db.flush()
+            stops = station_ids[:3] + [station_ids[3 + number % (len(station_ids) - 3)]]
+            for sequence, station_id in enumerate(stops, start=1):
+                offset = (sequence - 1) * 90
+                db.add(RouteStation(train_id=train.train_id, station_id=station_id, sequence_number=sequence,
+                                    arrival_offset_minutes=str(offset), departure_offset_minutes=str(offset + 5),
+                                    halt_minutes=5))
+            route = Route(train_id=train.train_id, source_station_id=stops[0],
+                          destination_station_id=stops[-1], distance_km=300)
+            db.add(route)
+            db.flush()
+            schedule = Schedule(train_id=train.train_id, route_id=route.route_id, departure_time=departure,
+                                arrival_time=departure + timedelta(hours=6))
+            db.add(schedule)
+            db.flush()
+            schedules[train.train_id] = schedule.schedule_id
+            for coach_number in range(n_coaches):
+                coach_type = ["Shovon", "Snigdha"][coach_number % 2]
+                coach = Coach(train_id=train.train_id, coach_number=f"C{coach_number + 1}",
+                              coach_type=coach_type, total_seats=seats_per_coach)
+                db.add(coach)
+                db.flush()
+                seat_rows = [Seat(coach_id=coach.coach_id, seat_number=str(seat + 1), seat_class=coach_type)
+                             for seat in range(seats_per_coach)]
+                db.add_all(seat_rows)
+                db.flush()
+                seats_by_train.setdefault(train.train_id, []).extend(seat_rows)
+
+        train_ids = sorted(seats_by_train)
+        booking_ids = []
+        for number in range(n_bookings):
+            train_id = train_ids[number % len(train_ids)]
+            seat = seats_by_train[train_id][number // len(train_ids)]
+            held = number == 1
+            booking = Booking(user_id=customer.user_id, schedule_id=schedules[train_id], journey_date=departure.date(),
+                              booking_date=datetime.now(), status="held" if held else "confirmed",
+                              hold_expires_at=datetime.now() + timedelta(hours=1) if held else None)
+            db.add(booking)
+            db.flush()
+            db.add(BookingSeat(booking_id=booking.booking_id, seat_id=seat.seat_id, schedule_id=schedules[train_id],
+                               journey_date=departure.date(), fare=400))
+            if not held:
+                db.add(Payment(booking_id=booking.booking_id, amount=400, payment_date=datetime.now(), status="paid"))
+            booking_ids.append(booking.booking_id)
+
+        db.commit()
+        return {"train_ids": train_ids, "booking_ids": booking_ids}
+    finally:
+        db.close()
+
+
+def reset_caches():
+    """Drop every in-process cache so each measured request starts cold"""
+    notify_timetable_changed()
+    seat_inventory.invalidate()
+    principal_cache.clear()
+    ticket_revocations.clear()
+
+
+@pytest.fixture(scope="session")
+def client():
+    # Entering the client keeps one event loop for the whole session, which
+    # the async engine's pooled connections are bound to
+    from main import app
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def query_counter():
+    return QueryCounter()
+
+
+def login(client: TestClient, email: str) -> dict:
+    response = client.post("/login", json={"email": email, "password": PASSWORD})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def book(client: TestClient, headers: dict, train_id: int, ticket_count=2, journey_date: str = "2030-01-01",
+         coach_type: str = "Shovon"):
+    """POST /create-booking and return the response"""
+    return client.post("/create-booking", headers=headers, json={
+        "train_id": train_id, "coach_type": coach_type, "ticket_count": ticket_count, "journey_date": journey_date
+    })
+
+
+def available_seats(client: TestClient, headers: dict, train_id: int, journey_date: str = "2030-01-01",
+                    coach_type: str = "Shovon") -> int:
+    """Seats of `coach_type` still on sale for the departure, per GET /coach-availability"""
+    response = client.get(f"/coach-availability/{train_id}", params={"journey_date": journey_date}, headers=headers)
+    assert response.status_code == 200, response.text
+    return sum(coach["available_seats"] for coach in response.json() if coach["coach_type"] == coach_type)
@@ -0,0 +1,36 @@
+# test_booking_requests.py
+"""
+Malformed booking requests are rejected with 400 before any seat is allocated;
+train ids sent as numeric strings are accepted as before.
+"""
+import pytest
+
+from conftest import book, login, reset_caches, seed
+
+
+@pytest.mark.parametrize("ticket_count", [0, -1, "2", 1.5, True, None])
+def test_ticket_count_must_be_a_positive_integer(client, ticket_count):
+    data = seed(n_trains=1, n_coaches=2, seats_per_coach=4, n_bookings=0)
+    reset_caches()
+    user = login(client, "customer@example.com")
+    response = book(client, user, data["train_ids"][0], ticket_count)
+    assert response.status_code == 400, response.text
+    assert response.json()["detail"] == "ticket_count must be a positive integer"
+
+
+def test_train_id_may_be_a_numeric_string(client):
+    data = seed(n_trains=1, n_coaches=2, seats_per_coach=4, n_bookings=0)
+    reset_caches()
+    user = login(client, "customer@example.com")
+    train_id = str(data["train_ids"][0])
+
+    response = client.post("/refresh-coach-availability", headers=user, json={"train_id": train_id})
+    assert response.status_code == 200, response.text
+    response = book(client, user, train_id, 1)
+    assert response.status_code == 200, response.text
+
+    for request in (lambda: client.post("/refresh-coach-availability", headers=user, json={"train_id": "first"}),
+                    lambda: book(client, user, "first", 1)):
+        response = request()
+        assert response.status_code == 400, response.text
+        assert response.json()["detail"] == "Invalid train ID format"
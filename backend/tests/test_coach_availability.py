@@ -0,0 +1,33 @@
+# test_coach_availability.py
+"""
+Coach availability is read with set-based queries: a request costs the same
+number of SQL statements whether the train has 2 coaches or 20.
+"""
+import pytest
+
+from conftest import login, reset_caches, seed
+
+REQUESTS = {
+    "GET /coach-availability/{train_id}": lambda c, user, train_id: c.get(
+        f"/coach-availability/{train_id}", params={"journey_date": "2030-01-01"}, headers=user),
+    "POST /refresh-coach-availability": lambda c, user, train_id: c.post(
+        "/refresh-coach-availability", json={"train_id": train_id}, headers=user),
+}
+
+
+def count_queries(client, query_counter, request, n_coaches: int) -> int:
+    data = seed(n_trains=1, n_coaches=n_coaches, seats_per_coach=10, n_bookings=n_coaches)
+    user = login(client, "customer@example.com")
+    reset_caches()
+    query_counter.reset()
+    response = request(client, user, data["train_ids"][0])
+    assert response.status_code == 200, response.text
+    assert len(response.json()) == n_coaches
+    return query_counter.count
+
+
+@pytest.mark.parametrize("name", list(REQUESTS))
+def test_queries_do_not_grow_with_coaches(client, query_counter, name):
+    few = count_queries(client, query_counter, REQUESTS[name], 2)
+    many = count_queries(client, query_counter, REQUESTS[name], 20)
+    assert few == many, f"{name} runs {few} queries for 2 coaches but {many} for 20"
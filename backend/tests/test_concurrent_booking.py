@@ -0,0 +1,63 @@
+# test_concurrent_booking.py
+"""
+Parallel bookings of one coach never sell the same seat twice: every request
+either gets distinct seats, is told the coach is full, or is asked to retry.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func
+
+import database
+from conftest import book, login, reset_caches, seed
+from inventory import seat_inventory
+from models import BookingSeat
+
+SEATS = 20
+REQUESTS = 40
+
+
+def test_parallel_bookings_never_share_a_seat(client):
+    data = seed(n_trains=1, n_coaches=1, seats_per_coach=SEATS, n_bookings=0)
+    reset_caches()
+    user = login(client, "customer@example.com")
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        responses = list(pool.map(lambda _: book(client, user, data["train_ids"][0], 1), range(REQUESTS)))
+
+    assert {response.status_code for response in responses} <= {200, 400, 409}
+    booked = [seat["seat_id"] for response in responses if response.status_code == 200
+              for seat in response.json()["allocated_seats"]]
+    assert 0 < len(booked) == len(set(booked)) <= SEATS
+
+    db = database.SessionLocal()
+    try:
+        duplicates = db.query(BookingSeat.schedule_id, BookingSeat.seat_id).filter(
+            BookingSeat.is_active.is_(True)
+        ).group_by(BookingSeat.schedule_id, BookingSeat.seat_id).having(func.count() > 1).all()
+        active = db.query(func.count(BookingSeat.booking_seat_id)).filter(BookingSeat.is_active.is_(True)).scalar()
+    finally:
+        db.close()
+    assert duplicates == []
+    assert active == len(booked)
+
+
+def test_invalidating_the_caches_mid_allocation_does_not_resell_a_seat(client, monkeypatch):
+    data = seed(n_trains=1, n_coaches=1, seats_per_coach=4, n_bookings=0)
+    reset_caches()
+    user = login(client, "customer@example.com")
+
+    # A timetable refresh landing while the coach row is locked clears the
+    # layouts and occupancy the allocation started from
+    lock_coach = seat_inventory._lock_coach
+
+    def lock_and_invalidate(*args, **kwargs):
+        version = lock_coach(*args, **kwargs)
+        seat_inventory.invalidate()
+        return version
+
+    monkeypatch.setattr(seat_inventory, "_lock_coach", lock_and_invalidate)
+    responses = [book(client, user, data["train_ids"][0], 1) for _ in range(2)]
+
+    assert [response.status_code for response in responses] == [200, 200]
+    first, second = (response.json()["allocated_seats"][0]["seat_id"] for response in responses)
+    assert first != second
@@ -0,0 +1,40 @@
+# test_fares.py
+"""
+Fares follow the distance of the booked leg: the whole route costs the class
+fare scaled by the route's length, shorter legs cost less, and very short legs
+are charged the minimum distance.
+"""
+from fares import CLASS_FARES, MINIMUM_DISTANCE_KM, REFERENCE_DISTANCE_KM, FareTable
+from timetable import CompiledStop
+
+
+def stops(elapsed):
+    return [
+        CompiledStop(sequence, sequence * 10, f"Station {sequence}", None, None, 0, None, minutes, None)
+        for sequence, minutes in enumerate(elapsed, start=1)
+    ]
+
+
+def test_whole_route_costs_class_fare_scaled_by_distance():
+    table = FareTable(1, stops([0, 60, 120]), REFERENCE_DISTANCE_KM)
+    assert table.fare("Shovon", 0, 2) == CLASS_FARES["Shovon"]
+    assert table.fare("AC_Cabin", 0, 2) == CLASS_FARES["AC_Cabin"]
+
+    longer = FareTable(2, stops([0, 60, 120]), REFERENCE_DISTANCE_KM * 2)
+    assert longer.fare("Shovon", 0, 2) == CLASS_FARES["Shovon"] * 2
+
+
+def test_legs_are_priced_by_running_time_share():
+    table = FareTable(1, stops([0, 30, 120]), 240)
+    rate = CLASS_FARES["Snigdha"] / REFERENCE_DISTANCE_KM
+    assert table.fare("Snigdha", 0, 1) == round(rate * 60)
+    assert table.fare("Snigdha", 1, 2) == round(rate * 180)
+    assert table.leg(2, 3) == (1, 2)
+    assert table.leg_for_stations(20, 30) == (1, 2)
+    assert table.leg_for_stations(30, 10) is None
+
+
+def test_short_legs_pay_the_minimum_distance():
+    table = FareTable(1, stops([0, 1, 600]), 600)
+    rate = CLASS_FARES["Shovon"] / REFERENCE_DISTANCE_KM
+    assert table.fare("Shovon", 0, 1) == round(rate * MINIMUM_DISTANCE_KM)
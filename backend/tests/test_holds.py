@@ -0,0 +1,106 @@
+# test_holds.py
+"""
+A booking holds its seats until it is paid. Paying in time confirms it; the
+hold sweep expires unpaid holds and puts their seats back on sale.
+"""
+from datetime import datetime, timedelta
+
+import database
+from conftest import available_seats, book, login, reset_caches, seed
+from holds import release_expired_holds
+from models import Booking, BookingSeat, Payment, Schedule, User
+
+
+def test_unpaid_holds_release_their_seats(client):
+    data = seed(n_trains=1, n_coaches=2, seats_per_coach=4, n_bookings=0)
+    reset_caches()
+    user = login(client, "customer@example.com")
+    train_id = data["train_ids"][0]
+
+    paid, unpaid = book(client, user, train_id).json(), book(client, user, train_id).json()
+    assert paid["status"] == unpaid["status"] == "held"
+    assert available_seats(client, user, train_id) == 0
+
+    # The payment must cover the fares the booking was charged
+    response = client.post("/create-payment", headers=user, json={"booking_id": paid["booking_id"], "amount": 1})
+    assert response.status_code == 400
+    # Another user learns nothing about the booking, not even its total
+    other = login(client, "admin@example.com")
+    response = client.post("/create-payment", headers=other, json={"booking_id": paid["booking_id"], "amount": 1})
+    assert response.status_code == 404
+    response = client.post("/create-payment", headers=user, json={"booking_id": "not-a-number"})
+    assert response.status_code == 400
+    # A string id, as form-built clients send it, still gets its ticket token
+    response = client.post("/create-payment", headers=user, json={
+        "booking_id": str(paid["booking_id"]), "amount": paid["total_amount"]
+    })
+    assert response.status_code == 200, response.text
+    assert response.json()["ticket_token"]
+
+    db = database.SessionLocal()
+    try:
+        # Nothing is due yet; an hour later only the unpaid hold has run out
+        assert release_expired_holds(db) == 0
+        assert release_expired_holds(db, datetime.now() + timedelta(hours=1)) == 1
+        statuses = dict(db.query(Booking.booking_id, Booking.status).all())
+        active = dict(db.query(BookingSeat.booking_id, BookingSeat.is_active).all())
+    finally:
+        db.close()
+    assert statuses == {paid["booking_id"]: "confirmed", unpaid["booking_id"]: "expired"}
+    assert active == {paid["booking_id"]: True, unpaid["booking_id"]: False}
+    assert available_seats(client, user, train_id) == 2
+
+    response = client.post("/create-payment", headers=user, json={
+        "booking_id": unpaid["booking_id"], "amount": unpaid["total_amount"]
+    })
+    assert response.status_code == 400
+    assert book(client, user, train_id).status_code == 200
+
+
+def test_bookings_without_seats_cannot_be_paid(client):
+    seed(n_trains=1, n_coaches=1, seats_per_coach=4, n_bookings=0)
+    reset_caches()
+    user = login(client, "customer@example.com")
+
+    db = database.SessionLocal()
+    try:
+        customer = db.query(User).filter(User.email == "customer@example.com").one()
+        schedule = db.query(Schedule).first()
+        booking = Booking(user_id=customer.user_id, schedule_id=schedule.schedule_id,
+                          journey_date=schedule.departure_time.date(), booking_date=datetime.now(),
+                          status="held", hold_expires_at=datetime.now() + timedelta(hours=1))
+        db.add(booking)
+        db.commit()
+        booking_id = booking.booking_id
+    finally:
+        db.close()
+
+    response = client.post("/create-payment", headers=user, json={"booking_id": booking_id})
+    assert response.status_code == 400
+    db = database.SessionLocal()
+    try:
+        assert db.query(Payment).count() == 0
+        assert db.query(Booking.status).filter(Booking.booking_id == booking_id).scalar() == "held"
+    finally:
+        db.close()
+
+
+def test_unpaid_holds_do_not_pass_the_gate(client):
+    data = seed(n_trains=1, n_coaches=1, seats_per_coach=4, n_bookings=0)
+    reset_caches()
+    user = login(client, "customer@example.com")
+    admin = login(client, "admin@example.com")
+
+    held = book(client, user, data["train_ids"][0], 1).json()
+
+    def gate():
+        batch = client.post("/verify-tickets", headers=admin, json={"booking_ids": [held["booking_id"]]})
+        token = client.post("/verify-ticket-token", headers=admin, json={"token": held["ticket_token"]})
+        assert batch.status_code == token.status_code == 200
+        return batch.json()["results"][0]["result"], token.json()["result"]
+
+    assert gate() == ("unpaid", "unpaid")
+    response = client.post("/create-payment", headers=user, json={"booking_id": held["booking_id"]})
+    assert response.status_code == 200, response.text
+    held["ticket_token"] = response.json()["ticket_token"]
+    assert gate() == ("valid", "valid")
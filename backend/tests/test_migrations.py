@@ -0,0 +1,74 @@
+# test_migrations.py
+"""
+The migrations must build the schema the models describe, and every hot query
+must be served by an index on the migrated schema. Existing bookings get the
+journey date of their schedule.
+"""
+from pathlib import Path
+
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, text
+
+from database import Base
+from query_plans import check_query_plans
+
+MIGRATIONS = Path(__file__).resolve().parent.parent / "migrations"
+
+
+def migrate(engine, revision: str = "head"):
+    config = Config()
+    config.set_main_option("script_location", str(MIGRATIONS))
+    with engine.connect() as connection:
+        config.attributes["connection"] = connection
+        command.upgrade(config, revision)
+        connection.commit()
+
+
+def test_migrations_match_models(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrated.db'}")
+    migrate(engine)
+    with engine.connect() as connection:
+        assert compare_metadata(MigrationContext.configure(connection), Base.metadata) == []
+
+
+def test_hot_queries_use_indexes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrated.db'}")
+    migrate(engine)
+    assert check_query_plans(engine) == []
+
+
+def test_hot_queries_without_indexes_are_reported(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrated.db'}")
+    migrate(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if not index.unique:
+                    index.drop(connection)
+    assert any("bookings" in problem for problem in check_query_plans(engine))
+
+
+def test_existing_bookings_get_journey_dates(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrated.db'}")
+    migrate(engine, "0003")
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO schedules (schedule_id, departure_time) VALUES (1, '2030-01-05 08:00:00.000000')"
+        ))
+        connection.execute(text(
+            "INSERT INTO bookings (booking_id, schedule_id, booking_date, status) VALUES "
+            "(1, 1, '2030-01-01 10:00:00.000000', 'confirmed'), (2, NULL, '2030-01-01 10:00:00.000000', 'confirmed')"
+        ))
+        connection.execute(text(
+            "INSERT INTO booking_seats (booking_seat_id, booking_id, schedule_id) VALUES (1, 1, 1), (2, 2, NULL)"
+        ))
+    migrate(engine)
+    with engine.connect() as connection:
+        bookings = dict(connection.execute(text("SELECT booking_id, journey_date FROM bookings")).all())
+        seats = dict(connection.execute(text("SELECT booking_id, journey_date FROM booking_seats")).all())
+    # The schedule's service date, or booking_date + 7 days without a schedule
+    assert bookings == {1: "2030-01-05", 2: "2030-01-08"}
+    assert seats == bookings
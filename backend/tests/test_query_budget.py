@@ -0,0 +1,77 @@
+# test_query_budget.py
+"""
+Every endpoint must run a fixed number of SQL statements, no matter how many
+trains, coaches or bookings exist. Each request is measured with cold caches,
+once against a small network and once against a larger one; the counts must
+match and stay within the endpoint's budget.
+"""
+from datetime import date
+
+import pytest
+
+from conftest import login, reset_caches, seed
+from ticket_tokens import issue_ticket_token
+
+SMALL = {"n_trains": 2, "n_coaches": 2, "seats_per_coach": 8, "n_bookings": 3}
+LARGE = {"n_trains": 9, "n_coaches": 6, "seats_per_coach": 30, "n_bookings": 45}
+
+SEARCH = {"from_station": "Dhaka", "to_station": "Chittagong", "journey_date": "2030-01-01"}
+
+# (endpoint, query budget, request); read-only requests first, then writes
+ENDPOINTS = [
+    ("GET /stations", 1, lambda c, user, admin, data: c.get("/stations")),
+    ("GET /train-info", 3, lambda c, user, admin, data: c.get("/train-info", params={"train_name": "Train 1"})),
+    ("GET /train-routes/{train_id}", 4, lambda c, user, admin, data: c.get(f"/train-routes/{data['train_ids'][0]}", headers=user)),
+    ("POST /search-trains", 8, lambda c, user, admin, data: c.post("/search-trains", json=SEARCH)),
+    ("POST /search-trains-by-route", 4, lambda c, user, admin, data: c.post("/search-trains-by-route", json=SEARCH, headers=user)),
+    ("POST /search-journeys", 7, lambda c, user, admin, data: c.post("/search-journeys", json=SEARCH, headers=user)),
+    ("GET /coach-availability/{train_id}", 8, lambda c, user, admin, data: c.get(
+        f"/coach-availability/{data['train_ids'][0]}", params={"from_station": "Dhaka", "to_station": "Comilla", "journey_date": "2030-01-01"}, headers=user)),
+    ("POST /refresh-coach-availability", 7, lambda c, user, admin, data: c.post(
+        "/refresh-coach-availability", json={"train_id": data["train_ids"][0]}, headers=user)),
+    ("GET /me", 1, lambda c, user, admin, data: c.get("/me", headers=user)),
+    ("GET /my-tickets", 3, lambda c, user, admin, data: c.get("/my-tickets", headers=user)),
+    ("POST /verify-ticket", 5, lambda c, user, admin, data: c.post(
+        "/verify-ticket", json={"booking_id": data["booking_ids"][-1]}, headers=user)),
+    ("POST /verify-tickets", 5, lambda c, user, admin, data: c.post(
+        "/verify-tickets", json={"booking_ids": data["booking_ids"]}, headers=admin)),
+    ("POST /verify-ticket-token", 2, lambda c, user, admin, data: c.post(
+        "/verify-ticket-token", json={"token": issue_ticket_token(data["booking_ids"][0], data["train_ids"][0], ["C1/1"], date(2030, 1, 8), True)},
+        headers=admin)),
+    ("POST /create-booking", 15, lambda c, user, admin, data: c.post(
+        "/create-booking", json={"train_id": data["train_ids"][0], "coach_type": "Shovon", "ticket_count": 2, "journey_date": "2030-01-01"},
+        headers=user)),
+    ("POST /cancel-booking", 6, lambda c, user, admin, data: c.post(
+        "/cancel-booking", json={"booking_id": data["booking_ids"][0]}, headers=user)),
+    ("POST /create-payment", 8, lambda c, user, admin, data: c.post(
+        "/create-payment", json={"booking_id": data["booking_ids"][1], "amount": 400}, headers=user)),
+]
+
+
+def measure_all(client, query_counter, scale: dict) -> dict:
+    data = seed(**scale)
+    user = login(client, "customer@example.com")
+    admin = login(client, "admin@example.com")
+    counts = {}
+    for name, _, call in ENDPOINTS:
+        reset_caches()
+        query_counter.reset()
+        response = call(client, user, admin, data)
+        assert response.status_code == 200, f"{name}: {response.status_code} {response.text}"
+        counts[name] = query_counter.count
+    return counts
+
+
+@pytest.fixture(scope="module")
+def query_counts(client, query_counter):
+    return {
+        "small": measure_all(client, query_counter, SMALL),
+        "large": measure_all(client, query_counter, LARGE)
+    }
+
+
+@pytest.mark.parametrize("name,budget", [(name, budget) for name, budget, _ in ENDPOINTS])
+def test_query_budget(query_counts, name, budget):
+    small, large = query_counts["small"][name], query_counts["large"][name]
+    assert small == large, f"{name} runs {small} queries on the small network but {large} on the large one"
+    assert large <= budget, f"{name} runs {large} queries, budget is {budget}"
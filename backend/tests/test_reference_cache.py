@@ -0,0 +1,27 @@
+# test_reference_cache.py
+"""
+Cached reference responses tag the gzip and identity bodies differently and
+revalidate either tag.
+"""
+from conftest import reset_caches, seed
+
+
+def test_gzip_and_identity_bodies_have_distinct_etags(client):
+    seed(n_trains=1, n_coaches=1, seats_per_coach=1, n_bookings=0)
+    reset_caches()
+    identity = client.get("/stations", headers={"Accept-Encoding": "identity"})
+    gzipped = client.get("/stations", headers={"Accept-Encoding": "gzip"})
+    assert identity.status_code == gzipped.status_code == 200
+    assert "Content-Encoding" not in identity.headers
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert gzipped.headers["ETag"] == identity.headers["ETag"][:-1] + '-gz"'
+
+    for etag in (identity.headers["ETag"], gzipped.headers["ETag"], "W/" + gzipped.headers["ETag"]):
+        for encoding in ("identity", "gzip"):
+            revalidated = client.get("/stations", headers={"Accept-Encoding": encoding, "If-None-Match": etag})
+            assert revalidated.status_code == 304
+            expected = gzipped if encoding == "gzip" else identity
+            assert revalidated.headers["ETag"] == expected.headers["ETag"]
+
+    stale = client.get("/stations", headers={"Accept-Encoding": "gzip", "If-None-Match": '"stale"'})
+    assert stale.status_code == 200
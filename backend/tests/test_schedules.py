@@ -0,0 +1,77 @@
+# test_schedules.py
+"""
+Departures are materialized once per train and service date, and seats are
+sold per departure: booking a train on one date leaves its other dates free.
+Journeys are only planned on departures that exist.
+"""
+from datetime import date
+
+import database
+from conftest import available_seats, book, login, reset_caches, seed
+from models import Booking, Schedule
+from schedules import materialize_schedules
+
+
+def test_materialize_fills_missing_dates_once():
+    data = seed(n_trains=2, n_coaches=2, seats_per_coach=4, n_bookings=0)
+    reset_caches()
+    db = database.SessionLocal()
+    try:
+        # The seed already has every train departing on the first day
+        assert materialize_schedules(db, date(2030, 1, 1), 3) == 2 * len(data["train_ids"])
+        assert materialize_schedules(db, date(2030, 1, 1), 3) == 0
+        departures = db.query(Schedule.train_id, Schedule.departure_time).order_by(
+            Schedule.train_id, Schedule.departure_time
+        ).all()
+    finally:
+        db.close()
+    assert len(departures) == 3 * len(data["train_ids"])
+    assert [departure_time.date() for train_id, departure_time in departures if train_id == data["train_ids"][0]] == [
+        date(2030, 1, 1), date(2030, 1, 2), date(2030, 1, 3)
+    ]
+
+
+def test_seats_are_sold_per_departure(client):
+    data = seed(n_trains=1, n_coaches=2, seats_per_coach=4, n_bookings=0)
+    reset_caches()
+    db = database.SessionLocal()
+    try:
+        materialize_schedules(db, date(2030, 1, 1), 2)
+    finally:
+        db.close()
+    user = login(client, "customer@example.com")
+    train_id = data["train_ids"][0]
+
+    first = book(client, user, train_id, 4, "2030-01-01")
+    assert first.status_code == 200, first.text
+    assert first.json()["journey_date"] == "2030-01-01"
+    assert available_seats(client, user, train_id, "2030-01-01") == 0
+    assert available_seats(client, user, train_id, "2030-01-02") == 4
+    assert book(client, user, train_id, 4, "2030-01-01").status_code == 400
+
+    second = book(client, user, train_id, 4, "2030-01-02")
+    assert second.status_code == 200, second.text
+    assert book(client, user, train_id, 4, "2030-01-03").status_code == 404
+
+    db = database.SessionLocal()
+    try:
+        journeys = dict(db.query(Booking.booking_id, Booking.journey_date).all())
+    finally:
+        db.close()
+    assert journeys == {first.json()["booking_id"]: date(2030, 1, 1), second.json()["booking_id"]: date(2030, 1, 2)}
+
+
+def test_journeys_only_use_materialized_departures(client):
+    seed(n_trains=1, n_coaches=2, seats_per_coach=4, n_bookings=0)
+    reset_caches()
+    user = login(client, "customer@example.com")
+
+    def journeys(journey_date):
+        response = client.post("/search-journeys", headers=user, json={
+            "from_station": "Dhaka", "to_station": "Chittagong", "journey_date": journey_date
+        })
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    assert journeys("2030-01-01")
+    assert journeys("2030-02-10") == []
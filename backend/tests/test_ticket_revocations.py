@@ -0,0 +1,52 @@
+# test_ticket_revocations.py
+"""
+A cancelled ticket stays revoked until its journey date has passed, however
+long before the journey it was booked.
+"""
+from datetime import date, datetime, timedelta
+
+import database
+from conftest import book, login, reset_caches, seed
+from models import Booking
+from ticket_tokens import ticket_revocations
+
+
+def test_cancelled_ticket_stays_revoked_until_its_journey(client):
+    data = seed(n_trains=1, n_coaches=2, seats_per_coach=4, n_bookings=0)
+    reset_caches()
+    user = login(client, "customer@example.com")
+    admin = login(client, "admin@example.com")
+
+    booking = book(client, user, data["train_ids"][0], 1).json()
+    assert client.post("/cancel-booking", headers=user, json={"booking_id": booking["booking_id"]}).status_code == 200
+
+    db = database.SessionLocal()
+    try:
+        db.query(Booking).filter(Booking.booking_id == booking["booking_id"]).update(
+            {Booking.booking_date: datetime.now() - timedelta(days=60)}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+    def check():
+        response = client.post("/verify-ticket-token", json={"token": booking["ticket_token"]}, headers=admin)
+        assert response.status_code == 200, response.text
+        return response.json()["result"]
+
+    # Revoked in this process, then as read back from the database by another one
+    assert check() == "revoked"
+    ticket_revocations.clear()
+    assert check() == "revoked"
+
+
+def test_local_revocations_are_kept_until_the_journey_date():
+    ticket_revocations.clear()
+    ticket_revocations.add({1: date.today() + timedelta(days=20), 2: date.today() - timedelta(days=5)})
+    db = database.SessionLocal()
+    try:
+        ticket_revocations.refresh(db, force=True)
+        assert ticket_revocations.snapshot(db) == {1}
+    finally:
+        db.close()
+        ticket_revocations.clear()
@@ -0,0 +1,54 @@
+# test_timetable_version.py
+"""
+A timetable change published by one worker reaches the others: each worker
+rebuilds its cached timetable data once it sees the shared version move.
+"""
+import database
+from conftest import login, reset_caches, seed
+from models import Station, TimetableVersion
+from timetable import check_timetable_version
+
+
+def shared_version() -> int:
+    db = database.SessionLocal()
+    try:
+        row = db.get(TimetableVersion, 1)
+        return row.version if row else 0
+    finally:
+        db.close()
+
+
+def test_workers_rebuild_after_a_published_change(client):
+    seed(n_trains=1, n_coaches=1, seats_per_coach=1, n_bookings=0)
+    reset_caches()
+    db = database.SessionLocal()
+    try:
+        check_timetable_version(db)
+        stations = len(client.get("/stations").json())
+
+        # Another worker adds a station and publishes the change
+        db.add(Station(station_name="Bhairab Bazar", location="Bhairab"))
+        db.merge(TimetableVersion(id=1, version=shared_version() + 1))
+        db.commit()
+        assert len(client.get("/stations").json()) == stations
+
+        assert check_timetable_version(db)
+        assert len(client.get("/stations").json()) == stations + 1
+        assert not check_timetable_version(db)
+    finally:
+        db.close()
+
+
+def test_refreshing_the_timetable_publishes_the_change(client):
+    seed(n_trains=1, n_coaches=1, seats_per_coach=1, n_bookings=0)
+    admin = login(client, "admin@example.com")
+    before = shared_version()
+
+    assert client.post("/admin/refresh-timetable", headers=admin).status_code == 200
+    assert shared_version() == before + 1
+    db = database.SessionLocal()
+    try:
+        # The publishing worker rebuilt already; its own change is not news to it
+        assert not check_timetable_version(db)
+    finally:
+        db.close()
@@ -0,0 +1,251 @@
+# ticket_tokens.py
+import base64
+import json
+import os
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Set
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from logging_config import get_logger
+from models import Booking
+
+TOKEN_VERSION = "t1"
+# Tickets stay checkable for a day after the journey date
+TICKET_GRACE_DAYS = 1
+# How often the revocation list is re-read from the database
+REVOCATION_REFRESH_SECONDS = 30
+
+logger = get_logger("ticket_tokens")
+
+
+class TicketTokenError(ValueError):
+    """Raised for malformed tokens or tokens with a bad signature"""
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _load_signing_key() -> Ed25519PrivateKey:
+    """Ed25519 key from TICKET_SIGNING_KEY (base64url 32-byte seed), else a random one for this process"""
+    seed = os.getenv("TICKET_SIGNING_KEY")
+    if seed:
+        return Ed25519PrivateKey.from_private_bytes(_b64decode(seed))
+    # Never derived from anything committed to the repository: a key anyone can
+    # recompute would let anyone forge tickets
+    return Ed25519PrivateKey.generate()
+
+
+_signing_key = _load_signing_key()
+verify_key = _signing_key.public_key()
+
+
+def warn_if_random_signing_key():
+    """Log a warning when tickets are signed with a random per-process key.
+
+    Called at application startup, once logging is configured, rather than on
+    import.
+    """
+    if not os.getenv("TICKET_SIGNING_KEY"):
+        logger.warning(
+            "TICKET_SIGNING_KEY is not set; signing tickets with a random key, so tokens do not survive "
+            "a restart and are not shared between workers"
+        )
+
+
+def public_key_b64() -> str:
+    """Raw public key for gate devices, base64url encoded"""
+    return _b64encode(verify_key.public_bytes(Encoding.Raw, PublicFormat.Raw))
+
+
+def _sign(payload: bytes) -> str:
+    return f"{TOKEN_VERSION}.{_b64encode(payload)}.{_b64encode(_signing_key.sign(payload))}"
+
+
+def _open(token: str, public_key: Ed25519PublicKey) -> bytes:
+    parts = token.split(".") if isinstance(token, str) else []
+    if len(parts) != 3:
+        raise TicketTokenError("Malformed ticket token")
+    if parts[0] != TOKEN_VERSION:
+        raise TicketTokenError(f"Unsupported token version '{parts[0]}'")
+    try:
+        payload = _b64decode(parts[1])
+        public_key.verify(_b64decode(parts[2]), payload)
+    except (ValueError, InvalidSignature):
+        raise TicketTokenError("Invalid ticket token signature")
+    return payload
+
+
+def issue_ticket_token(booking_id: int, train_id: int, seats: Iterable[str], journey_date: date, paid: bool) -> str:
+    """Sign a compact ticket token; `seats` are "coach/seat" labels"""
+    payload = json.dumps({
+        "b": booking_id,
+        "t": train_id,
+        "s": list(seats),
+        "d": journey_date.isoformat(),
+        "p": 1 if paid else 0
+    }, separators=(",", ":")).encode("utf-8")
+    return _sign(payload)
+
+
+def decode_ticket_token(token: str, public_key: Ed25519PublicKey = None) -> dict:
+    """Check the signature and return the token's claims; pure CPU, no database"""
+    payload = _open(token, public_key or verify_key)
+    try:
+        claims = json.loads(payload)
+        return {
+            "booking_id": claims["b"],
+            "train_id": claims["t"],
+            "seats": claims["s"],
+            "journey_date": date.fromisoformat(claims["d"]).isoformat(),
+            "payment_status": "paid" if claims["p"] else "unpaid"
+        }
+    except (ValueError, KeyError, TypeError):
+        raise TicketTokenError("Malformed ticket claims")
+
+
+def check_ticket_token(token: str, revoked: Set[int], today: Optional[date] = None,
+                       public_key: Ed25519PublicKey = None) -> dict:
+    """Verify a ticket token against a revocation set.
+
+    Returns {"result": "valid" | "unpaid" | "revoked" | "expired" | "invalid", "ticket": claims or None};
+    a token issued before payment (p=0) is "unpaid" and does not pass the gate.
+    """
+    try:
+        ticket = decode_ticket_token(token, public_key)
+    except TicketTokenError:
+        return {"result": "invalid", "ticket": None}
+    today = today or date.today()
+    if ticket["booking_id"] in revoked:
+        result = "revoked"
+    elif date.fromisoformat(ticket["journey_date"]) + timedelta(days=TICKET_GRACE_DAYS) < today:
+        result = "expired"
+    elif ticket["payment_status"] != "paid":
+        result = "unpaid"
+    else:
+        result = "valid"
+    return {"result": result, "ticket": ticket}
+
+
+def encode_revocations(booking_ids: Iterable[int]) -> str:
+    """Sorted booking ids as base64url LEB128 varint deltas"""
+    data = bytearray()
+    previous = 0
+    for booking_id in sorted(set(booking_ids)):
+        delta = booking_id - previous
+        previous = booking_id
+        while True:
+            byte = delta & 0x7F
+            delta >>= 7
+            data.append(byte | (0x80 if delta else 0))
+            if not delta:
+                break
+    return _b64encode(bytes(data))
+
+
+def decode_revocations(encoded: str) -> List[int]:
+    booking_ids = []
+    current = shift = delta = 0
+    for byte in _b64decode(encoded):
+        delta |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            current += delta
+            booking_ids.append(current)
+            delta = shift = 0
+    return booking_ids
+
+
+def verify_revocation_list(signed: str, public_key: Ed25519PublicKey = None) -> Set[int]:
+    """Check a signed revocation list from /ticket-revocations and return its booking ids"""
+    claims = json.loads(_open(signed, public_key or verify_key))
+    return set(decode_revocations(claims["r"]))
+
+
+def revoked_bookings_query(since: date) -> Select:
+    """Cancelled bookings and expired holds travelling on or after `since`"""
+    return select(Booking.booking_id).where(
+        Booking.status.in_(('cancelled', 'expired')),
+        Booking.journey_date >= since
+    )
+
+
+class TicketRevocations:
+    """Booking ids whose ticket tokens must be refused.
+
+    Only tickets that could still be presented are listed: those whose
+    journey date plus TICKET_GRACE_DAYS has not passed. Cancelled bookings and
+    expired seat holds are re-read from the database at most every
+    REVOCATION_REFRESH_SECONDS; bookings revoked in this process (cancelled,
+    expired, or deleted with their account) are added immediately and kept
+    until their journey date has passed, since deleted bookings no longer show
+    up in the database.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._from_db: Set[int] = set()
+        self._local = {}
+        self._loaded_at = float("-inf")
+        self._signed = None
+
+    def add(self, revoked: Dict[int, date]):
+        """Revoke tickets now; `revoked` maps each booking_id to its journey date"""
+        with self._lock:
+            self._local.update(revoked)
+            self._signed = None
+
+    def refresh(self, db: Session, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._loaded_at < REVOCATION_REFRESH_SECONDS:
+            return
+        # Tickets of earlier journeys are refused as expired anyway
+        since = date.today() - timedelta(days=TICKET_GRACE_DAYS)
+        rows = db.execute(revoked_bookings_query(since)).all()
+        with self._lock:
+            self._from_db = {booking_id for (booking_id,) in rows}
+            self._local = {
+                booking_id: journey_date for booking_id, journey_date in self._local.items() if journey_date >= since
+            }
+            self._loaded_at = now
+            self._signed = None
+
+    def clear(self):
+        """Forget every revocation; the next snapshot reloads them from the database"""
+        with self._lock:
+            self._from_db = set()
+            self._local = {}
+            self._loaded_at = float("-inf")
+            self._signed = None
+
+    def snapshot(self, db: Session) -> Set[int]:
+        self.refresh(db)
+        with self._lock:
+            return self._from_db | set(self._local)
+
+    def signed_list(self, db: Session) -> str:
+        """The current revocation list, signed so gate devices can trust a cached copy"""
+        revoked = self.snapshot(db)
+        with self._lock:
+            if self._signed is None:
+                payload = json.dumps({
+                    "i": int(time.time()),
+                    "r": encode_revocations(revoked)
+                }, separators=(",", ":")).encode("utf-8")
+                self._signed = _sign(payload)
+            return self._signed
+
+
+ticket_revocations = TicketRevocations()
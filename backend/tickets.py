@@ -0,0 +1,214 @@
+# tickets.py
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.sql import Select
+
+from models import Booking, BookingSeat, Coach, Payment, Route, RouteStation, Schedule, Seat, Station, Train, User
+
+# Last-resort end stations for trains without route data, matched on the train name
+TRAIN_NAME_ENDPOINTS = [
+    (("Padma", "chittagong"), ("Dhaka", "Chittagong")),
+    (("Parabat", "sylhet"), ("Dhaka", "Sylhet")),
+    (("Sundarban", "khulna"), ("Dhaka", "Khulna")),
+]
+
+
+def _guess_endpoints(train_name: str, from_station: str, to_station: str) -> Tuple[str, str]:
+    for (name, city), (source, destination) in TRAIN_NAME_ENDPOINTS:
+        if name in train_name or city in train_name.lower():
+            return (source if from_station == "Unknown" else from_station,
+                    destination if to_station == "Unknown" else to_station)
+    return from_station, to_station
+
+
+def ticket_bookings_query(booking_ids: Iterable[int]) -> Select:
+    return select(
+        Booking.booking_id, Booking.booking_date, Booking.journey_date, Booking.status, Booking.user_id,
+        Booking.from_sequence, Booking.to_sequence, Schedule.route_id, User.name, User.email
+    ).outerjoin(
+        User, Booking.user_id == User.user_id
+    ).outerjoin(
+        Schedule, Booking.schedule_id == Schedule.schedule_id
+    ).where(Booking.booking_id.in_(booking_ids))
+
+
+def ticket_seats_query(booking_ids: Iterable[int]) -> Select:
+    return select(
+        BookingSeat.booking_id, BookingSeat.fare, Seat.seat_number, Coach.coach_number,
+        Coach.coach_type, Train.train_id, Train.train_name
+    ).join(
+        Seat, BookingSeat.seat_id == Seat.seat_id
+    ).join(
+        Coach, Seat.coach_id == Coach.coach_id
+    ).outerjoin(
+        Train, Coach.train_id == Train.train_id
+    ).where(BookingSeat.booking_id.in_(booking_ids)).order_by(BookingSeat.booking_seat_id)
+
+
+def ticket_payments_query(booking_ids: Iterable[int]) -> Select:
+    """Amount paid per booking"""
+    return select(
+        Payment.booking_id, func.sum(Payment.amount)
+    ).where(Payment.booking_id.in_(booking_ids)).group_by(Payment.booking_id)
+
+
+def train_stops_query(train_ids: Iterable[int]) -> Select:
+    """Station names of the trains' stops in sequence order"""
+    return select(
+        RouteStation.train_id, RouteStation.sequence_number, Station.station_name
+    ).join(
+        Station, RouteStation.station_id == Station.station_id
+    ).where(RouteStation.train_id.in_(train_ids)).order_by(
+        RouteStation.train_id, RouteStation.sequence_number.asc().nulls_last()
+    )
+
+
+def route_endpoints_query(train_ids: Iterable[int], route_ids: Iterable[int]) -> Select:
+    """End station names of the trains' routes and of the given routes"""
+    source, destination = aliased(Station), aliased(Station)
+    return select(
+        Route.route_id, Route.train_id, source.station_name, destination.station_name
+    ).outerjoin(
+        source, Route.source_station_id == source.station_id
+    ).outerjoin(
+        destination, Route.destination_station_id == destination.station_id
+    ).where(or_(Route.train_id.in_(train_ids), Route.route_id.in_(route_ids))).order_by(Route.route_id)
+
+
+def my_tickets_query(user_id: int, current_date: date, after_booking_id: Optional[int] = None,
+                     trips: str = "all", limit: int = 50) -> Select:
+    """One page of a user's bookings, newest first, each with its seat count, fare
+    total, train and coach type; `trips` keeps upcoming or past journeys only"""
+    query = select(
+        Booking.booking_id,
+        Booking.booking_date,
+        Booking.status,
+        Booking.journey_date,
+        Booking.from_sequence,
+        Booking.to_sequence,
+        Train.train_id,
+        Train.train_name,
+        func.min(Coach.coach_type).label("coach_type"),
+        func.count(BookingSeat.booking_seat_id).label("ticket_count"),
+        func.sum(BookingSeat.fare).label("total_amount")
+    ).join(
+        BookingSeat, BookingSeat.booking_id == Booking.booking_id
+    ).join(
+        Seat, BookingSeat.seat_id == Seat.seat_id
+    ).join(
+        Coach, Seat.coach_id == Coach.coach_id
+    ).join(
+        Train, Coach.train_id == Train.train_id
+    ).where(Booking.user_id == user_id)
+
+    if after_booking_id is not None:
+        query = query.where(Booking.booking_id < after_booking_id)
+    if trips == "upcoming":
+        query = query.where(Booking.journey_date >= current_date)
+    elif trips == "past":
+        query = query.where(Booking.journey_date < current_date)
+
+    return query.group_by(
+        Booking.booking_id, Booking.booking_date, Booking.status, Booking.journey_date, Booking.from_sequence,
+        Booking.to_sequence, Train.train_id, Train.train_name
+    ).order_by(Booking.booking_id.desc()).limit(limit)
+
+
+def load_ticket_details(db: Session, booking_ids: Iterable[int]) -> Dict[int, dict]:
+    """Resolve the ticket details of many bookings with a fixed number of queries.
+
+    Returns booking_id -> details for every booking that exists. Details carry
+    the booking's user_id and seat_details; a booking without seats has an
+    empty seat_details list. Bookings, seats, payments and route stations are
+    each read in one set-based query, plus one fallback query for trains
+    without route stations.
+    """
+    booking_ids = list(set(booking_ids))
+    if not booking_ids:
+        return {}
+
+    bookings = db.execute(ticket_bookings_query(booking_ids)).all()
+    if not bookings:
+        return {}
+    found_ids = [booking.booking_id for booking in bookings]
+
+    seats: Dict[int, List] = {}
+    for row in db.execute(ticket_seats_query(found_ids)).all():
+        seats.setdefault(row.booking_id, []).append(row)
+
+    payments = {booking_id: float(total or 0) for booking_id, total in db.execute(
+        ticket_payments_query(found_ids)
+    ).all()}
+
+    # Route of every train involved, resolved once per train
+    train_ids = {rows[0].train_id for rows in seats.values() if rows[0].train_id is not None}
+    train_stops: Dict[int, List[Tuple[int, str]]] = {}
+    if train_ids:
+        for train_id, sequence_number, station_name in db.execute(train_stops_query(train_ids)).all():
+            train_stops.setdefault(train_id, []).append((sequence_number, station_name))
+
+    # Fallback for trains without route stations: end stations from the Routes
+    # table, by train or by the booking's schedule
+    missing_trains = train_ids - set(train_stops)
+    schedule_routes = {booking.route_id for booking in bookings
+                       if booking.route_id is not None and booking.booking_id in seats
+                       and seats[booking.booking_id][0].train_id in missing_trains}
+    routes_by_train: Dict[int, Tuple[str, str]] = {}
+    routes_by_id: Dict[int, Tuple[str, str]] = {}
+    if missing_trains:
+        for route_id, train_id, source_name, destination_name in db.execute(
+            route_endpoints_query(missing_trains, schedule_routes)
+        ).all():
+            endpoints = (source_name or "Unknown", destination_name or "Unknown")
+            routes_by_id[route_id] = endpoints
+            if train_id in missing_trains:
+                routes_by_train.setdefault(train_id, endpoints)
+
+    details = {}
+    for booking in bookings:
+        booking_seats = seats.get(booking.booking_id, [])
+        train_id = booking_seats[0].train_id if booking_seats else None
+        train_name = booking_seats[0].train_name if booking_seats else None
+
+        from_station = to_station = "Unknown"
+        stops = train_stops.get(train_id)
+        if stops:
+            names = dict(stops)
+            # Booked leg when the booking has one, otherwise the whole route
+            from_station = names.get(booking.from_sequence) or stops[0][1]
+            to_station = names.get(booking.to_sequence) or stops[-1][1]
+        elif train_id in routes_by_train:
+            from_station, to_station = routes_by_train[train_id]
+        if (from_station == "Unknown" or to_station == "Unknown") and booking.route_id in routes_by_id:
+            source_name, destination_name = routes_by_id[booking.route_id]
+            from_station = source_name if source_name != "Unknown" else from_station
+            to_station = destination_name if destination_name != "Unknown" else to_station
+        if from_station == "Unknown" or to_station == "Unknown":
+            from_station, to_station = _guess_endpoints(train_name or "", from_station, to_station)
+
+        total_paid = payments.get(booking.booking_id, 0)
+        details[booking.booking_id] = {
+            "booking_id": booking.booking_id,
+            "user_id": booking.user_id,
+            "booking_date": booking.booking_date.strftime("%Y-%m-%d %H:%M:%S"),
+            "journey_date": booking.journey_date.strftime("%Y-%m-%d"),
+            "status": booking.status,
+            "passenger_name": booking.name or "Unknown",
+            "passenger_email": booking.email or "Unknown",
+            "train_name": train_name or "Unknown Train",
+            "train_id": train_id or 0,
+            "from_station": from_station,
+            "to_station": to_station,
+            "seat_details": [{
+                "seat_number": seat.seat_number,
+                "coach_number": seat.coach_number,
+                "coach_type": seat.coach_type,
+                "fare": float(seat.fare)
+            } for seat in booking_seats],
+            "total_amount": total_paid if total_paid > 0 else sum(float(seat.fare) for seat in booking_seats),
+            "payment_status": "paid" if booking.booking_id in payments else "unpaid"
+        }
+    return details
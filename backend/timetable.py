@@ -0,0 +1,318 @@
+# timetable.py
+import os
+import threading
+from collections import namedtuple
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+import database
+from logging_config import get_logger
+from models import Route, RouteStation, Station, TimetableVersion
+
+# Numeric stop offsets count minutes from this clock time
+DEFAULT_DEPARTURE_MINUTES = 8 * 60
+# Seconds between checks of the shared timetable version; 0 disables the check
+TIMETABLE_POLL_SECONDS = float(os.getenv("TIMETABLE_POLL_SECONDS", "5"))
+
+logger = get_logger("timetable")
+
+# Arrival and departure in minutes after midnight of the day the train leaves
+# its first stop; times past midnight keep counting up (e.g. 25:15 -> 1515)
+StopTime = namedtuple("StopTime", ["sequence_number", "station_id", "arrival", "departure"])
+
+# One stop of a compiled train as the timetable endpoints show it. The texts are
+# None where the stop has no published time; `elapsed` counts minutes from the
+# train's first departure to its arrival here
+CompiledStop = namedtuple("CompiledStop", [
+    "sequence_number", "station_id", "station_name", "arrival_text", "departure_text",
+    "halt", "halt_text", "elapsed", "elapsed_text"
+])
+
+# Callbacks run whenever trains, routes, stops or schedules change, so every
+# in-memory view derived from the timetable is rebuilt from the database
+_change_listeners: List[Callable[[], None]] = []
+_version = 0
+# Last value of the timetable_version row this process acted on
+_shared_version: Optional[int] = None
+_shared_lock = threading.Lock()
+
+
+def on_timetable_change(listener: Callable[[], None]) -> Callable[[], None]:
+    """Register a callback to run when the timetable changes"""
+    _change_listeners.append(listener)
+    return listener
+
+
+def timetable_version() -> int:
+    """Number of timetable changes seen by this process"""
+    return _version
+
+
+def notify_timetable_changed(db: Optional[Session] = None):
+    """Bump the timetable version and invalidate every in-memory structure derived from it.
+
+    With a session the change is also published in the timetable_version row,
+    so the other workers rebuild their copies on their next check.
+    """
+    global _version, _shared_version
+    if db is not None:
+        shared = db.execute(update(TimetableVersion).where(TimetableVersion.id == 1).values(
+            version=TimetableVersion.version + 1
+        ).returning(TimetableVersion.version)).scalar()
+        if shared is None:
+            # Schema built without the migrations, which insert the row
+            shared = 1
+            db.add(TimetableVersion(id=1, version=shared))
+        db.commit()
+        with _shared_lock:
+            _shared_version = shared
+    _version += 1
+    for listener in _change_listeners:
+        listener()
+
+
+def check_timetable_version(db: Session) -> bool:
+    """Invalidate this process's timetable data if another worker published a change.
+
+    The first check only records the current version. Returns True when the
+    data was invalidated.
+    """
+    global _shared_version
+    shared = db.execute(select(TimetableVersion.version).where(TimetableVersion.id == 1)).scalar() or 0
+    with _shared_lock:
+        seen, _shared_version = _shared_version, shared
+    if seen is None or seen == shared:
+        return False
+    notify_timetable_changed()
+    return True
+
+
+class TimetableWatcher:
+    """Runs check_timetable_version every TIMETABLE_POLL_SECONDS on a daemon thread"""
+
+    def __init__(self, interval: float = TIMETABLE_POLL_SECONDS):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        # Record the version the caches about to be built belong to
+        self._check()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="timetable-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _check(self):
+        db = database.session_router.primary_factory()
+        try:
+            check_timetable_version(db)
+        except Exception as e:
+            db.rollback()
+            logger.warning("Timetable version check failed", extra={"error": str(e)})
+        finally:
+            db.close()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._check()
+
+
+timetable_watcher = TimetableWatcher()
+
+
+def parse_clock_minutes(value) -> Optional[int]:
+    """Convert a stored stop time to minutes after midnight.
+
+    RouteStation offsets are text holding either a clock time ("10:15") or a
+    number of minutes after DEFAULT_DEPARTURE_MINUTES ("135").
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value or value == "N/A":
+        return None
+    try:
+        if ":" in value:
+            hours, minutes = map(int, value.split(":"))
+            return hours * 60 + minutes
+        return DEFAULT_DEPARTURE_MINUTES + int(value)
+    except ValueError:
+        return None
+
+
+def format_clock(minutes: int) -> str:
+    """Format minutes after midnight as HH:MM, wrapping past midnight"""
+    minutes %= 24 * 60
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def format_duration(minutes: int) -> str:
+    return f"{minutes // 60}h {minutes % 60}m"
+
+
+class CompiledTrain:
+    """A train's stops with their times parsed, ordered and formatted once.
+
+    `stops` lists every stop in sequence order (stops without a sequence
+    number last) for display; `stop_times` holds the timed stops in integer
+    minutes for journey calculations. `distance_km` is the length of the
+    train's longest route, None when it has none. Journey segments between
+    two stations are formatted on first use and kept.
+    """
+
+    __slots__ = ("train_id", "stops", "stop_times", "distance_km", "departure_text", "arrival_text",
+                 "journey_minutes", "journey_text", "_segments")
+
+    def __init__(self, train_id: int, stops: List[CompiledStop], stop_times: List[StopTime],
+                 distance_km: Optional[float] = None):
+        self.train_id = train_id
+        self.distance_km = distance_km
+        self.stops = tuple(stops)
+        self.stop_times = tuple(stop_times)
+        self.departure_text = format_clock(stop_times[0].departure) if stop_times else None
+        self.arrival_text = format_clock(stop_times[-1].arrival) if stop_times else None
+        self.journey_minutes = stop_times[-1].arrival - stop_times[0].departure if len(stop_times) > 1 else None
+        self.journey_text = format_duration(self.journey_minutes) if self.journey_minutes is not None else None
+        self._segments: Dict[Tuple[int, int], Optional[dict]] = {}
+
+    def segment(self, from_station_id: int, to_station_id: int) -> Optional[dict]:
+        """Times and stops of the journey from the first call at from_station to
+        the last call at to_station, or None when the train does not serve it"""
+        key = (from_station_id, to_station_id)
+        if key not in self._segments:
+            self._segments[key] = self._build_segment(from_station_id, to_station_id)
+        return self._segments[key]
+
+    def _build_segment(self, from_station_id: int, to_station_id: int) -> Optional[dict]:
+        station_ids = [stop.station_id for stop in self.stop_times]
+        if from_station_id not in station_ids or to_station_id not in station_ids:
+            return None
+        journey = self.stop_times[station_ids.index(from_station_id):len(station_ids) - station_ids[::-1].index(to_station_id)]
+        if not journey:
+            return None
+        start = journey[0].departure
+        station_names = {stop.station_id: stop.station_name for stop in self.stops}
+        return {
+            "departure_time": format_clock(start),
+            "arrival_time": format_clock(journey[-1].arrival),
+            "duration": format_duration(journey[-1].arrival - start),
+            "route_stations": [{
+                "station": station_names.get(stop.station_id) or "Unknown",
+                "arrival": format_clock(stop.arrival),
+                "departure": format_clock(stop.departure),
+                "halt": f"{stop.departure - stop.arrival}m",
+                "duration": format_duration(max(stop.arrival - start, 0))
+            } for stop in journey]
+        }
+
+
+def timetable_query() -> Select:
+    """Every train's RouteStation rows with station names and the train's route distance"""
+    route_distances = select(
+        Route.train_id, func.max(Route.distance_km).label("distance_km")
+    ).group_by(Route.train_id).subquery()
+    return select(
+        RouteStation.train_id, RouteStation.sequence_number, RouteStation.station_id, Station.station_name,
+        RouteStation.arrival_offset_minutes, RouteStation.departure_offset_minutes, RouteStation.halt_minutes,
+        route_distances.c.distance_km
+    ).outerjoin(
+        Station, RouteStation.station_id == Station.station_id
+    ).outerjoin(
+        route_distances, route_distances.c.train_id == RouteStation.train_id
+    )
+
+
+def compile_timetable(db: Session) -> Dict[int, CompiledTrain]:
+    """Compile every train's RouteStation rows, with its route distance, in one query.
+
+    A missing arrival falls back to the departure and vice versa; stops with
+    neither are shown but left out of stop_times. Times that go backwards are
+    taken to have crossed midnight.
+    """
+    rows = list(db.execute(timetable_query()).all())
+    rows.sort(key=lambda row: (row.train_id, row.sequence_number is None, row.sequence_number or 0, row.station_id or 0))
+
+    stops: Dict[int, List[CompiledStop]] = {}
+    stop_times: Dict[int, List[StopTime]] = {}
+    distances: Dict[int, Optional[float]] = {}
+    for train_id, sequence_number, station_id, station_name, arrival_value, departure_value, halt_minutes, distance_km in rows:
+        distances[train_id] = float(distance_km) if distance_km is not None else None
+        arrival = parse_clock_minutes(arrival_value)
+        departure = parse_clock_minutes(departure_value)
+        timed = stop_times.setdefault(train_id, [])
+        halt = halt_minutes or 0
+        elapsed = None
+        if sequence_number is not None and (arrival is not None or departure is not None):
+            arrival_filled = departure if arrival is None else arrival
+            departure_filled = arrival if departure is None else departure
+            if timed:
+                while arrival_filled < timed[-1].departure:
+                    arrival_filled += 24 * 60
+            while departure_filled < arrival_filled:
+                departure_filled += 24 * 60
+            if arrival is not None and departure is not None:
+                halt = departure_filled - arrival_filled
+            elapsed = arrival_filled - timed[0].departure if timed else 0
+            arrival = arrival_filled if arrival is not None else None
+            departure = departure_filled if departure is not None else None
+            timed.append(StopTime(sequence_number, station_id, arrival_filled, departure_filled))
+
+        stops.setdefault(train_id, []).append(CompiledStop(
+            sequence_number, station_id, station_name,
+            format_clock(arrival) if arrival is not None else None,
+            format_clock(departure) if departure is not None else None,
+            halt, f"{halt}m",
+            elapsed, format_duration(elapsed) if elapsed is not None else None
+        ))
+    return {
+        train_id: CompiledTrain(train_id, train_stops, stop_times[train_id], distances[train_id])
+        for train_id, train_stops in stops.items()
+    }
+
+
+class CompiledTimetable:
+    """Every train compiled once and kept until the timetable changes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._trains: Optional[Dict[int, CompiledTrain]] = None
+
+    def trains(self, db: Session) -> Dict[int, CompiledTrain]:
+        trains = self._trains
+        if trains is None:
+            version = timetable_version()
+            trains = compile_timetable(db)
+            with self._lock:
+                # Don't keep a compilation that raced with a timetable change
+                if timetable_version() == version:
+                    self._trains = trains
+        return trains
+
+    def train(self, db: Session, train_id: int) -> Optional[CompiledTrain]:
+        return self.trains(db).get(train_id)
+
+    def stop_times(self, db: Session, train_ids: Optional[Iterable[int]] = None) -> Dict[int, List[StopTime]]:
+        """Timed stops of every train (or of `train_ids`) that has any"""
+        trains = self.trains(db)
+        selected = trains.values() if train_ids is None else (trains[i] for i in train_ids if i in trains)
+        return {train.train_id: list(train.stop_times) for train in selected if train.stop_times}
+
+    def invalidate(self):
+        with self._lock:
+            self._trains = None
+
+
+compiled_timetable = CompiledTimetable()
+on_timetable_change(compiled_timetable.invalidate)
@@ -7,6 +7,8 @@ const BookingConfirmation = () => {
   const [isConfirmed, setIsConfirmed] = useState(false);
   const [bookingId, setBookingId] = useState(null);
   const [bookingTime, setBookingTime] = useState(null);
+  const [holdExpiresAt, setHoldExpiresAt] = useState(null);
+  const [isPaid, setIsPaid] = useState(false);
   const location = useLocation();
   const navigate = useNavigate();
 
@@ -47,6 +49,7 @@ const BookingConfirmation = () => {
         const result = await response.json();
         setBookingId(result.booking_id);
         setBookingTime(new Date().toLocaleString());
+        setHoldExpiresAt(result.hold_expires_at);
         setIsConfirmed(true);
         
         // Update the available seats count by fetching fresh data
@@ -57,7 +60,7 @@ const BookingConfirmation = () => {
               'Content-Type': 'application/json',
               'Authorization': `Bearer ${token}`
             },
-            body: JSON.stringify({ train_id: train.train_id })
+            body: JSON.stringify({ train_id: train.train_id, journey_date: searchData.journeyDate })
           });
           
           if (refreshResponse.ok) {
@@ -74,8 +77,9 @@ const BookingConfirmation = () => {
           // Continue anyway - booking was successful
         }
         
-        alert(`Ticket has been confirmed successfully!\nBooking ID: ${result.booking_id}` +
-              (result.allocated_seats ? `\nAllocated Seats: ${result.allocated_seats.map(s => s.seat_number).join(', ')}` : ''));
+        alert(`Seats are held for you!\nBooking ID: ${result.booking_id}` +
+              (result.allocated_seats ? `\nAllocated Seats: ${result.allocated_seats.map(s => s.seat_number).join(', ')}` : '') +
+              `\nDownload the ticket before ${result.hold_expires_at} to pay and keep the seats.`);
       } else {
         const errorData = await response.json();
         alert(errorData.detail || 'Failed to confirm ticket. Please try again.');
@@ -92,10 +96,19 @@ const BookingConfirmation = () => {
       return;
     }
 
+    if (isPaid) {
+      if (format === 'html') {
+        generateTicketPDF();
+      } else {
+        downloadTextTicket();
+      }
+      return;
+    }
+
     try {
       const token = localStorage.getItem('token');
       
-      // Create payment entry
+      // Create payment entry; it confirms the held seats
       const paymentData = {
         booking_id: bookingId,
         amount: totalPrice,
@@ -112,13 +125,15 @@ const BookingConfirmation = () => {
       });
 
       if (response.ok) {
+        setIsPaid(true);
         if (format === 'html') {
           generateTicketPDF();
         } else {
           downloadTextTicket();
         }
       } else {
-        alert('Failed to process payment. Please try again.');
+        const errorData = await response.json();
+        alert(errorData.detail || 'Failed to process payment. Please try again.');
       }
     } catch (error) {
       console.error('Error processing payment:', error);
@@ -345,8 +360,14 @@ Keep this ticket safe for your journey.
               </div>
               <div className="detail-row">
                 <span>Status:</span>
-                <span>{isConfirmed ? 'Confirmed' : 'Pending'}</span>
+                <span>{isPaid ? 'Confirmed' : isConfirmed ? 'Held' : 'Pending'}</span>
               </div>
+              {isConfirmed && !isPaid && (
+                <div className="detail-row">
+                  <span>Pay Before:</span>
+                  <span>{holdExpiresAt}</span>
+                </div>
+              )}
             </div>
           </div>
         </div>
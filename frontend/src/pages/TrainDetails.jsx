@@ -35,12 +35,22 @@ const TrainDetails = () => {
     };
   }, [train, searchData, navigate]);
 
+  // Availability and prices of the searched leg, the fare create-booking charges
+  const coachAvailabilityUrl = () => {
+    const params = new URLSearchParams({
+      journey_date: searchData.journeyDate,
+      from_station: searchData.fromStation,
+      to_station: searchData.toStation
+    });
+    return `http://localhost:8000/coach-availability/${train.train_id}?${params}`;
+  };
+
   const fetchCoachAvailability = async () => {
     try {
       setRefreshingSeats(true);
       const token = localStorage.getItem('token');
       
-      const response = await fetch(`http://localhost:8000/coach-availability/${train.train_id}`, {
+      const response = await fetch(coachAvailabilityUrl(), {
         headers: {
           'Authorization': `Bearer ${token}`,
           'Content-Type': 'application/json',
@@ -71,7 +81,7 @@ const TrainDetails = () => {
             'Content-Type': 'application/json',
           },
         }),
-        fetch(`http://localhost:8000/coach-availability/${train.train_id}`, {
+        fetch(coachAvailabilityUrl(), {
           headers: {
             'Authorization': `Bearer ${token}`,
             'Content-Type': 'application/json',